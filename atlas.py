@@ -0,0 +1,89 @@
+import hashlib
+import json
+from pathlib import Path
+
+import pygame
+
+from logs import log
+
+
+class TextureAtlas:
+    """
+    All sprites packed into a single surface, already scaled to their display size.
+
+    The packed surface is cached on disk (one PNG plus a JSON index) and keyed by
+    the source files and sizes, so later starts load one image instead of
+    decoding and scaling every PNG.
+    """
+
+    def __init__(self, surface: pygame.Surface, rects: dict[str, pygame.Rect]):
+        self.surface = surface
+        self.rects = rects
+        self.images = {name: surface.subsurface(rect) for name, rect in rects.items()}
+
+    @staticmethod
+    def cache_key(entries: dict[str, tuple[Path, int, int]]) -> str:
+        h = hashlib.sha1()
+        for name, (path, width, height) in sorted(entries.items()):
+            path = Path(path)
+            h.update(f'{name}:{path}:{path.stat().st_mtime_ns}:{width}x{height};'.encode())
+        return h.hexdigest()[:16]
+
+    @staticmethod
+    def build(entries: dict[str, tuple[Path, int, int]], max_width: int = 1024) -> 'TextureAtlas':
+        # shelf packing: images are placed left to right, tallest first
+        images = {name: pygame.transform.scale(pygame.image.load(path), (width, height))
+                  for name, (path, width, height) in entries.items()}
+        order = sorted(images, key=lambda name: (-images[name].get_height(), name))
+
+        rects = {}
+        x, y, shelf_height, atlas_width = 0, 0, 0, 0
+        for name in order:
+            width, height = images[name].get_size()
+            if x + width > max_width:
+                x, y, shelf_height = 0, y + shelf_height, 0
+            rects[name] = pygame.Rect(x, y, width, height)
+            x += width
+            shelf_height = max(shelf_height, height)
+            atlas_width = max(atlas_width, x)
+
+        surface = pygame.Surface((max(atlas_width, 1), max(y + shelf_height, 1)), pygame.SRCALPHA)
+        for name in order:
+            surface.blit(images[name], rects[name])
+        return TextureAtlas(surface, rects)
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pygame.image.save(self.surface, str(path.with_suffix('.png')))
+        index = {name: [rect.x, rect.y, rect.w, rect.h] for name, rect in self.rects.items()}
+        path.with_suffix('.json').write_text(json.dumps(index))
+
+    @staticmethod
+    def load(path: Path) -> 'TextureAtlas':
+        path = Path(path)
+        surface = pygame.image.load(str(path.with_suffix('.png')))
+        index = json.loads(path.with_suffix('.json').read_text())
+        return TextureAtlas(surface, {name: pygame.Rect(*rect) for name, rect in index.items()})
+
+    @staticmethod
+    def load_or_build(entries: dict[str, tuple[Path, int, int]], cache_dir: Path) -> 'TextureAtlas':
+        path = Path(cache_dir) / f'atlas_{TextureAtlas.cache_key(entries)}'
+        if path.with_suffix('.png').exists() and path.with_suffix('.json').exists():
+            try:
+                return TextureAtlas.load(path)
+            except Exception as e:
+                log(f'Cannot load texture atlas {path}: {e}, rebuild it', '[ATLAS]')
+        atlas = TextureAtlas.build(entries)
+        try:
+            atlas.save(path)
+        except OSError as e:
+            log(f'Cannot save texture atlas {path}: {e}', '[ATLAS]')
+        return atlas
+
+    def convert(self) -> 'TextureAtlas':
+        """Convert to the display pixel format, so blits need no per-pixel conversion."""
+        return TextureAtlas(self.surface.convert_alpha(), self.rects)
+
+    def blits(self, target: pygame.Surface, items: list[tuple[str, tuple[int, int]]]):
+        target.blits([(self.surface, position, self.rects[name]) for name, position in items], doreturn=False)
@@ -0,0 +1,310 @@
+# batch_env.py
+# Many independent matches stepped together, their state in stacked NumPy arrays.
+import numpy as np
+
+from config import Config
+from enums import PlayerStatus
+from env import BOAT_POINTS, FINISH_BONUS, ITEM_POINTS
+from events import WinConditionEvent
+from game_board import GameBoard
+from map import Map
+
+
+# cell codes, a player is PLAYER + id
+CELLS = ['g', 'r', 'w', 'c', 'a', 's', '-1']
+GROUND, FOOD, WOOD, COTTON, ARMOR, SWORD, UNEXPLORED = range(len(CELLS))
+PLAYER = 10
+
+# resources a player carries (columns of hand and allow), the store also counts fabric
+ITEMS = ['r', 'w', 'c']
+STORE_ITEMS = ITEMS + ['fa']
+FABRIC = len(ITEMS)
+
+PLAYING, PAUSED, WIN = 0, 1, 2
+STATUS = {PlayerStatus.PLAYING: PLAYING, PlayerStatus.PAUSED: PAUSED, PlayerStatus.WIN: WIN}
+
+# enums.Direction order: left, right, up, down
+MOVES = np.array([(0, -1), (0, 1), (-1, 0), (1, 0)])
+# Server.collision order: up, down, left, right
+NEIGHBORS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+VIEW = Config.OPEN_CELL // 2
+
+
+def encode(grid) -> np.ndarray:
+    """Map or fog grid of strings to cell codes."""
+    grid = np.asarray(grid)
+    codes = np.full(grid.shape, GROUND, dtype=np.int16)
+    for code, value in enumerate(CELLS):
+        codes[grid == value] = code
+    players = np.char.isnumeric(grid)
+    codes[players] = PLAYER + grid[players].astype(int)
+    return codes
+
+
+def decode(codes) -> np.ndarray:
+    codes = np.asarray(codes)
+    grid = np.empty(codes.shape, dtype='U4')
+    cells = codes < PLAYER
+    grid[cells] = np.array(CELLS)[codes[cells]]
+    grid[~cells] = (codes[~cells] - PLAYER).astype(str)
+    return grid
+
+
+class BatchEnv:
+    """
+    N matches with the rules of Server.update_player, stepped together.
+
+    Players of a match still update one after the other in id order, like on
+    the server, but each update runs for all matches at once: moving, fog of
+    war, weapon pickup, collisions, collecting next to the player
+    (Map.get_neighbor_values), storing at home, fabric conversion, pauses and
+    the win condition. Dispatcher events other than the win condition are not
+    simulated. Respawned weapons are placed by the batch's own generator, and a
+    store near its capacity takes carried items in r, w, c order.
+
+    Actions are an (N, players) array of directions, -1 to stay. Players
+    collect wood and cotton unless step() is given other items.
+    """
+
+    def __init__(self, n_games: int, n_players: int = Config.MAX_PLAYERS, n_row: int = Config.N_ROW,
+                 n_col: int = Config.N_COL, win_condition: WinConditionEvent = None, max_ticks: int = None,
+                 seed: int = None):
+        self.n_games = n_games
+        self.n_players = n_players
+        self.n_row = n_row
+        self.n_col = n_col
+        win_condition = win_condition or WinConditionEvent()
+        self.n_wood = win_condition.wood
+        self.n_fabric = win_condition.fabric
+        self.ratio = win_condition.fabric_to_cotton_ratio
+        self.max_ticks = max_ticks or int(Config.GAME_DURATION * Config.FPS)
+        self.fps = Config.FPS
+        self.rng = np.random.default_rng(seed)
+        self.points = np.array([ITEM_POINTS.get(item, 0) for item in STORE_ITEMS])
+        # bonus by finish rank, 0 for players that have not won or finished after the bonus places
+        self.bonus = np.zeros(n_players + 1, dtype=int)
+        self.bonus[1:len(FINISH_BONUS) + 1] = FINISH_BONUS[:n_players]
+        self.games = np.arange(n_games)
+
+        shape = (n_games, n_players)
+        self.grid = np.full((n_games, n_row, n_col), GROUND, dtype=np.int16)
+        self.fog = np.full(shape + (n_row, n_col), UNEXPLORED, dtype=np.int16)
+        self.row = np.zeros(shape, dtype=int)
+        self.col = np.zeros(shape, dtype=int)
+        self.home_row = np.zeros(shape, dtype=int)
+        self.home_col = np.zeros(shape, dtype=int)
+        self.status = np.full(shape, PLAYING, dtype=np.int8)
+        self.paused_until = np.zeros(shape)
+        self.armor = np.zeros(shape, dtype=int)
+        self.sword = np.zeros(shape, dtype=int)
+        self.hand = np.zeros(shape + (len(ITEMS),), dtype=bool)
+        self.allow = np.zeros(shape + (len(ITEMS),), dtype=bool)
+        self.allow[..., [ITEMS.index('w'), ITEMS.index('c')]] = True
+        self.store = np.zeros(shape + (len(STORE_ITEMS),), dtype=int)
+        self.scores = np.zeros(shape, dtype=int)
+        self.rank = np.zeros(shape, dtype=int)
+        self.tick = 0
+
+    def reset(self, seeds) -> dict:
+        """One match per seed, on the same maps and homes a server with that MAP_SEED would use."""
+        seeds = list(seeds)
+        if len(seeds) != self.n_games:
+            raise ValueError(f'Need {self.n_games} seeds, got {len(seeds)}')
+        for i, seed in enumerate(seeds):
+            map = Map(self.n_row, self.n_col)
+            map.random_map(seed)
+            # the board places the homes and repairs the map around them
+            board = GameBoard(None, headless=True, map=map, max_players=self.n_players)
+            self.grid[i] = encode(map.grid)
+            self.home_row[i], self.home_col[i] = np.array(board.homes[:self.n_players]).T
+
+        self.fog[:] = UNEXPLORED
+        self.row[:], self.col[:] = self.home_row, self.home_col
+        self.status[:] = PLAYING
+        self.paused_until[:] = 0
+        self.armor[:] = 0
+        self.sword[:] = 0
+        self.hand[:] = False
+        self.store[:] = 0
+        self.scores[:] = 0
+        self.rank[:] = 0
+        self.tick = 0
+        # players are placed one after the other, each sees the ones placed before
+        for p in range(self.n_players):
+            self.grid[self.games, self.row[:, p], self.col[:, p]] = PLAYER + p
+            self.reveal(self.games, p)
+        return self.observations()
+
+    def load(self, servers) -> dict:
+        """Copy the state of running servers (e.g. GameEnv.server), one per match."""
+        ticks = set()
+        for i, server in enumerate(servers):
+            board = server.game_board
+            self.grid[i] = encode(board.map.grid)
+            for p in range(self.n_players):
+                player = board.players[p]
+                self.row[i, p], self.col[i, p] = player.row, player.col
+                self.home_row[i, p], self.home_col[i, p] = player.home_row, player.home_col
+                self.fog[i, p] = encode(player.grid)
+                self.status[i, p] = STATUS[player.status]
+                self.paused_until[i, p] = player.paused_time + player.paused_duration
+                self.armor[i, p], self.sword[i, p] = player.armor, player.sword
+                self.hand[i, p] = [item in player.items_on_hand for item in ITEMS]
+                self.allow[i, p] = [item in player.allow_collect_items for item in ITEMS]
+                self.store[i, p] = [player.store.count(item) for item in STORE_ITEMS]
+            # servers do not keep the order of completion, players who already won are ranked in seat order
+            won = np.nonzero(self.status[i] == WIN)[0]
+            self.rank[i] = 0
+            self.rank[i, won] = np.arange(1, len(won) + 1)
+            ticks.add(board.tick)
+        if len(ticks) != 1:
+            raise ValueError(f'Servers are at different ticks: {sorted(ticks)}')
+        self.tick = ticks.pop()
+        self.scores = self.score()
+        return self.observations()
+
+    def step(self, actions, collect=None) -> tuple[dict, np.ndarray, np.ndarray, dict]:
+        actions = np.asarray(actions).reshape(self.n_games, self.n_players)
+        if collect is not None:
+            self.allow[:] = collect
+        now = self.tick / self.fps
+        for p in range(self.n_players):
+            self.update_player(p, actions[:, p], now)
+        self.tick += 1
+
+        scores = self.score()
+        rewards = scores - self.scores
+        self.scores = scores
+        return self.observations(), rewards, self.done(), {'tick': self.tick}
+
+    def update_player(self, p: int, dirs: np.ndarray, now: float):
+        playing = np.nonzero(self.status[:, p] == PLAYING)[0]
+
+        # a pause ends back home, the player does nothing else this tick
+        resume = np.nonzero((self.status[:, p] == PAUSED) & (self.paused_until[:, p] < now))[0]
+        self.status[resume, p] = PLAYING
+        self.row[resume, p], self.col[resume, p] = self.home_row[resume, p], self.home_col[resume, p]
+        self.grid[resume, self.row[resume, p], self.col[resume, p]] = PLAYER + p
+
+        g = playing
+        row, col, dirs = self.row[g, p], self.col[g, p], dirs[g]
+        moving = (dirs >= 0) & (dirs < len(MOVES))
+        step = MOVES[np.where(moving, dirs, 0)]
+        to_row, to_col = row + step[:, 0], col + step[:, 1]
+        inside = (to_row >= 0) & (to_row < self.n_row) & (to_col >= 0) & (to_col < self.n_col)
+        target = self.grid[g, to_row.clip(0, self.n_row - 1), to_col.clip(0, self.n_col - 1)]
+        moved = moving & inside & np.isin(target, (GROUND, ARMOR, SWORD))
+        self.grid[g[moved], row[moved], col[moved]] = GROUND
+        self.row[g, p] = np.where(moved, to_row, row)
+        self.col[g, p] = np.where(moved, to_col, col)
+
+        self.reveal(g, p)
+        self.collide(g, p, now)
+        self.collect(g, p)
+        self.store_at_home(g, p)
+        self.convert(g, p)
+        won = g[(self.store[g, p, FABRIC] >= self.n_fabric) & (self.store[g, p, ITEMS.index('w')] >= self.n_wood)]
+        self.status[won, p] = WIN
+        won = won[self.rank[won, p] == 0]
+        self.rank[won, p] = (self.rank[won] > 0).sum(axis=1) + 1
+        self.grid[g, self.row[g, p], self.col[g, p]] = PLAYER + p
+
+    def reveal(self, g: np.ndarray, p: int):
+        # Map.copy_grid of the window around the player into its fog grid
+        offsets = np.arange(-VIEW, VIEW + 1)
+        rows = (self.row[g, p][:, None] + offsets).clip(0, self.n_row - 1)[:, :, None]
+        cols = (self.col[g, p][:, None] + offsets).clip(0, self.n_col - 1)[:, None, :]
+        games = g[:, None, None]
+        self.fog[games, p, rows, cols] = self.grid[games, rows, cols]
+
+    def collide(self, g: np.ndarray, p: int, now: float):
+        for dr, dc in NEIGHBORS:
+            row, col = self.row[g, p] + dr, self.col[g, p] + dc
+            inside = (row >= 0) & (row < self.n_row) & (col >= 0) & (col < self.n_col)
+            value = self.fog[g, p, row.clip(0, self.n_row - 1), col.clip(0, self.n_col - 1)]
+            hit = inside & (value >= PLAYER)
+            other = value[hit] - PLAYER
+            playing = self.status[g[hit], other] == PLAYING
+            if playing.any():
+                self.fight(g[hit][playing], p, other[playing], now)
+
+    def fight(self, h: np.ndarray, p: int, q: np.ndarray, now: float):
+        # Server.collision_result, player p against players q
+        p_sword, p_armor = self.sword[h, p] > 0, self.armor[h, p] > 0
+        q_sword, q_armor = self.sword[h, q] > 0, self.armor[h, q] > 0
+        swords = p_sword & q_sword
+        sword_armor = p_sword & ~q_sword & q_armor
+        armor_sword = ~p_sword & p_armor & q_sword
+        beaten = p_sword & ~q_sword & ~q_armor
+
+        self.sword[h[swords | sword_armor], p] = 0
+        self.armor[h[armor_sword], p] = 0
+        self.sword[h[swords], q[swords]] = 0
+        self.armor[h[sword_armor], q[sword_armor]] = 0
+        self.sword[h[armor_sword], q[armor_sword]] = 0
+
+        h, q = h[beaten], q[beaten]
+        self.hand[h, q] = False
+        self.grid[h, self.row[h, q], self.col[h, q]] = GROUND
+        self.row[h, q], self.col[h, q] = self.home_row[h, q], self.home_col[h, q]
+        self.status[h, q] = PAUSED
+        self.paused_until[h, q] = now + Config.PAUSED_TIME
+
+    def collect(self, g: np.ndarray, p: int):
+        row, col = self.row[g, p], self.col[g, p]
+        # weapons are picked up on the cell itself and respawn elsewhere
+        cell = self.grid[g, row, col]
+        for code, weapon in ((ARMOR, self.armor), (SWORD, self.sword)):
+            taken = g[(cell == code) & (weapon[g, p] == 0)]
+            weapon[taken, p] += 1
+            self.grid[taken, self.row[taken, p], self.col[taken, p]] = GROUND
+            for i in taken:
+                self.respawn(i, code)
+
+        for dr, dc in MOVES:
+            r, c = row + dr, col + dc
+            inside = (r >= 0) & (r < self.n_row) & (c >= 0) & (c < self.n_col)
+            value = self.grid[g, r.clip(0, self.n_row - 1), c.clip(0, self.n_col - 1)]
+            found = inside & (value >= FOOD) & (value <= COTTON)
+            games, items = g[found], value[found] - FOOD
+            allowed = self.allow[games, p, items]
+            self.hand[games[allowed], p, items[allowed]] = True
+
+    def respawn(self, i: int, code: int):
+        # Map.random_item: a random ground cell off the border
+        while True:
+            r, c = self.rng.integers(1, self.n_row), self.rng.integers(1, self.n_col)
+            if self.grid[i, r, c] == GROUND:
+                self.grid[i, r, c] = code
+                return
+
+    def store_at_home(self, g: np.ndarray, p: int):
+        home = g[(self.row[g, p] == self.home_row[g, p]) & (self.col[g, p] == self.home_col[g, p])]
+        hand = self.hand[home, p]
+        capacity = Config.MAX_STORAGE_CAPACITY - self.store[home, p].sum(axis=1)
+        stored = hand & (np.cumsum(hand, axis=1) <= capacity[:, None])
+        self.store[home, p, :FABRIC] += stored
+        self.hand[home, p] = hand & ~stored
+
+    def convert(self, g: np.ndarray, p: int):
+        cotton = self.store[g, p, ITEMS.index('c')]
+        self.store[g, p, FABRIC] += cotton // self.ratio
+        self.store[g, p, ITEMS.index('c')] = cotton % self.ratio
+
+    def score(self) -> np.ndarray:
+        return self.store @ self.points + BOAT_POINTS * (self.status == WIN) + self.bonus[self.rank]
+
+    def done(self) -> np.ndarray:
+        return (self.tick >= self.max_ticks) | (self.status == WIN).all(axis=1)
+
+    def observations(self) -> dict:
+        return {
+            'grid': self.fog.copy(),
+            'row': self.row.copy(),
+            'col': self.col.copy(),
+            'hand': self.hand.copy(),
+            'store': self.store.copy(),
+            'armor': self.armor.copy(),
+            'sword': self.sword.copy(),
+            'status': self.status.copy(),
+        }
@@ -0,0 +1,214 @@
+# bench.py
+# Tick performance regression suite: replays input traces headless and compares tick times with a baseline.
+#   python bench.py --save                      # measure this machine's baseline
+#   python bench.py                             # fail when the p95 tick time regressed more than 35%
+#   python bench.py --traces replays/*.replay   # recorded matches instead of the generated traces
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bots import BOTS
+from logs import set_quiet
+from replay import replay
+from tournament import HeadlessMatch, parse_seeds
+
+# phase name: (object, method) timed within a tick, the move..win phases are part of update
+PHASES = {
+    'events': ('server', 'process_events'),
+    'update': ('server', 'update'),
+    'move': ('server', 'move_player'),
+    'fog': ('game_board', 'update_nearby_map_area'),
+    'collision': ('server', 'collision'),
+    'collect': ('server', '_collect_items'),
+    'store': ('server', '_store_items_if_at_home'),
+    'convert': ('server', 'convert_wood_cotton_to_fabric'),
+    'win': ('server', '_check_win_condition'),
+    'advance': ('game_board', 'advance_tick'),
+}
+PERCENTILES = (50, 95, 99)
+
+
+class TickTimer:
+    """Wraps a server's methods (on the instance) to sum each phase's time per tick and time every step."""
+
+    def __init__(self):
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.ticks: list[float] = []
+        self.phases: dict[str, list[float]] = {name: [] for name in PHASES}
+
+    def instrument(self, server):
+        owners = {'server': server, 'game_board': server.game_board}
+        for name, (owner, method) in PHASES.items():
+            setattr(owners[owner], method, self.timed(name, getattr(owners[owner], method)))
+
+        step = server.step
+
+        def timed_step(*args, **kwargs):
+            started = time.perf_counter()
+            step(*args, **kwargs)
+            self.ticks.append(time.perf_counter() - started)
+            for name, value in self.current.items():
+                self.phases[name].append(value)
+                self.current[name] = 0.0
+
+        server.step = timed_step
+
+    def timed(self, name, method):
+        current = self.current
+
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                current[name] += time.perf_counter() - started
+
+        return wrapper
+
+
+def distribution(seconds: list[float]) -> dict:
+    """Mean, percentiles and max in microseconds."""
+    values = np.asarray(seconds) * 1e6
+    if not len(values):
+        return {}
+    result = {'mean': float(values.mean())}
+    for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        result[f'p{q}'] = float(value)
+    result['max'] = float(values.max())
+    return result
+
+
+def generate_traces(directory: str, seeds, bot_names: list[str], ticks: int) -> list[str]:
+    """One recorded bot match per seed, generated once and kept so later runs replay the same inputs."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for seed in seeds:
+        path = os.path.join(directory, f'seed_{seed}.replay')
+        if not os.path.exists(path):
+            bots = [BOTS[name](seed=seed * 1000 + i) for i, name in enumerate(bot_names)]
+            HeadlessMatch(bots, seed, max_ticks=ticks, replay_path=path).run()
+        paths.append(path)
+    return paths
+
+
+def median_distribution(distributions: list[dict]) -> dict:
+    """Median of each statistic over repeated replays, one slow replay does not move it."""
+    return {key: float(np.median([dist[key] for dist in distributions])) for key in distributions[0]}
+
+
+def time_replay(path: str) -> tuple[dict, dict, int, bool | None]:
+    """Worker entry point: an untimed warm-up replay, then a timed one; its tick and phase distributions."""
+    set_quiet()
+    replay(path)[0].close()
+    timer = TickTimer()
+    gc.collect()
+    # a collection inside a tick is noise the trace does not cause itself
+    gc.disable()
+    try:
+        server, matches = replay(path, timer.instrument)
+    finally:
+        gc.enable()
+    server.close()
+    phases = {name: distribution(values) for name, values in timer.phases.items()}
+    return distribution(timer.ticks), phases, len(timer.ticks), matches
+
+
+def run_trace(path: str, repeat: int = 5) -> dict:
+    """
+    Tick and phase time distributions of a trace, each statistic the median over
+    `repeat` replays, and whether every final state matched (None when the
+    trace has no final digest to check).
+
+    Timings differ more between processes than between replays in one process
+    (memory layout, hash seeds), so each replay runs in a fresh process, one at
+    a time.
+    """
+    runs = []
+    context = multiprocessing.get_context('spawn')
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            runs.append(pool.submit(time_replay, path).result())
+    matched = [matches for _, _, _, matches in runs]
+    return {
+        'ticks': runs[0][2],
+        'matches': False if False in matched else None if None in matched else True,
+        'tick': median_distribution([tick for tick, _, _, _ in runs]),
+        'phases': {name: median_distribution([phases[name] for _, phases, _, _ in runs]) for name in PHASES},
+    }
+
+
+def run_suite(paths: list[str], repeat: int = 5) -> dict:
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'traces': {os.path.basename(path): run_trace(path, repeat) for path in paths},
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> tuple[pd.DataFrame, list[str]]:
+    """Table of tick and phase times against the baseline, and the failures: changed final states, p95 regressions."""
+    rows, failures = [], []
+    for trace, result in results['traces'].items():
+        if result['matches'] is None:
+            failures.append(f'{trace}: no final digest, the recording server was not closed, determinism not checked')
+        elif not result['matches']:
+            failures.append(f'{trace}: final state differs from the recording')
+        base = (baseline or {}).get('traces', {}).get(trace)
+        for phase, dist in [('tick', result['tick'])] + list(result['phases'].items()):
+            base_dist = (base['tick'] if phase == 'tick' else base['phases'].get(phase, {})) if base else {}
+            base_p95 = base_dist.get('p95')
+            change = dist['p95'] / base_p95 - 1 if base_p95 else None
+            rows.append({'trace': trace, 'phase': phase, **{k: round(v, 1) for k, v in dist.items()},
+                         'baseline_p95': None if base_p95 is None else round(base_p95, 1),
+                         'change': None if change is None else f'{change:+.0%}'})
+            if phase == 'tick' and change is not None and change > threshold:
+                failures.append(f'{trace}: p95 tick time {dist["p95"]:.0f} us, baseline {base_p95:.0f} us ({change:+.0%})')
+        if baseline and base is None:
+            print(f'{trace}: no baseline, not compared')
+    return pd.DataFrame(rows), failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay input traces headless and compare tick times with a baseline')
+    parser.add_argument('--traces', nargs='*', default=None, help='recorded replay files, default: generated traces')
+    parser.add_argument('--dir', default='bench_traces', help='where the generated traces are kept')
+    parser.add_argument('--seeds', default='0-2', help='seeds of the generated traces: 0-99 or 1,5,7')
+    parser.add_argument('--bots', default='greedy,greedy,greedy,random,random')
+    parser.add_argument('--ticks', type=int, default=1500, help='length of the generated traces')
+    parser.add_argument('--repeat', type=int, default=5, help='timed replays of each trace')
+    parser.add_argument('--baseline', default='bench_baseline.json')
+    parser.add_argument('--threshold', type=float, default=0.35,
+                        help='allowed p95 tick time regression, 0.35 = 35%%')
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    args = parser.parse_args()
+
+    set_quiet()
+    paths = args.traces or generate_traces(args.dir, parse_seeds(args.seeds), args.bots.split(','), args.ticks)
+    results = run_suite(paths, args.repeat)
+
+    baseline = None
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    table, failures = compare(results, baseline, args.threshold)
+    print(table.to_string(index=False))
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Wrote baseline of {len(paths)} traces to {args.baseline}')
+    elif baseline is None:
+        print(f'No baseline at {args.baseline}, run with --save first')
+    for failure in failures:
+        print(f'FAIL {failure}')
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,128 @@
+# bots.py
+# Scripted policies for headless matches (tournament.py), no LLM and no sockets.
+import random
+from collections import deque
+
+import enums
+from enums import PlayerStatus
+
+
+MOVES = [
+    (0, -1, enums.Direction.LEFT.value),
+    (0, 1, enums.Direction.RIGHT.value),
+    (-1, 0, enums.Direction.UP.value),
+    (1, 0, enums.Direction.DOWN.value),
+]
+
+# players walk on these, unexplored cells ('-1') are assumed walkable
+WALKABLE = {'g', 'a', 's', '-1'}
+
+
+class Bot:
+    """A policy plays one player: act() returns a direction or None, once per tick."""
+
+    def __init__(self, seed: int = None):
+        self.rng = random.Random(seed)
+
+    def act(self, player, server) -> int | None:
+        raise NotImplementedError
+
+
+class RandomBot(Bot):
+    def act(self, player, server):
+        player.allow_collect_items = ['w', 'c']
+        return self.rng.choice(MOVES)[2]
+
+
+class GreedyBot(Bot):
+    """
+    Collects the items still missing for the boat and brings them home.
+
+    Walks to the nearest known cell next to a needed resource, explores the
+    nearest unexplored cell when none is known, and stays away from burning wood.
+    """
+
+    def __init__(self, seed: int = None):
+        super().__init__(seed)
+        self.path: list[tuple[int, int, int]] = []
+
+    def needed_items(self, player, server):
+        wood = server.WIND_N_WOOD or 0
+        fabric = server.WIND_N_FABRIC or 0
+        ratio = server.FABRIC_TO_COTTON_RATIO or 1
+        store = player.store
+        items = []
+        if store.count('w') < wood:
+            items.append('w')
+        if store.count('fa') * ratio + store.count('c') < fabric * ratio:
+            items.append('c')
+        return items
+
+    def act(self, player, server):
+        if player.status != PlayerStatus.PLAYING:
+            self.path = []
+            return None
+
+        fire = server.game_board.fire_active()
+        needed = [item for item in self.needed_items(player, server) if not (fire and item == 'w')]
+        player.allow_collect_items = needed
+        missing = [item for item in needed if item not in player.items_on_hand]
+
+        grid = player.grid
+        position = (player.row, player.col)
+        home = (player.home_row, player.home_col)
+        if player.items_on_hand and (not missing or position == home):
+            goal = lambda r, c: (r, c) == home
+        elif missing:
+            goal = lambda r, c: any(grid[r + dr, c + dc] in missing for dr, dc, _ in MOVES
+                                    if 0 <= r + dr < grid.shape[0] and 0 <= c + dc < grid.shape[1])
+        else:
+            return None
+
+        # keep following the planned path while its next cell is still free
+        if self.path:
+            row, col, move = self.path[0]
+            if grid[row, col] in WALKABLE and goal(*self.path[-1][:2]):
+                self.path.pop(0)
+                return move
+        self.path = self.search(grid, position, goal)
+        if self.path is None:
+            # nothing reachable known: explore the nearest unexplored cell
+            self.path = self.search(grid, position, lambda r, c: grid[r, c] == '-1') or []
+        if not self.path:
+            return self.rng.choice(MOVES)[2]
+        row, col, move = self.path.pop(0)
+        return move
+
+    @staticmethod
+    def search(grid, start, goal):
+        """Breadth-first search over walkable cells, the path as (row, col, move) steps."""
+        if goal(*start):
+            return []
+        n_row, n_col = grid.shape
+        parents = {start: None}
+        queue = deque([start])
+        while queue:
+            r, c = queue.popleft()
+            for dr, dc, move in MOVES:
+                cell = (r + dr, c + dc)
+                if cell in parents or not (0 <= cell[0] < n_row and 0 <= cell[1] < n_col):
+                    continue
+                if grid[cell] not in WALKABLE:
+                    continue
+                parents[cell] = ((r, c), move)
+                if goal(*cell):
+                    path = []
+                    while parents[cell] is not None:
+                        previous, move = parents[cell]
+                        path.append((cell[0], cell[1], move))
+                        cell = previous
+                    return path[::-1]
+                queue.append(cell)
+        return None
+
+
+BOTS = {
+    'random': RandomBot,
+    'greedy': GreedyBot,
+}
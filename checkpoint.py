@@ -0,0 +1,226 @@
+# checkpoint.py
+# Periodic checkpoints of a running match in a memory-mapped file, resumed by a restarted server.
+#   CHECKPOINT_DIR=checkpoints python server.py
+import mmap
+import os
+import pickle
+import queue
+import struct
+import threading
+import zlib
+
+from enums import GameStatus
+from logs import log
+from map import Map
+
+MAGIC = b'GCHKPT01'
+VERSION = 1
+# file: magic and slot size, then two slots written in turn, so a crash while writing keeps the other one
+FILE_HEAD = struct.Struct('<8sQ')
+# slot: sequence number, tick, length and crc32 of the pickled state that follows
+SLOT_HEAD = struct.Struct('<QQII')
+SLOT_SIZE = 1 << 20
+
+
+def copy_player(player):
+    # the lists and the grid change every tick, the rest are immutable values
+    return player.model_copy(update={
+        'grid': player.grid.copy(),
+        'store': list(player.store),
+        'items_on_hand': list(player.items_on_hand),
+        'allow_collect_items': list(player.allow_collect_items),
+        'in_process_move_messages': [],
+        'components': None,
+    })
+
+
+def capture(server) -> dict:
+    """Copy of the match state, taken on the tick thread between two ticks."""
+    board = server.game_board
+    map = board.map
+    return {
+        'version': VERSION,
+        'name': server.name,
+        'tick': board.tick,
+        'game_status': board.game_status,
+        'messages': list(board.messages),
+        'message_tick_remaining': board.message_tick_remaining,
+        'n_row': map.n_row,
+        'n_col': map.n_col,
+        'chunk_size': map.chunk_size,
+        'seed': map.seed,
+        'rng_state': map.rng.getstate(),
+        'grid': map.grid.copy(),
+        'players': [copy_player(player) for player in list(board.players.values())],
+        'current_event': server.current_event,
+        'start_event_at_tick': server.start_event_at_tick,
+        'end_event_at_tick': server.end_event_at_tick,
+        'event_triggers': pickle.loads(pickle.dumps(server.event_triggers)),
+        'win_condition': (server.WIND_N_FABRIC, server.WIND_N_WOOD, server.FABRIC_TO_COTTON_RATIO),
+        'combat_count': server.combat_count,
+        'tick_time': server.tick_time,
+        'pending_events': list(server.pending_events),
+    }
+
+
+def checkpoint_map(state: dict) -> Map:
+    map = Map(state['n_row'], state['n_col'], seed=state['seed'], chunk_size=state['chunk_size'])
+    map.grid = state['grid']
+    map.rng.setstate(state['rng_state'])
+    return map
+
+
+def restore(server, state: dict):
+    """Puts a captured state into a server built on checkpoint_map(state). Players wait for their clients."""
+    board = server.game_board
+    board.tick = state['tick']
+    board.game_status = state['game_status']
+    board.messages = state['messages']
+    board.message_tick_remaining = state['message_tick_remaining']
+    board.players = {player.id: player for player in state['players']}
+    server.current_event = state['current_event']
+    server.start_event_at_tick = state['start_event_at_tick']
+    server.end_event_at_tick = state['end_event_at_tick']
+    server.event_triggers = state['event_triggers']
+    server.WIND_N_FABRIC, server.WIND_N_WOOD, server.FABRIC_TO_COTTON_RATIO = state['win_condition']
+    server.combat_count = state['combat_count']
+    server.tick_time = state['tick_time']
+    server.pending_events = state['pending_events']
+    # hazard masks are rebuilt from the map when the event is processed
+    server.hazards.clear()
+
+
+def read_slots(data) -> list[tuple[int, bytes]]:
+    magic, slot_size = FILE_HEAD.unpack_from(data, 0)
+    if magic != MAGIC:
+        return []
+    slots = []
+    for slot in range(2):
+        offset = FILE_HEAD.size + slot * slot_size
+        if offset + SLOT_HEAD.size > len(data):
+            continue
+        sequence, tick, length, crc = SLOT_HEAD.unpack_from(data, offset)
+        start = offset + SLOT_HEAD.size
+        if not sequence or start + length > len(data):
+            continue
+        payload = data[start:start + length]
+        if zlib.crc32(payload) != crc:
+            continue
+        slots.append((sequence, payload))
+    return slots
+
+
+def load_checkpoint(path: str) -> dict | None:
+    """Latest complete checkpoint of an unfinished match at `path`, None if there is none."""
+    if not path or not os.path.exists(path) or os.path.getsize(path) < FILE_HEAD.size:
+        return None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        slots = read_slots(data)
+    if not slots:
+        return None
+    sequence, payload = max(slots, key=lambda slot: slot[0])
+    state = pickle.loads(payload)
+    if state.get('version') != VERSION or state['game_status'] == GameStatus.FINISHED:
+        return None
+    state['sequence'] = sequence
+    return state
+
+
+class Checkpointer:
+    """
+    Writes a checkpoint every `interval` ticks. The tick thread only copies the
+    state (copy-on-snapshot); a writer thread pickles it into the older of two
+    slots of a memory-mapped file. While a checkpoint still waits for the
+    writer the next one is skipped, the tick never waits for the disk.
+    """
+
+    def __init__(self, path: str, interval: int, sequence: int = 0):
+        self.path = path
+        self.interval = max(1, interval)
+        self.sequence = sequence
+        self.last_tick = None
+        self.skipped = 0
+        self.slot_size = SLOT_SIZE
+        self.file = None
+        self.data = None
+        self.open(keep=sequence > 0)
+        self.states: queue.Queue = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.write_states, daemon=True)
+        self.thread.start()
+        log(f'Checkpoint every {self.interval} ticks to {path}', '[CHECKPOINT]')
+
+    def open(self, keep: bool = False):
+        """Maps the file, a resumed match keeps the checkpoint it was resumed from."""
+        if keep and os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                _, self.slot_size = FILE_HEAD.unpack(f.read(FILE_HEAD.size))
+        else:
+            with open(self.path, 'wb') as f:
+                f.write(FILE_HEAD.pack(MAGIC, self.slot_size))
+        self.file = open(self.path, 'r+b')
+        self.file.truncate(FILE_HEAD.size + 2 * self.slot_size)
+        self.data = mmap.mmap(self.file.fileno(), 0)
+
+    def maybe_save(self, server):
+        board = server.game_board
+        if board.game_status == GameStatus.FINISHED:
+            return
+        # the tick restarts from 0 when the game starts
+        if self.last_tick is not None and 0 <= board.tick - self.last_tick < self.interval:
+            return
+        self.last_tick = board.tick
+        if self.states.full():
+            self.skipped += 1
+            return
+        self.states.put(capture(server))
+
+    def write_states(self):
+        while True:
+            state = self.states.get()
+            if state is None:
+                return
+            try:
+                self.write(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), state['tick'])
+            except Exception as e:
+                log(f'Checkpoint failed: {e}', '[CHECKPOINT]')
+
+    def write(self, payload: bytes, tick: int):
+        if SLOT_HEAD.size + len(payload) > self.slot_size:
+            self.grow(len(payload))
+        self.sequence += 1
+        offset = FILE_HEAD.size + (self.sequence % 2) * self.slot_size
+        # the head is written last, a slot is only valid once its crc matches
+        self.data[offset:offset + SLOT_HEAD.size] = SLOT_HEAD.pack(0, 0, 0, 0)
+        self.data[offset + SLOT_HEAD.size:offset + SLOT_HEAD.size + len(payload)] = payload
+        self.data[offset:offset + SLOT_HEAD.size] = SLOT_HEAD.pack(self.sequence, tick, len(payload),
+                                                                   zlib.crc32(payload))
+        self.data.flush()
+
+    def grow(self, size: int):
+        # larger slots need a new file, it replaces the old one once it holds this checkpoint's predecessor
+        slot_size = self.slot_size
+        while SLOT_HEAD.size + size > slot_size:
+            slot_size *= 2
+        previous = max(read_slots(self.data), key=lambda slot: slot[0], default=None)
+        self.data.close()
+        self.file.close()
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(FILE_HEAD.pack(MAGIC, slot_size))
+            f.truncate(FILE_HEAD.size + 2 * slot_size)
+            if previous is not None:
+                sequence, payload = previous
+                f.seek(FILE_HEAD.size + (sequence % 2) * slot_size)
+                f.write(SLOT_HEAD.pack(sequence, 0, len(payload), zlib.crc32(payload)) + payload)
+        os.replace(tmp, self.path)
+        self.slot_size = slot_size
+        self.open(keep=True)
+
+    def close(self, remove: bool = True):
+        """Stops the writer. A match closed on purpose removes its checkpoint, only a crash leaves one behind."""
+        self.states.put(None)
+        self.thread.join()
+        self.data.close()
+        self.file.close()
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
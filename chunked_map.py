@@ -0,0 +1,175 @@
+import numpy as np
+
+
+class ChunkedGrid:
+    """
+    2D grid stored as fixed-size square chunks, allocated on first write.
+
+    Unallocated chunks read as `fill`, so a huge map that is mostly ground,
+    or a fog-of-war grid that is mostly unexplored, only costs memory for the
+    chunks that differ. Every write bumps the chunk's version: consumers keep
+    a copy (or the versions they saw) and only look at chunks that changed.
+
+    Supports the indexing the game uses on dense grids: grid[r, c] and
+    grid[r1:r2, c1:c2] for reads (a dense copy) and writes (scalar or array).
+    np.asarray(grid) builds the dense array, for code that needs the whole map.
+    """
+
+    def __init__(self, shape: tuple[int, int], fill: str, dtype='U4', chunk_size: int = 64):
+        self.shape = tuple(shape)
+        self.fill = fill
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.chunks: dict[tuple[int, int], np.ndarray] = {}
+        self.versions: dict[tuple[int, int], int] = {}
+        self.version = 0
+
+    @staticmethod
+    def from_dense(grid: np.ndarray, fill: str, chunk_size: int = 64) -> 'ChunkedGrid':
+        chunked = ChunkedGrid(grid.shape, fill, grid.dtype, chunk_size)
+        chunked[0:grid.shape[0], 0:grid.shape[1]] = grid
+        return chunked
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    def chunk_shape(self, key):
+        cs = self.chunk_size
+        return (min(cs, self.shape[0] - key[0] * cs), min(cs, self.shape[1] - key[1] * cs))
+
+    def chunk(self, key, allocate: bool = False):
+        chunk = self.chunks.get(key)
+        if chunk is None and allocate:
+            chunk = self.chunks[key] = np.full(self.chunk_shape(key), self.fill, dtype=self.dtype)
+        return chunk
+
+    def touch(self, key):
+        self.version += 1
+        self.versions[key] = self.version
+
+    def ranges(self, index):
+        """(r1, r2, c1, c2) half-open bounds of an index, and whether it is a single cell."""
+        if not isinstance(index, tuple) or len(index) != 2:
+            raise IndexError('ChunkedGrid needs a (row, col) index')
+        bounds = []
+        for i, n in zip(index, self.shape):
+            if isinstance(i, slice):
+                start, stop, step = i.indices(n)
+                if step != 1:
+                    raise IndexError('ChunkedGrid slices must have step 1')
+                bounds += [start, max(start, stop)]
+            else:
+                i = int(i)
+                if i < 0:
+                    i += n
+                if not 0 <= i < n:
+                    raise IndexError(f'index {i} out of bounds for size {n}')
+                bounds += [i, i + 1]
+        return bounds, not any(isinstance(i, slice) for i in index)
+
+    def blocks(self, r1, r2, c1, c2):
+        """Chunks overlapping a rectangle: key, slice in the chunk, slice in the rectangle."""
+        cs = self.chunk_size
+        for cr in range(r1 // cs, (r2 - 1) // cs + 1 if r2 > r1 else r1 // cs):
+            for cc in range(c1 // cs, (c2 - 1) // cs + 1 if c2 > c1 else c1 // cs):
+                rs, re = max(r1, cr * cs), min(r2, (cr + 1) * cs)
+                cs_, ce = max(c1, cc * cs), min(c2, (cc + 1) * cs)
+                yield ((cr, cc),
+                       (slice(rs - cr * cs, re - cr * cs), slice(cs_ - cc * cs, ce - cc * cs)),
+                       (slice(rs - r1, re - r1), slice(cs_ - c1, ce - c1)))
+
+    def __getitem__(self, index):
+        (r1, r2, c1, c2), cell = self.ranges(index)
+        if cell:
+            chunk = self.chunks.get((r1 // self.chunk_size, c1 // self.chunk_size))
+            if chunk is None:
+                return self.dtype.type(self.fill)
+            return chunk[r1 % self.chunk_size, c1 % self.chunk_size]
+        out = np.full((r2 - r1, c2 - c1), self.fill, dtype=self.dtype)
+        for key, inner, outer in self.blocks(r1, r2, c1, c2):
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                out[outer] = chunk[inner]
+        return out
+
+    def __setitem__(self, index, value):
+        (r1, r2, c1, c2), _ = self.ranges(index)
+        value = np.asarray(value, dtype=self.dtype)
+        if value.ndim:
+            value = np.broadcast_to(value, (r2 - r1, c2 - c1))
+        for key, inner, outer in self.blocks(r1, r2, c1, c2):
+            part = value[outer] if value.ndim else value
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                # writing the fill value into an unallocated chunk changes nothing
+                if np.all(part == self.fill):
+                    continue
+                chunk = self.chunk(key, allocate=True)
+            chunk[inner] = part
+            self.touch(key)
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self[0:self.shape[0], 0:self.shape[1]]
+        return dense if dtype is None else dense.astype(dtype)
+
+    def to_dense(self) -> np.ndarray:
+        return np.asarray(self)
+
+    def __eq__(self, other):
+        return np.asarray(self) == other
+
+    def __ne__(self, other):
+        return np.asarray(self) != other
+
+    def tolist(self):
+        return np.asarray(self).tolist()
+
+    def copy(self) -> 'ChunkedGrid':
+        other = ChunkedGrid(self.shape, self.fill, self.dtype, self.chunk_size)
+        other.chunks = {key: chunk.copy() for key, chunk in self.chunks.items()}
+        other.versions = dict(self.versions)
+        other.version = self.version
+        return other
+
+    def argwhere(self, predicate) -> np.ndarray:
+        """(row, col) of the cells where predicate(chunk) is True, the fill must not match."""
+        if predicate(np.array([self.fill], dtype=self.dtype))[0]:
+            raise ValueError(f'predicate matches the fill value {self.fill!r}, use a dense grid')
+        found = [np.argwhere(predicate(chunk)) + (key[0] * self.chunk_size, key[1] * self.chunk_size)
+                 for key, chunk in self.chunks.items()]
+        return np.concatenate(found) if found else np.empty((0, 2), dtype=int)
+
+    def changed_since(self, versions: dict) -> list[tuple[int, int]]:
+        """Keys of the chunks written after the given versions (e.g. those of an older copy)."""
+        return [key for key, version in self.versions.items() if versions.get(key) != version]
+
+
+def argwhere(grid, predicate) -> np.ndarray:
+    """np.argwhere(predicate(grid)) for dense grids, only allocated chunks for chunked ones."""
+    if isinstance(grid, ChunkedGrid):
+        return grid.argwhere(predicate)
+    return np.argwhere(predicate(grid))
+
+
+def changed_cells(old, new) -> np.ndarray:
+    """(row, col) of the cells that differ; chunked grids only compare rewritten chunks."""
+    if isinstance(new, ChunkedGrid) and isinstance(old, ChunkedGrid) and old.chunk_size == new.chunk_size:
+        found = []
+        cs = new.chunk_size
+        for key in new.changed_since(old.versions):
+            a = old.chunk(key)
+            b = new.chunk(key)
+            a = np.full(new.chunk_shape(key), old.fill, dtype=new.dtype) if a is None else a
+            b = np.full(new.chunk_shape(key), new.fill, dtype=new.dtype) if b is None else b
+            found.append(np.argwhere(a != b) + (key[0] * cs, key[1] * cs))
+        return np.concatenate(found) if found else np.empty((0, 2), dtype=int)
+    return np.argwhere(np.asarray(old) != np.asarray(new))
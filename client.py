@@ -9,28 +9,85 @@ import threading
 
 from message import (
     Message, MoveMessage, RemoveInProcessMoveMessage, SetPlayerNameMessage, 
-    GetPlayerMessage, AllowCollectItemsMessage, StillAliveMessage
+    GetPlayerMessage, AllowCollectItemsMessage, StillAliveMessage, JoinRoomMessage, ReattachMessage
 )
 from config import Config
+from profiler import SamplingProfiler
+from memory import MemoryMonitor
 
 load_dotenv()
 
 
 class Client:
-    def __init__(self, host=None, port=None):
+    # attributes of a bot subclass that should stay bounded, watched with MEMORY_INTERVAL
+    MEMORY_GAUGES: tuple[str, ...] = ()
+
+    def __init__(self, host=None, port=None, room=None):
 
         self.host = host or os.environ.get('SERVER', '0.0.0.0')
         self.port = port or int(os.environ.get('PORT', 4444))
+        # room of a room server (rooms.py), None lets the server choose
+        self.room = room or os.environ.get('ROOM')
 
         log(f'Listern to {self.host}:{self.port}', '[CLIENT]')
 
         self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.client_socket.connect((self.host, self.port))
+        self.reattach_lock = threading.Lock()
+        # a room server uses it to seat the player, a single server ignores it
+        self.send_message(JoinRoomMessage(room=self.room))
         self.player = self.receive_message()
         time.sleep(1)  # Allow some time for the player to be set
         log(f"Receive client from server: {self.player}", '[CLIENT]')
 
-        threading.Thread(target=self.ping_pong_message, daemon=True).start()
+        self.ping_thread = threading.Thread(target=self.ping_pong_message, daemon=True)
+        self.ping_thread.start()
+
+        # PROFILE=1 samples the bot's own threads, see profiler.py
+        self.profiler = None
+        if os.environ.get('PROFILE') == '1':
+            self.profiler = SamplingProfiler(f'client_{self.player.id}',
+                                             directory=os.environ.get('PROFILE_DIR') or 'profiles',
+                                             format=os.environ.get('PROFILE_FORMAT') or 'collapsed').start()
+        # MEMORY_INTERVAL logs leak alarms of the bot's state, see memory.py; client.memory.snapshot() has the rest
+        self.memory = None
+        if float(os.environ.get('MEMORY_INTERVAL') or 0):
+            self.memory = MemoryMonitor(float(os.environ['MEMORY_INTERVAL']), self.memory_gauges)
+            self.memory.start()
+
+    def reattach(self, attempts: int = 30, delay: float = 1.0):
+        """Reconnect to a restarted server resumed from a checkpoint and take over the same player again."""
+        if self.player is None:
+            raise ConnectionError('The server never gave this client a player to reattach')
+        self.client_socket.close()
+        for _ in range(attempts):
+            try:
+                self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.client_socket.connect((self.host, self.port))
+                break
+            except OSError:
+                self.client_socket.close()
+                time.sleep(delay)
+        else:
+            raise ConnectionError(f'Server {self.host}:{self.port} did not come back')
+        send(self.client_socket, ReattachMessage(player_id=self.player.id, token=self.player.token))
+        player = self.receive_message()
+        # a server that was not resumed would seat us as a new player
+        if getattr(player, 'id', None) != self.player.id:
+            self.client_socket.close()
+            raise ConnectionError(f'Server refused to reattach player {self.player.id}')
+        self.player = player
+        log(f'Reattached to player {self.player.id}', '[CLIENT]')
+        if not self.ping_thread.is_alive():
+            self.ping_thread = threading.Thread(target=self.ping_pong_message, daemon=True)
+            self.ping_thread.start()
+
+    def reconnect(self, failed):
+        # the thread that notices first reattaches, the others use its new socket
+        with self.reattach_lock:
+            if self.client_socket is failed:
+                log(f'Lost the server {self.host}:{self.port}, reattach', '[CLIENT]')
+                self.reattach()
     
     def ping_pong_message(self):
         while True:
@@ -52,7 +109,24 @@ class Client:
         self.player.map[row * Config.N_COL + col] = val
 
     def send_message(self, msg: Message):
-        send(self.client_socket, msg)
+        sock = self.client_socket
+        try:
+            send(sock, msg)
+        except OSError:
+            # the server went down, a restarted one resumes the match from its checkpoint
+            self.reconnect(sock)
+            send(self.client_socket, msg)
+
+    def request(self, msg: Message):
+        """Send a message and return the server's reply, asked again after reattaching when the server went down."""
+        sock = self.client_socket
+        self.send_message(msg)
+        reply = self.receive_message()
+        if reply is None:
+            self.reconnect(sock)
+            self.send_message(msg)
+            reply = self.receive_message()
+        return reply
     
     def clear_in_process_messages(self):
         self.send_message(RemoveInProcessMoveMessage())
@@ -84,15 +158,20 @@ class Client:
         return self.player.grid[r1:r2, c1:c2]
 
     def get_player(self):
-        self.send_message(GetPlayerMessage())
-        self.player = self.receive_message()
+        self.player = self.request(GetPlayerMessage())
         return self.player
     
     def allow_collect_items(self, items=['w','c']):
-        self.send_message(AllowCollectItemsMessage(items=items))
-        allowed_items = self.receive_message()
+        allowed_items = self.request(AllowCollectItemsMessage(items=items))
         return allowed_items
         
+    def memory_gauges(self) -> dict:
+        return {name: len(getattr(self, name, ())) for name in self.MEMORY_GAUGES}
+
     def close(self):    
+        if self.profiler:
+            self.profiler.stop()
+        if self.memory:
+            self.memory.stop()
         self.client_socket.close()
         log('Client closed', '[CLIENT]')
\ No newline at end of file
@@ -8,10 +8,11 @@ class Config:
 
     
     # PLAYER
-    
+    MAX_PLAYERS:int = 5
     
     # DEAD_TIME
-    PAUSED_TIME:int=30 # in seconds
+    PAUSED_TIME:int=30 # in seconds, after losing a fight or a diamond punishment
+    FIRE_PAUSED_FACTOR:float=1.5 # fire pause = PAUSED_TIME * FIRE_PAUSED_FACTOR
     
     # STORE
     MAX_STORAGE_CAPACITY = 50
@@ -25,6 +26,8 @@ class Config:
     N_COL:int = 32
     CELL_SIZE: int = 42
     OPEN_CELL: int = 4
+    # 0: dense grids, > 0: chunks of MAP_CHUNK_SIZE x MAP_CHUNK_SIZE cells allocated on write
+    MAP_CHUNK_SIZE: int = 0
     
     MAP_NUMBER_FOOT:int = 2
     MAP_NUMBER_WOOD:int = 2
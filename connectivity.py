@@ -0,0 +1,142 @@
+import numpy as np
+
+from chunked_map import ChunkedGrid
+
+
+# players cannot walk through resources, everything else (ground, armor,
+# sword, players, unknown cells) is passable
+OBSTACLES = ('r', 'w', 'c')
+# label of the cells a player has not seen, see visible_components
+UNSEEN = -2
+
+
+def passable(grid: np.ndarray) -> np.ndarray:
+    return ~np.isin(grid, OBSTACLES)
+
+
+def label_components(grid, cells=passable) -> np.ndarray:
+    """
+    Label the 4-connected components of passable cells (or of the cells where cells(grid) is True).
+
+    Vectorized label propagation: every cell starts with its own flat index and
+    takes the smallest label of its passable neighbours until nothing changes;
+    pointer jumping (labels = labels[labels]) shortcuts long corridors.
+    Obstacles are labeled -1, a component's label is the flat index of its first cell.
+    A ChunkedGrid is labeled chunk by chunk, see label_chunks.
+    """
+    if isinstance(grid, ChunkedGrid):
+        return label_chunks(grid, cells)
+    mask = cells(grid)
+    n = mask.size
+    labels = np.where(mask, np.arange(n).reshape(mask.shape), n)
+    while True:
+        previous = labels
+        padded = np.pad(labels, 1, constant_values=n)
+        neighbours = np.minimum.reduce([labels, padded[:-2, 1:-1], padded[2:, 1:-1], padded[1:-1, :-2], padded[1:-1, 2:]])
+        labels = np.where(mask, neighbours, n)
+        flat = np.append(labels.ravel(), n)
+        labels = np.where(mask, flat[flat[labels]], n)
+        if np.array_equal(labels, previous):
+            break
+    return np.where(mask, labels, -1).astype(np.int32)
+
+
+def label_chunks(grid: ChunkedGrid, cells=passable) -> np.ndarray:
+    """
+    label_components of a ChunkedGrid without building the dense grid.
+
+    Allocated chunks are labeled on their own and an unallocated chunk is a
+    single component (or none) of its fill value. Components touching across
+    a chunk border are then merged, keeping the smallest label, so the labels
+    are the same as those of the dense grid.
+    """
+    h, w = grid.shape
+    cs = grid.chunk_size
+    labels = np.full(grid.shape, -1, dtype=np.int32)
+    fill = bool(cells(np.array([grid.fill], dtype=grid.dtype))[0])
+    for cr in range(-(-h // cs)):
+        for cc in range(-(-w // cs)):
+            r0, c0 = cr * cs, cc * cs
+            rows, cols = grid.chunk_shape((cr, cc))
+            chunk = grid.chunk((cr, cc))
+            if chunk is None:
+                if fill:
+                    labels[r0:r0 + rows, c0:c0 + cols] = r0 * w + c0
+                continue
+            local = label_components(chunk, cells)
+            inside = local >= 0
+            # a flat index in the chunk to a flat index in the grid
+            local_row, local_col = np.divmod(local, cols)
+            labels[r0:r0 + rows, c0:c0 + cols] = np.where(inside, (r0 + local_row) * w + c0 + local_col, -1)
+
+    # label pairs across chunk borders
+    a = np.concatenate([labels[:, c - 1] for c in range(cs, w, cs)] + [labels[r - 1, :] for r in range(cs, h, cs)])
+    b = np.concatenate([labels[:, c] for c in range(cs, w, cs)] + [labels[r, :] for r in range(cs, h, cs)])
+    linked = (a >= 0) & (b >= 0) & (a != b)
+    if not linked.any():
+        return labels
+    nodes, index = np.unique(np.concatenate([a[linked], b[linked]]), return_inverse=True)
+    a, b = np.split(index, 2)
+    roots = np.arange(len(nodes))
+    while True:
+        previous = roots
+        smallest = np.minimum(roots[a], roots[b])
+        roots = roots.copy()
+        np.minimum.at(roots, a, smallest)
+        np.minimum.at(roots, b, smallest)
+        roots = roots[roots]
+        if np.array_equal(roots, previous):
+            break
+    merged = nodes[roots]
+    inside = labels >= 0
+    found = np.minimum(np.searchsorted(nodes, labels[inside]), len(nodes) - 1)
+    labels[inside] = np.where(nodes[found] == labels[inside], merged[found], labels[inside])
+    return labels
+
+
+def cell_components(labels: np.ndarray, row: int, col: int) -> set[int]:
+    """Components a cell can be reached from: its own, or its neighbours' for an obstacle."""
+    if labels[row, col] >= 0:
+        return {int(labels[row, col])}
+    h, w = labels.shape
+    return {int(labels[r, c]) for r, c in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1))
+            if 0 <= r < h and 0 <= c < w and labels[r, c] >= 0}
+
+
+def is_reachable(labels: np.ndarray, start: tuple[int, int], target: tuple[int, int]) -> bool:
+    # with a player's visible labels, a target next to unseen cells may be reached through them
+    row, col = target
+    h, w = labels.shape
+    near = [(r, c) for r, c in ((row, col), (row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1))
+            if 0 <= r < h and 0 <= c < w]
+    if labels[start] == UNSEEN or any(labels[cell] == UNSEEN for cell in near):
+        return True
+    return int(labels[start]) in cell_components(labels, row, col)
+
+
+def visible_components(labels: np.ndarray, grid) -> np.ndarray:
+    """
+    The labels of the cells seen in a player's fog-of-war grid, renumbered from 0
+    so they tell which seen cells are connected but not where the rest of a
+    component lies. Unseen cells are UNSEEN, obstacles stay -1.
+    """
+    if isinstance(grid, ChunkedGrid) and grid.fill == '-1':
+        # only the explored (allocated) chunks hold seen cells
+        visible = np.full(labels.shape, UNSEEN, dtype=np.int32)
+        cs = grid.chunk_size
+        for (cr, cc), chunk in grid.chunks.items():
+            rows, cols = chunk.shape
+            window = (slice(cr * cs, cr * cs + rows), slice(cc * cs, cc * cs + cols))
+            visible[window] = np.where(chunk != '-1', labels[window], UNSEEN)
+    else:
+        visible = np.where(grid != '-1', labels, UNSEEN).astype(np.int32)
+    passable = visible >= 0
+    visible[passable] = np.unique(visible[passable], return_inverse=True)[1]
+    return visible
+
+
+def touching(labels: np.ndarray, component: int) -> np.ndarray:
+    """Mask of cells in the component or 4-adjacent to it."""
+    inside = labels == component
+    padded = np.pad(inside, 1)
+    return inside | padded[:-2, 1:-1] | padded[2:, 1:-1] | padded[1:-1, :-2] | padded[1:-1, 2:]
@@ -0,0 +1,152 @@
+# env.py
+# The server's game rules as an in-process environment: reset(seed) / step(actions), no sockets or threads.
+import numpy as np
+
+from config import Config
+from enums import GameStatus, PlayerStatus
+from events import Event, FireEvent, WinConditionEvent
+import logs
+from message import MoveMessage
+from utils import BotSeat
+
+
+# README "Victory Conditions", 'r' is food on the map
+ITEM_POINTS = {'r': 1, 'w': 3, 'c': 3, 'fa': 20}
+BOAT_POINTS = 250
+# "bonus points in order of completion": the README gives no amounts, the first four boats get these
+FINISH_BONUS = (50, 30, 20, 10)
+
+DEFAULT_TIMELINE = [
+    (0, WinConditionEvent()),
+    (600, FireEvent(duration=120)),
+]
+
+DEFAULT_COLLECT_ITEMS = ['w', 'c']
+
+
+def score(player, finish_rank: int = None) -> int:
+    """README points of a player, finish_rank is its place among the boats that left (1 = first)."""
+    points = sum(ITEM_POINTS.get(item, 0) for item in player.store)
+    if player.status == PlayerStatus.WIN:
+        points += BOAT_POINTS
+        if finish_rank is not None and finish_rank <= len(FINISH_BONUS):
+            points += FINISH_BONUS[finish_rank - 1]
+    return points
+
+
+class GameEnv:
+    """
+    A match driven tick by tick by the caller.
+
+    Runs the Server's own rules (update_player, collect_items, collisions,
+    process_events) on a headless Server without a listening socket, with a
+    simulated clock so pauses last a fixed number of ticks. Timeline events
+    are applied at their tick like dispatcher messages.
+
+    An action per player is a direction (enums.Direction value), None to stay,
+    or (direction, items) to also change the items the player collects.
+    Observations are per player: the fog-of-war grid, position, inventory and
+    status. Rewards are the change of each player's score.
+    """
+
+    def __init__(self, n_players: int = Config.MAX_PLAYERS, timeline: list[tuple[int, Event]] = None,
+                 map_pool: str = None, max_ticks: int = None, quiet: bool = False):
+        self.n_players = n_players
+        self.timeline = timeline if timeline is not None else DEFAULT_TIMELINE
+        self.map_pool = map_pool
+        self.max_ticks = max_ticks or int(Config.GAME_DURATION * Config.FPS)
+        # log() is silenced for the whole process until close()
+        self.quiet = quiet
+        self.was_quiet = logs.quiet
+        if quiet:
+            logs.set_quiet()
+        self.server = None
+        self.players = []
+        self.pending: list[tuple[int, Event]] = []
+        self.scores: list[int] = []
+        self.win_ticks: dict[int, int] = {}
+
+    def reset(self, seed: int = None, map=None, replay_path: str = None) -> list[dict]:
+        """Start a new match on the map of `seed`, or on a given Map (which the match modifies)."""
+        # imported here so importing env stays cheap until a match is built
+        from server import Server
+
+        if self.server is not None:
+            self.server.close()
+        self.seed = seed
+        self.server = Server(listen=False, headless=True, spectator_port=0, web_port=0, metrics_port=0, map_seed=seed,
+                             map_pool=self.map_pool, max_players=self.n_players, simulated_clock=True,
+                             player_logs=False, map=map, replay_path=replay_path, checkpoint_path='')
+        self.players = []
+        for _ in range(self.n_players):
+            player = self.server.add_player(BotSeat(len(self.players)))
+            player.allow_collect_items = list(DEFAULT_COLLECT_ITEMS)
+            self.players.append(player)
+        self.pending = sorted(self.timeline, key=lambda entry: entry[0])
+        self.scores = [0] * self.n_players
+        self.win_ticks = {}
+        self.server.start_game()
+        return self.observations()
+
+    @property
+    def tick(self) -> int:
+        return self.server.game_board.tick
+
+    def done(self) -> bool:
+        board = self.server.game_board
+        return (board.game_status == GameStatus.FINISHED or board.tick >= self.max_ticks
+                or len(self.win_ticks) == len(self.players))
+
+    def step(self, actions) -> tuple[list[dict], list[int], bool, dict]:
+        while self.pending and self.pending[0][0] <= self.tick:
+            _, event = self.pending.pop(0)
+            self.server.handle_dispatcher_event(event)
+
+        for player, action in zip(self.players, actions):
+            if isinstance(action, tuple):
+                action, items = action
+                player.allow_collect_items = list(items)
+            # the action replaces any queued move, a move queued before a pause must not lag behind
+            if player.status == PlayerStatus.PLAYING:
+                player.in_process_move_messages = [] if action is None else [MoveMessage(dir=int(action))]
+        self.server.step()
+
+        rewards = []
+        for i, player in enumerate(self.players):
+            if player.status == PlayerStatus.WIN and player.id not in self.win_ticks:
+                self.win_ticks[player.id] = self.tick
+            points = score(player, self.finish_rank(player.id))
+            rewards.append(points - self.scores[i])
+            self.scores[i] = points
+        return self.observations(), rewards, self.done(), {'tick': self.tick, 'win_ticks': dict(self.win_ticks)}
+
+    def finish_rank(self, player_id) -> int | None:
+        # win_ticks is in order of completion, players winning in the same tick in seat order
+        for rank, winner in enumerate(self.win_ticks, start=1):
+            if winner == player_id:
+                return rank
+        return None
+
+    def observations(self) -> list[dict]:
+        return [self.observe(player) for player in self.players]
+
+    def observe(self, player) -> dict:
+        return {
+            'id': player.id,
+            'row': player.row,
+            'col': player.col,
+            'home': (player.home_row, player.home_col),
+            'grid': np.array(player.grid),
+            'items_on_hand': [str(item) for item in player.items_on_hand],
+            'store': [str(item) for item in player.store],
+            'armor': player.armor,
+            'sword': player.sword,
+            'status': player.status.value,
+        }
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        if self.quiet:
+            logs.set_quiet(self.was_quiet)
@@ -54,5 +54,10 @@ class RewardPunishmentEvent(Event):
     cotton: int  = 0
     wood: int    = 0
 
+    # trigger behaviour of each cell
+    uses: int | None = 1  # times a cell can be collected, None = unlimited
+    per_player: bool = False  # each player can collect a cell only once
+    trigger_duration: int | None = None  # ticks before the cells disappear
+
 
 
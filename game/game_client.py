@@ -13,6 +13,9 @@ from logs import log
 from config import Config
 
 class GameClient(Client):
+    # visited_positions and entity_positions grow with exploration by design
+    MEMORY_GAUGES = ('messages', 'movement_history', 'last_positions')
+
     def __init__(self, name):
         log(f"Initializing GameClient with name: {name}", "[GameClient]")
         super().__init__()
@@ -347,7 +350,7 @@ class GameClient(Client):
         # First check if we need to return home to store items
         if len(self.items_on_hand) >= Config.MAX_STORAGE_CAPACITY:
             log("Inventory full, returning home to store items", "[GameClient]")
-            path = shortest_path(player.grid, (player.row, player.col), (player.home_row, player.home_col))
+            path = shortest_path(player.grid, (player.row, player.col), (player.home_row, player.home_col), player.components)
             if path:
                 return path[0]
         
@@ -397,7 +400,7 @@ class GameClient(Client):
                 log("Reached center, starting systematic exploration", "[GameClient]")
             else:
                 # Move towards center
-                path = shortest_path(player.grid, current_pos, center_pos)
+                path = shortest_path(player.grid, current_pos, center_pos, player.components)
                 if path:
                     return path[0]
                 else:
@@ -429,7 +432,7 @@ class GameClient(Client):
         # If we're too far from center, return to center
         if distance_from_center > self.max_exploration_radius:
             log("Too far from center, returning to center", "[GameClient]")
-            path = shortest_path(player.grid, current_pos, center_pos)
+            path = shortest_path(player.grid, current_pos, center_pos, player.components)
             if path:
                 return path[0]
         
@@ -440,7 +443,7 @@ class GameClient(Client):
             if target_row >= 0:
                 target_pos = (target_row, center_pos[1])
                 if target_pos not in self.visited_positions:
-                    path = shortest_path(player.grid, current_pos, target_pos)
+                    path = shortest_path(player.grid, current_pos, target_pos, player.components)
                     if path:
                         return path[0]
             # If can't go up, switch to next phase
@@ -452,7 +455,7 @@ class GameClient(Client):
             if target_row < Config.N_ROW:
                 target_pos = (target_row, center_pos[1])
                 if target_pos not in self.visited_positions:
-                    path = shortest_path(player.grid, current_pos, target_pos)
+                    path = shortest_path(player.grid, current_pos, target_pos, player.components)
                     if path:
                         return path[0]
             # If can't go down, switch to next phase
@@ -464,7 +467,7 @@ class GameClient(Client):
             if target_col >= 0:
                 target_pos = (center_pos[0], target_col)
                 if target_pos not in self.visited_positions:
-                    path = shortest_path(player.grid, current_pos, target_pos)
+                    path = shortest_path(player.grid, current_pos, target_pos, player.components)
                     if path:
                         return path[0]
             # If can't go left, switch to next phase
@@ -476,7 +479,7 @@ class GameClient(Client):
             if target_col < Config.N_COL:
                 target_pos = (center_pos[0], target_col)
                 if target_pos not in self.visited_positions:
-                    path = shortest_path(player.grid, current_pos, target_pos)
+                    path = shortest_path(player.grid, current_pos, target_pos, player.components)
                     if path:
                         return path[0]
             # If can't go right, increase radius and restart pattern
@@ -558,14 +561,14 @@ class GameClient(Client):
         # Prioritize wood and cotton based on what we need
         if wood_needed > 0 and len(self.entity_positions['w']) > 0:
             wood_pos = self.entity_positions['w'][0]
-            path = shortest_path(player.grid, (player.row, player.col), wood_pos)
+            path = shortest_path(player.grid, (player.row, player.col), wood_pos, player.components)
             if path:
                 log(f"Moving towards wood at {wood_pos}, still need {wood_needed}", "[GameClient]")
                 return path[0]
         
         if cotton_needed > 0 and len(self.entity_positions['c']) > 0:
             cotton_pos = self.entity_positions['c'][0]
-            path = shortest_path(player.grid, (player.row, player.col), cotton_pos)
+            path = shortest_path(player.grid, (player.row, player.col), cotton_pos, player.components)
             if path:
                 log(f"Moving towards cotton at {cotton_pos}, still need {cotton_needed} (for fabric: {cotton_for_fabric})", "[GameClient]")
                 return path[0]
@@ -577,7 +580,7 @@ class GameClient(Client):
     def goto(self, position:tuple):
         log(f"Attempting to navigate to position: {position}", "[GameClient]")
         player = self.get_player()
-        path = shortest_path(player.grid, (player.row, player.col), position)
+        path = shortest_path(player.grid, (player.row, player.col), position, player.components)
 
         current_pos = (player.row, player.col)
         # If we're already at the target position, return
@@ -872,7 +875,7 @@ class GameClient(Client):
         # If no clear direction found, try to find any unexplored area
         log("No clear directions found, searching for unexplored areas", "[GameClient]")
         from pathfinding import shortest_path_to_value
-        path, target = shortest_path_to_value(player.grid, (player.row, player.col), '-1')
+        path, target = shortest_path_to_value(player.grid, (player.row, player.col), '-1', player.components)
         if path is not None and len(path) > 0:
             direction = path[0]
             next_row = player.row + [-1, 0, 1, 0][direction]
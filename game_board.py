@@ -4,10 +4,13 @@ from player import Player
 import time, datetime
 import random
 from map import Map
+from chunked_map import ChunkedGrid, argwhere
 from logs import log
-from utils import display_image, load_image
+from utils import display_image
+from atlas import TextureAtlas
+from player_view import PlayerView, player_views_layout
 from pathlib import Path
-from utils import draw_text, draw_energy
+from utils import draw_text, draw_energy, get_font, render_text
 from config import Config
 from enums import PlayerStatus
 from enums import GameStatus
@@ -18,18 +21,28 @@ from events import FireEvent, RewardPunishmentEvent
 
 
 class GameBoard():
-    def __init__(self, server):
+    def __init__(self, server, headless: bool = False, map: Map = None, max_players: int = Config.MAX_PLAYERS):
         self.server = server
+        # headless boards only hold the game state, nothing is drawn
+        self.headless = headless
         self.start_x = 2
         self.start_y = 60
         self.CELL_SIZE: int = Config.CELL_SIZE
         # so cell mo bang do
         self.OPEN_CELL = Config.OPEN_CELL
 
-        self.n_row = Config.N_ROW
-        self.n_col = Config.N_COL
-        self.map: Map = Map(self.n_row, self.n_col)
-        self.map.random_map()
+        if map is None:
+            map = Map(Config.N_ROW, Config.N_COL)
+            map.random_map()
+        self.n_row = map.n_row
+        self.n_col = map.n_col
+        self.map: Map = map
+        self.max_players = max_players
+        self.homes = self.generate_homes()
+        # every home must reach every other home and all resources
+        if not self.map.is_connected(self.homes):
+            log('Homes are walled off, repair the map', '[GAME_BOARD]')
+            self.map.repair(self.homes)
         self.width = self.n_col * self.CELL_SIZE
         self.height =self.n_row * self.CELL_SIZE
         
@@ -38,95 +51,125 @@ class GameBoard():
         self.game_status: GameStatus = GameStatus.WAITING_FOR_PLAYERS
         self.tick = 0
 
+        self.players = {}
+
+        # Only display current player info
+        # Can use hot key to select player
+        self.current_player_index = -1   
+
+        self.lock = threading.Lock()
+        self.messages = []
+        self.message_tick_remaining = 0
+
+        # fractional (row, col) of players drawn between two ticks, set by the spectator viewer
+        self.sprite_positions = {}
+        self.player_windows = {}
+
+        if not self.headless:
+            self.init_display()
+
+    def init_display(self):
         pygame.display.set_caption("Server Game Dashboard")
 
         # Dashboard game
         pygame.init()
         self.screen = pygame.display.set_mode((self.width + 2 * self.start_x, self.height + self.start_y + 10), pygame.RESIZABLE)
 
-        self.players = {}
-
         # text fonnt
         self.text_font_size=16
         self.text_font_name="Courier New"
-        self.text_font = pygame.font.SysFont(self.text_font_name, self.text_font_size, bold=True)  
+        self.text_font = get_font(self.text_font_name, self.text_font_size, bold=True)  
         self.text_color = (0, 255, 0)
         self.text_background_color = (0, 0, 0)        
 
         self.icon_font_size = 16
         self.icon_font_name="Courier New"
         self.icon_color = (255, 0, 0)
-        self.icon_font = pygame.font.SysFont(self.icon_font_name, self.icon_font_size, bold=True) 
+        self.icon_font = get_font(self.icon_font_name, self.icon_font_size, bold=True) 
         self.icon_background_color = (255, 255, 255)    
 
-        # Only display current player info
-        # Can use hot key to select player
-        self.current_player_index = -1   
-
         self.images = self.load_images()
 
-        self.lock = threading.Lock()
-        self.messages = []
-        self.message_tick_remaining = 0
+        # Dirty-region rendering: the cell layer is cached in board_surface and
+        # only cells reported by the map (or by a player's fog window) are redrawn
+        self.BG_COLOR = (255, 255, 255)
+        self.board_rect = pygame.Rect(self.start_x, self.start_y, self.width, self.height)
+        self.board_surface = pygame.Surface((self.width, self.height))
+        self.dirty_cells: set[tuple[int, int]] = set()
+        self.full_redraw = True
+        self.drawn_view = None
+        self.drawn_screen_size = None
+        self.animated_cells: set[tuple[int, int]] = set()
+        self.drawn_event_cells: set[tuple[int, int]] = set()
+        self.sprite_rects: list[pygame.Rect] = []
+        self.map.listeners.append(self.on_cell_changed)
+
+        # Grid of all players' fog-of-war views, toggled with 'v'
+        self.show_player_views = False
+        self.player_views: dict[int, PlayerView] = {}
+        self.player_views_key = None
+        self.thumbnail_atlases = {}
         
         self.draw()
 
     def load_images(self):
+        # All sprites live in one display-format surface, cached on disk between runs
+        self.atlas = TextureAtlas.load_or_build(
+            self.image_entries(self.CELL_SIZE, self.CELL_SIZE +20, self.CELL_SIZE + 15), Path('.cache')).convert()
+
+        images = {'players': {}, 'houses': {}, 'maps': {}}
+        for name, image in self.atlas.images.items():
+            group, key = name.split('/')
+            images[group][int(key) if group != 'maps' else key] = image
+        return images
+
+    def image_entries(self, cell_size, player_size, house_size):
+        entries = {}
 
         # Load players images
-        player_image_paths = [file.name for file in Path('img/players').glob('*.*')]
-        
-        images = {}
-        images['players'] = {}
+        player_image_paths = sorted(Path('img/players').glob('*.*'))
         for i, img_path in enumerate(player_image_paths):
-            images['players'][i] = load_image(Path('img/players') / img_path, self.CELL_SIZE +20, self.CELL_SIZE +20)
+            entries[f'players/{i}'] = (img_path, player_size, player_size)
 
-        player_image_paths = [file.name for file in Path('img/houses').glob('*.*')]
-        images['houses'] = {}
-        for i, img_path in enumerate(player_image_paths):
-            images['houses'][i] = load_image(Path('img/houses') / img_path, self.CELL_SIZE + 15, self.CELL_SIZE + 15)
+        house_image_paths = sorted(Path('img/houses').glob('*.*'))
+        for i, img_path in enumerate(house_image_paths):
+            entries[f'houses/{i}'] = (img_path, house_size, house_size)
 
         # Load players map and assests
-        images['maps'] = {}
-
-        images['maps']['black'] = load_image(Path('img/maps/black.png'), self.CELL_SIZE, self.CELL_SIZE)
-
-        images['maps']['a'] = load_image(Path('img/maps/armor.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['c'] = load_image(Path('img/maps/cotton.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['r'] = load_image(Path('img/maps/food.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['g'] = load_image(Path('img/maps/grass.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['s'] = load_image(Path('img/maps/sword.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['w'] = load_image(Path('img/maps/wood.png'), self.CELL_SIZE, self.CELL_SIZE)
-        # 
-        images['maps']['f-a'] = load_image(Path('img/maps/f-armor.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['f-c'] = load_image(Path('img/maps/f-cotton.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['f-r'] = load_image(Path('img/maps/f-food.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['f-g'] = load_image(Path('img/maps/f-grass.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['f-s'] = load_image(Path('img/maps/f-sword.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['f-w'] = load_image(Path('img/maps/f-wood.png'), self.CELL_SIZE, self.CELL_SIZE)
-
-        # fire
-        images['maps']['fire-w-1'] = load_image(Path('img/maps/fire-wood1.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['fire-w-2'] = load_image(Path('img/maps/fire-wood2.png'), self.CELL_SIZE, self.CELL_SIZE)
-
-        images['maps']['diamond'] = load_image(Path('img/maps/diamond.png'), self.CELL_SIZE, self.CELL_SIZE)
-        images['maps']['poison'] = load_image(Path('img/maps/poison.png'), self.CELL_SIZE, self.CELL_SIZE)
-        
-        return images
+        map_images = {
+            'black': 'black.png',
+            'a': 'armor.png', 'c': 'cotton.png', 'r': 'food.png',
+            'g': 'grass.png', 's': 'sword.png', 'w': 'wood.png',
+            # 
+            'f-a': 'f-armor.png', 'f-c': 'f-cotton.png', 'f-r': 'f-food.png',
+            'f-g': 'f-grass.png', 'f-s': 'f-sword.png', 'f-w': 'f-wood.png',
+            # fire
+            'fire-w-1': 'fire-wood1.png', 'fire-w-2': 'fire-wood2.png',
+            'diamond': 'diamond.png', 'poison': 'poison.png',
+        }
+        for name, file_name in map_images.items():
+            entries[f'maps/{name}'] = (Path('img/maps') / file_name, cell_size, cell_size)
+        return entries
+
+    def thumbnail_atlas(self, cell_size):
+        if cell_size not in self.thumbnail_atlases:
+            entries = self.image_entries(cell_size, cell_size, cell_size)
+            self.thumbnail_atlases[cell_size] = TextureAtlas.load_or_build(entries, Path('.cache')).convert()
+        return self.thumbnail_atlases[cell_size]
         
     def draw_clock(self):
         # Convert tick (seconds) to HH:MM:SS format
         time_str = str(datetime.timedelta(seconds=int(self.tick/Config.FPS)))
 
         # Font and colors
-        font = pygame.font.SysFont("Courier New", 26, bold=True)
+        font = get_font("Courier New", 26, bold=True)
         GREEN = (0, 255, 0)
         BG_COLOR = (10, 10, 10)
         padding = 8
         inner_padding = 8
 
         # Render time
-        text_surface = font.render(time_str, True, GREEN)
+        text_surface = render_text(font, time_str, GREEN)
         text_rect = text_surface.get_rect()
 
         # Top-right position
@@ -143,9 +186,69 @@ class GameBoard():
         self.screen.blit(text_surface, (box_x + inner_padding, box_y + inner_padding))
 
     def house_positions(self):
-        return [ 
-            (4, 5),               (0, Config.N_COL//2), (4, Config.N_COL-7), 
-            (Config.N_ROW-4, 5) , (Config.N_ROW -1, Config.N_COL//2), (Config.N_ROW -4,Config.N_COL-7)]
+        return self.homes
+
+    def generate_homes(self):
+        homes = [ 
+            (4, 5),               (0, self.n_col//2), (4, self.n_col-7), 
+            (self.n_row-4, 5) , (self.n_row -1, self.n_col//2), (self.n_row -4,self.n_col-7)]
+        if self.max_players <= len(homes):
+            return homes
+
+        # farthest-point sampling: each new home is the free ground cell farthest from all homes so far
+        if isinstance(self.map.grid, ChunkedGrid):
+            return self.generate_chunked_homes(homes)
+        rows, cols = np.indices((self.n_row, self.n_col))
+        free = self.map.grid == 'g'
+        distance = np.full((self.n_row, self.n_col), self.n_row + self.n_col)
+        for row, col in homes:
+            distance = np.minimum(distance, abs(rows - row) + abs(cols - col))
+        while len(homes) < self.max_players:
+            candidates = np.where(free, distance, 0)
+            row, col = np.unravel_index(candidates.argmax(), candidates.shape)
+            if candidates[row, col] == 0:
+                raise ValueError(f'No room on the map for {self.max_players} homes')
+            homes.append((int(row), int(col)))
+            distance = np.minimum(distance, abs(rows - row) + abs(cols - col))
+        return homes
+
+    def generate_chunked_homes(self, homes):
+        """Farthest-point sampling one chunk at a time, with the same homes as on a dense grid."""
+        grid = self.map.grid
+        if grid.fill == 'g':
+            # unallocated chunks are all free ground
+            keys = [(cr, cc) for cr in range(-(-self.n_row // grid.chunk_size))
+                    for cc in range(-(-self.n_col // grid.chunk_size))]
+        else:
+            keys = list(grid.chunks)
+        best = {key: self.chunk_farthest(key, homes) for key in keys}
+        while len(homes) < self.max_players:
+            # ties go to the first cell in row-major order, as argmax does on a dense grid
+            distance, row, col = max(best.values(), key=lambda cell: (cell[0], -cell[1], -cell[2]), default=(0, 0, 0))
+            if distance == 0:
+                raise ValueError(f'No room on the map for {self.max_players} homes')
+            homes.append((row, col))
+            # a chunk's farthest cell only moves if the new home is closer to it than the older homes
+            for key, (d, r, c) in best.items():
+                if abs(r - row) + abs(c - col) < d:
+                    best[key] = self.chunk_farthest(key, homes)
+        return homes
+
+    def chunk_farthest(self, key, homes) -> tuple[int, int, int]:
+        """(distance, row, col) of the chunk's free ground cell farthest from the homes, distance 0 if none."""
+        grid = self.map.grid
+        shape = grid.chunk_shape(key)
+        rows, cols = np.indices(shape)
+        rows += key[0] * grid.chunk_size
+        cols += key[1] * grid.chunk_size
+        distance = np.full(shape, self.n_row + self.n_col)
+        for row, col in homes:
+            distance = np.minimum(distance, abs(rows - row) + abs(cols - col))
+        chunk = grid.chunk(key)
+        if chunk is not None:
+            distance = np.where(chunk == 'g', distance, 0)
+        r, c = np.unravel_index(distance.argmax(), shape)
+        return int(distance[r, c]), int(rows[r, c]), int(cols[r, c])
 
     def create_random_player(self, id:str) -> Player:
         # while True:
@@ -157,7 +260,7 @@ class GameBoard():
         positions = self.house_positions()
         row = positions[int(id)][0]
         col = positions[int(id)][1]
-        grid = np.full((self.n_row , self.n_col), '-1')
+        grid = self.map.new_grid('-1')
         player = Player(
             id=id,
             row=row,
@@ -165,7 +268,7 @@ class GameBoard():
             home_row = row,
             home_col = col,
             color=(random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)),
-            last_updated = datetime.datetime.now().timestamp(),
+            last_updated = self.server.now(),
             grid = grid, 
             map_h= self.n_row,
             map_w= self.n_col
@@ -181,109 +284,204 @@ class GameBoard():
         return player
 
     def update_nearby_map_area(self, player):
+        view = None if self.headless else self.player_views.get(player.id)
+        if view is not None:
+            # cells this player discovers or sees change
+            r1, r2, c1, c2 = self.window_range(player.row, player.col)
+            changed = np.argwhere(player.grid[r1:r2+1, c1:c2+1] != self.map.grid[r1:r2+1, c1:c2+1])
+            view.dirty.update((int(r) + r1, int(c) + c1) for r, c in changed)
+
         Map.copy_grid(self.map.grid, player.grid, player.row - self.OPEN_CELL//2, player.row + self.OPEN_CELL//2,
                      player.col - self.OPEN_CELL//2, player.col + self.OPEN_CELL//2)
+
+        # In a fog-of-war view both the old and the new visible window change
+        window = (player.row, player.col)
+        previous = self.player_windows.get(player.id)
+        self.player_windows[player.id] = window
+        if self.headless or previous == window:
+            return
+        for r, c in [window] + ([previous] if previous else []):
+            cells = self.window_cells(r, c)
+            if self.current_player_index == player.id:
+                self.dirty_cells.update(cells)
+            if view is not None:
+                view.dirty.update(cells)
+
+    def on_cell_changed(self, row, col, old, new):
+        self.dirty_cells.add((row, col))
+
+    def window_range(self, row, col):
+        """Visible window around (row, col), clipped to the map: r1, r2, c1, c2 inclusive."""
+        return (max(row - self.OPEN_CELL//2, 0), min(row + self.OPEN_CELL//2, self.n_row - 1),
+                max(col - self.OPEN_CELL//2, 0), min(col + self.OPEN_CELL//2, self.n_col - 1))
+
+    def window_cells(self, row, col):
+        r1, r2, c1, c2 = self.window_range(row, col)
+        return [(r, c) for r in range(r1, r2 + 1) for c in range(c1, c2 + 1)]
+
+    def invalidate(self):
+        """Force a full redraw on the next frame (view switch, window resize...)."""
+        self.full_redraw = True
         
 
+    def view_player(self, index):
+        """Player whose fog-of-war view is shown for a view index, None for the full map (-1)."""
+        if index == -1:
+            return None
+        return self.players.get(index)
+
+    def view_map(self, index):
+        player = self.view_player(index)
+        return self.map if player is None else Map.from_player(player)
+
+    def is_visible(self, player, row, col):
+        return abs(row - player.row) <= self.OPEN_CELL//2 and abs(col - player.col) <= self.OPEN_CELL//2
+
+    def cycle_view(self, step):
+        # -1 shows all players, then each player in turn
+        self.current_player_index += step
+        if self.current_player_index >= len(self.players):
+            self.current_player_index = -1
+        if self.current_player_index <-1:
+            self.current_player_index = len(self.players) -1
+
+    def current_view_player(self):
+        return self.view_player(self.current_player_index)
+
     def draw_players(self):
-        visible_all = self.current_player_index == -1   
+        player = self.current_view_player()
         
         with self.lock:
-            if visible_all:
-                for id, player in self.players.items():
+            if player is None:
+                for id, player in list(self.players.items()):
                     self.draw_home(player)
                     self.draw_player(player)
             else:
-                player = self.players[self.current_player_index]
+                # players last seen by this player, from its fog-of-war grid
+                for row, col in argwhere(player.grid, np.char.isdigit):
+                    other_id = int(player.grid[row, col])
+                    if other_id != player.id and other_id in self.players:
+                        self.draw_sprite(self.player_image(other_id), col, row, -10)
                 self.draw_home(player)
                 self.draw_player(player)
 
+    def sprite_name(self, group, id):
+        # sprites are reused when there are more players than images
+        return f'{group}/{int(id) % len(self.images[group])}'
+
+    def player_image(self, id):
+        return self.atlas.images[self.sprite_name('players', id)]
+
+    def draw_sprite(self, image, col, row, offset):
+        x = self.start_x + round(col * self.CELL_SIZE) + offset
+        y = self.start_y + round(row * self.CELL_SIZE) + offset
+        rect = self.screen.blit(image, (x, y))
+        self.sprite_rects.append(rect)
+
     def draw_player(self, player):
-        x = self.start_x + player.col * self.CELL_SIZE -10
-        y = self.start_y + player.row * self.CELL_SIZE -10
-        display_image(self.screen, self.images['players'][int(player.id)], x+1, y+1)
+        # players bob by one pixel every tick
+        offset = -10 if self.tick % 2 == 0 else -9
+        row, col = self.sprite_positions.get(player.id, (player.row, player.col))
+        self.draw_sprite(self.player_image(player.id), col, row, offset)
 
     def draw_home(self, player):
-        x = self.start_x + player.home_col * self.CELL_SIZE 
-        y = self.start_y + player.home_row * self.CELL_SIZE
-        display_image(self.screen, self.images['houses'][int(player.id)], x-7, y-7)
+        self.draw_sprite(self.atlas.images[self.sprite_name('houses', player.id)], player.home_col, player.home_row, -7)
+
+    def fire_active(self):
+        event = self.server.current_event
+        return bool(event) and (isinstance(event, FireEvent) or event == FireEvent)
+
+    def event_cells(self):
+        event = self.server.current_event
+        if isinstance(event, RewardPunishmentEvent) and self.server.event_triggers:
+            return set(self.server.event_triggers.positions())
+        return set()
+
+    def cell_images(self, map, player, row, col):
+        """Names of the map images composing one cell of the cell layer, bottom to top."""
+        value = map.get_value(row, col)
+        if value == '-1':
+            return ['black']
+
+        fogged = player is not None and not self.is_visible(player, row, col)
+        prefix = 'f-' if fogged else ''
+
+        # players are sprites, the cell below them is ground
+        if (row, col) in self.drawn_event_cells:
+            images = ['g']
+            if self.tick % 2 == 0 and self.server.current_event.icon_name:
+                images.append(self.server.current_event.icon_name)
+            return images
+        if value == 'w' and self.fire_active():
+            fire = 'fire-w-1' if self.tick % 2 == 0 else 'fire-w-2'
+            return ['g', fire]
+
+        images = [f'{prefix}g']
+        if not value.isdigit():
+            images.append(f'{prefix}{value}')
+        return images
+
+    def draw_cells(self, map, player, cells):
+        # one batched blit call for all dirty cells
+        items = []
+        for row, col in cells:
+            position = (col * self.CELL_SIZE, row * self.CELL_SIZE)
+            for name in self.cell_images(map, player, row, col):
+                items.append((f'maps/{name}', position))
+        self.atlas.blits(self.board_surface, items)
+
+    def restore_background(self, rect):
+        self.screen.fill(self.BG_COLOR, rect)
+        clip = rect.clip(self.board_rect)
+        if clip.width and clip.height:
+            self.screen.blit(self.board_surface, clip.topleft, clip.move(-self.start_x, -self.start_y))
 
     # draw map: can draw all players of specific player
     def draw_game_board(self):
-
-        visible_all = self.current_player_index == -1   
-         
-        if visible_all:
-            map = self.map
-        else:
-            player = self.players[self.current_player_index]
-            map =  Map.from_player(player)
-            
-
-        BG_COLOR = (255, 255, 255)
-        self.screen.fill(BG_COLOR)
-       
-        for row in range(self.n_row):
-            for col in range(self.n_col):
-                value = map.get_value(row, col)
-                x = self.start_x + col * self.CELL_SIZE
-                y = self.start_y + row * self.CELL_SIZE
-
-                if value == '-1':
-                    display_image(self.screen, self.images['maps']['black'], x,y)
-                else: #value in ['g','f','w','c','a','s']:
-                    if visible_all:
-                        display_image(self.screen, self.images['maps']['g'], x,y) # Background
-                        if value.isdigit() and int(value)>=0:
-                            if self.tick % 2 == 0:
-                                display_image(self.screen, self.images['players'][int(value)], x-10,y-10)
-                            else:
-                                display_image(self.screen, self.images['players'][int(value)], x-9,y-9)
-                        else:
-                            display_image(self.screen, self.images['maps'][value], x,y)
-                    else:
-                        if row in range(player.row - self.OPEN_CELL//2, player.row + self.OPEN_CELL//2 + 1) and \
-                            col in range(player.col - self.OPEN_CELL//2, player.col + self.OPEN_CELL//2 + 1):
-                            display_image(self.screen, self.images['maps']['g'], x,y) # Background
-                            if value.isdigit() and int(value) in range(len(self.players)):
-                                if self.tick % 2 == 0:
-                                    display_image(self.screen, self.images['players'][int(value)], x-10,y-10)
-                                else:
-                                    display_image(self.screen, self.images['players'][int(value)], x-9,y-9)
-                            else:
-                                display_image(self.screen, self.images['maps'][value], x,y)
-                        else:
-                            display_image(self.screen, self.images['maps']['f-g'], x,y) # Background
-                            if value.isdigit() and int(value) in range(len(self.players)):
-                                if self.tick % 2 == 0:
-                                    display_image(self.screen, self.images['players'][int(value)], x-10,y-10)
-                                else:
-                                    display_image(self.screen, self.images['players'][int(value)], x-9,y-9)
-                            else:
-                                display_image(self.screen, self.images['maps'][f'f-{value}'], x,y)
-                        
-                if value == 'w':
-                    if self.server.current_event \
-                        and (isinstance(self.server.current_event, FireEvent) or self.server.current_event ==FireEvent):
-                        display_image(self.screen, self.images['maps']['g'], x,y)
-                        if self.tick % 2 == 0:
-                            display_image(self.screen, self.images['maps']['fire-w-1'], x,y)
-                        else:
-                            display_image(self.screen, self.images['maps']['fire-w-2'], x,y)
-                            
-                # elif value.isdigit():
-                #     value = int(value)
-                #     if value in range(len(self.players)):
-                #         display_image(self.screen, self.images['players'][value], x, y)
-
-                # draw caro 
-                # rect = pygame.Rect(
-                #     x, y, self.CELL_SIZE, self.CELL_SIZE)
-                # pygame.draw.rect(self.screen, (127,127,127), rect, width=1)
+        """Redraw the dirty cells of the cached cell layer and return the screen rects that changed."""
+        player = self.current_view_player()
+        map = self.view_map(self.current_player_index)
+
+        view = self.current_player_index if player is not None else -1
+        if view != self.drawn_view or self.screen.get_size() != self.drawn_screen_size:
+            self.full_redraw = True
+        self.drawn_view = view
+        self.drawn_screen_size = self.screen.get_size()
+
+        # Cells animated every tick: burning wood and event icons. When they stop
+        # animating they need one more redraw.
+        self.drawn_event_cells = self.event_cells()
+        animated = set(self.drawn_event_cells)
+        if self.fire_active():
+            animated |= {(int(r), int(c)) for r, c in argwhere(map.grid, lambda grid: grid == 'w')}
+        dirty = self.dirty_cells | animated | self.animated_cells
+        self.animated_cells = animated
+        self.dirty_cells = set()
+
+        if self.full_redraw:
+            self.full_redraw = False
+            self.sprite_rects = []
+            self.draw_cells(map, player, [(row, col) for row in range(self.n_row) for col in range(self.n_col)])
+            self.screen.fill(self.BG_COLOR)
+            self.screen.blit(self.board_surface, self.board_rect.topleft)
+            return [self.screen.get_rect()]
+
+        self.draw_cells(map, player, dirty)
+        rects = []
+        for row, col in dirty:
+            rects.append(pygame.Rect(self.start_x + col * self.CELL_SIZE, self.start_y + row * self.CELL_SIZE,
+                                     self.CELL_SIZE, self.CELL_SIZE))
+
+        # erase the sprites of the previous frame, they are redrawn on top
+        rects += self.sprite_rects
+        self.sprite_rects = []
+        for rect in rects:
+            self.restore_background(rect)
+        return rects
                           
     def draw_game_status(self):
         # Font and colors
-        font = pygame.font.SysFont("Courier New", 18, bold=True)
+        font = get_font("Courier New", 18, bold=True)
 
         BG_COLOR = (10, 10, 10)
         padding = 10
@@ -302,7 +500,7 @@ class GameBoard():
         else:
             text = f'{len(self.players)} PLAYING'
         
-        text_surface = font.render(text, True, color)
+        text_surface = render_text(font, text, color)
         text_rect = text_surface.get_rect()
 
         # Top-right position
@@ -334,10 +532,9 @@ class GameBoard():
         return s
     
     def draw_player_detail_info(self, pre_box):
-        if  self.current_player_index == -1:
+        player = self.current_view_player()
+        if player is None:
             return
-        
-        player = self.players[self.current_player_index]
 
         x = pre_box[0] + pre_box[2] + 10
         y = 10
@@ -346,10 +543,10 @@ class GameBoard():
             self.text_color, self.text_background_color,
             self.text_font)
         
-        display_image(self.screen, self.images['players'][int(player.id)], x + box.width, y -10)
+        display_image(self.screen, self.player_image(player.id), x + box.width, y -10)
 
         if player.status == PlayerStatus.PAUSED:
-            draw_energy(self.screen, f'row: {player.row}, col: {player.col}. Status: {player.status.value}, Remain time: {int(player.paused_duration - (datetime.datetime.now().timestamp() - player.paused_time))} s', 
+            draw_energy(self.screen, f'row: {player.row}, col: {player.col}. Status: {player.status.value}, Remain time: {int(player.paused_duration - (self.server.now() - player.paused_time))} s', 
                         0, 0 , x + box.width + 48, y + 6 )
         else:
             draw_energy(self.screen, f'row: {player.row}, col: {player.col}. Status: {player.status.value}', 
@@ -369,7 +566,7 @@ class GameBoard():
         if not visible_all:
             return
         
-        font = pygame.font.SysFont("Courier New", 18, bold=True)
+        font = get_font("Courier New", 18, bold=True)
         x = pre_box[0] + pre_box[2] + 10
         y = 10
 
@@ -384,33 +581,72 @@ class GameBoard():
                 message =f"{self.message_tick_remaining}s: {message}"
             chunks = chunk_message_fixed(message)[:3]
             for c in chunks:
-                text_surface = font.render(c, True, color)
+                text_surface = render_text(font, c, color)
                 self.screen.blit(text_surface, (x, y))
                 y+=14
 
-    def draw_events(self):
-        
-        event = self.server.current_event
-        if not event:
-            return
-        
-        if isinstance(event, RewardPunishmentEvent):   
-            for row, col in zip(event.event_at_rows, event.event_at_cols):
-                x = self.start_x + col * self.CELL_SIZE
-                y = self.start_y + row * self.CELL_SIZE
-                
-                display_image(self.screen, self.images['maps']['g'], x,y)
-                if self.tick % 2 == 0:
-                    if event.icon_name:
-                        display_image(self.screen, self.images['maps'][event.icon_name], x,y)
+    def draw_header(self):
+        header = pygame.Rect(0, 0, self.screen.get_width(), self.start_y)
+        self.screen.set_clip(header)
+        self.screen.fill(self.BG_COLOR, header)
+        self.draw_clock()
+        box = self.draw_game_status()
+        self.draw_player_detail_info(box)
+        self.draw_message(box)
+        self.screen.set_clip(None)
+        return header
 
-    def draw(self):
+    def advance_tick(self):
         if self.game_status == GameStatus.PLAYING or self.game_status == GameStatus.WAITING_FOR_PLAYERS:
             self.tick += 1
-        self.draw_game_board()
-        self.draw_clock()
-        box = self.draw_game_status()
+
+    def toggle_player_views(self):
+        self.show_player_views = not self.show_player_views
+        self.player_views = {}
+        self.player_views_key = None
+        self.invalidate()
+
+    def draw_player_views(self):
+        """Draw the mini-view of every player, return the screen rects that changed."""
+        players = sorted(list(self.players.values()), key=lambda p: p.id)
+        key = (tuple(p.id for p in players), self.screen.get_size())
+        rects = []
+        if self.full_redraw or key != self.player_views_key:
+            self.full_redraw = False
+            self.drawn_view = None
+            self.player_views_key = key
+            area = pygame.Rect(self.start_x, self.start_y, self.screen.get_width() - 2 * self.start_x,
+                               self.screen.get_height() - self.start_y - 10)
+            cell_size, positions = player_views_layout(len(players), self.n_row, self.n_col, area)
+            self.player_views = {p.id: PlayerView(p.id, self.n_row, self.n_col, cell_size, position)
+                                 for p, position in zip(players, positions)}
+            self.screen.fill(self.BG_COLOR)
+            rects.append(self.screen.get_rect())
+
+        self.drawn_event_cells = self.event_cells()
+        fire = self.fire_active()
+        for player in players:
+            view = self.player_views[player.id]
+            animated = set(self.drawn_event_cells)
+            if fire:
+                animated |= {(int(r), int(c)) for r, c in argwhere(player.grid, lambda grid: grid == 'w')}
+            # animated cells need one more redraw when they stop animating
+            cells = animated | view.animated
+            view.animated = animated
+            rect = view.redraw(self, player, self.thumbnail_atlas(view.cell_size), cells)
+            if rect:
+                rects.append(rect)
+        return rects
+
+    def draw(self):
+        """Draw one frame and return the list of screen rects to pass to pygame.display.update."""
+        if self.show_player_views:
+            rects = self.draw_player_views()
+            rects.append(self.draw_header())
+            return rects
+
+        rects = self.draw_game_board()
+        rects.append(self.draw_header())
         self.draw_players()
-        self.draw_player_detail_info(box)
-        self.draw_events()
-        self.draw_message(box)
\ No newline at end of file
+        rects += self.sprite_rects
+        return rects
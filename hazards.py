@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field
+import numpy as np
+
+from chunked_map import ChunkedGrid
+
+
+@dataclass
+class Hazard:
+    """
+    Cells next to any of `source_items` are dangerous.
+
+    A player standing on such a cell is hit when it tries to collect one of
+    `trigger_items` (empty = always hit).
+    """
+    name: str
+    source_items: set[str]
+    trigger_items: set[str] = field(default_factory=set)
+    paused_duration: int = 45
+    mask: np.ndarray = None
+
+    def rebuild(self, grid: np.ndarray | ChunkedGrid):
+        if isinstance(grid, ChunkedGrid):
+            self.rebuild_chunks(grid)
+        else:
+            self.mask = self._adjacent(np.isin(grid, list(self.source_items)))
+
+    def rebuild_chunks(self, grid: ChunkedGrid):
+        # a chunked mask of a chunked map, built from each chunk and the cells around it
+        n_row, n_col = grid.shape
+        cs = grid.chunk_size
+        self.mask = ChunkedGrid(grid.shape, False, bool, cs)
+        sources = list(self.source_items)
+        fill = grid.fill in self.source_items
+        for cr in range(-(-n_row // cs)):
+            for cc in range(-(-n_col // cs)):
+                # only cells next to an allocated chunk can be next to a source
+                if not fill and not any((cr + dr, cc + dc) in grid.chunks for dr in (-1, 0, 1) for dc in (-1, 0, 1)):
+                    continue
+                r1, c1 = cr * cs, cc * cs
+                r2, c2 = min(r1 + cs, n_row), min(c1 + cs, n_col)
+                sr1, sr2 = max(r1 - 1, 0), min(r2 + 1, n_row)
+                sc1, sc2 = max(c1 - 1, 0), min(c2 + 1, n_col)
+                window = self._adjacent(np.isin(grid[sr1:sr2, sc1:sc2], sources))
+                # unallocated chunks stay unallocated when nothing is hazardous
+                self.mask[r1:r2, c1:c2] = window[r1 - sr1:r2 - sr1, c1 - sc1:c2 - sc1]
+
+    def update_cell(self, grid: np.ndarray | ChunkedGrid, row: int, col: int):
+        # a changed cell only affects the mask of its 4 neighbours
+        n_row, n_col = grid.shape
+        r1, r2 = max(row - 1, 0), min(row + 2, n_row)
+        c1, c2 = max(col - 1, 0), min(col + 2, n_col)
+        sr1, sr2 = max(r1 - 1, 0), min(r2 + 1, n_row)
+        sc1, sc2 = max(c1 - 1, 0), min(c2 + 1, n_col)
+        window = self._adjacent(np.isin(grid[sr1:sr2, sc1:sc2], list(self.source_items)))
+        self.mask[r1:r2, c1:c2] = window[r1 - sr1:r2 - sr1, c1 - sc1:c2 - sc1]
+
+    def hits(self, player) -> bool:
+        if not self.mask[player.row, player.col]:
+            return False
+        if not self.trigger_items:
+            return True
+        return any(item in self.trigger_items for item in player.allow_collect_items)
+
+    @staticmethod
+    def _adjacent(source: np.ndarray) -> np.ndarray:
+        # same neighbourhood as Map.get_neighbor_values: left, right, up, down
+        mask = np.zeros(source.shape, dtype=bool)
+        mask[:, 1:] |= source[:, :-1]
+        mask[:, :-1] |= source[:, 1:]
+        mask[1:, :] |= source[:-1, :]
+        mask[:-1, :] |= source[1:, :]
+        return mask
+
+
+class HazardMasks:
+    """
+    Precomputed boolean masks of hazardous cells on the authoritative map.
+
+    Masks are built once when a hazard is added and patched locally when the
+    map reports a change to one of its source items, so checking a player is
+    a single array lookup.
+    """
+
+    def __init__(self, map):
+        self.map = map
+        self.hazards: dict[str, Hazard] = {}
+        map.listeners.append(self.on_cell_changed)
+
+    def add(self, hazard: Hazard) -> Hazard:
+        hazard.rebuild(self.map.grid)
+        self.hazards[hazard.name] = hazard
+        return hazard
+
+    def remove(self, name: str):
+        self.hazards.pop(name, None)
+
+    def clear(self):
+        self.hazards = {}
+
+    def get(self, name: str) -> Hazard:
+        return self.hazards.get(name)
+
+    def active(self) -> list[Hazard]:
+        return list(self.hazards.values())
+
+    def on_cell_changed(self, row: int, col: int, old, new):
+        for hazard in self.hazards.values():
+            if old in hazard.source_items or new in hazard.source_items:
+                hazard.update_cell(self.map.grid, row, col)
@@ -247,7 +247,7 @@ class GameClient(Client):
 
     def goto(self, position:tuple[(int,int)]=None):
         player = self.get_player()
-        path = shortest_path(player.grid, (player.row, player.col), position)
+        path = shortest_path(player.grid, (player.row, player.col), position, player.components)
 
         # remove loop: just move step by step and recalculate next action
         # while path:
@@ -308,7 +308,7 @@ class GameClient(Client):
                 if value not in self.entity_positions[key]:
                     self.entity_positions[key] += resources_around[key]
 
-        path, target_coord = shortest_path_to_value(player.grid, start_pos, target_value)
+        path, target_coord = shortest_path_to_value(player.grid, start_pos, target_value, player.components)
         if path is not None and len(path)>0:
             self.move(path[0])
 
@@ -6,8 +6,12 @@ import inspect
 
 
 console = Console()
+quiet = False
 
 def log(msg:str, tag: str=''):
+    # console.log inspects the caller even when the console is quiet, skip it entirely
+    if quiet:
+        return
     console.log(f"[bold magenta]{tag}[/bold magenta] {msg}")
 
 def inspect_object(obj, tag: str=''):
@@ -23,4 +27,9 @@ def trylog():
     try:
         yield
     except:
-        console.print_exception(show_locals=True)
\ No newline at end of file
+        console.print_exception(show_locals=True)
+
+def set_quiet(value: bool = True):
+    """Silence log() output, e.g. in tournament workers running many matches."""
+    global quiet
+    quiet = value
@@ -1,9 +1,12 @@
 import random
+import threading
 import numpy as np
 from config import Config
 from player import Player
 from logs import log
 import enums
+import connectivity
+from chunked_map import ChunkedGrid
 
 map_static_items = {
     'g': 'Ground', # players can stand on it
@@ -12,26 +15,88 @@ map_static_items = {
     'c': 'Cotton', # Use to craft fabric',
 }
 
+# wide enough for player ids up to 9999 and '-1'
+CELL_DTYPE = 'U4'
+
 map_dynamic_items = {
     'a': 'Armor', # reduces damage taken during combat',
     's': 'Sword', # increases damage dealt to opponents during combat',
 }
 
 class Map():
-    def __init__(self, n_row, n_col):
+    def __init__(self, n_row, n_col, seed: int = None, chunk_size: int = 0):
         self.n_row = n_row
         self.n_col = n_col
-        self.grid = np.array(['-1'] * self.n_row * self.n_col).reshape(self.n_row, self.n_col)
+        # chunk_size > 0 stores grids as lazily allocated chunks, for very large maps
+        self.chunk_size = chunk_size
+        # all map randomness (generation and item respawn) comes from this generator
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.grid = self.new_grid('-1')
+        # callbacks (row, col, old, new) notified when set_value changes a cell
+        self.listeners = []
+        # connected-component labels of passable cells, recomputed lazily; client threads read them while
+        # the tick changes the map, version counts passability changes so stale labels are never cached
+        self.components = None
+        self.version = 0
+        self.lock = threading.Lock()
     
+    def new_grid(self, fill):
+        if self.chunk_size:
+            return ChunkedGrid((self.n_row, self.n_col), fill, CELL_DTYPE, self.chunk_size)
+        return np.full((self.n_row, self.n_col), fill, dtype=CELL_DTYPE)
+
+    def copy(self) -> 'Map':
+        """Independent copy, e.g. to play several matches on one generated map."""
+        map = Map(self.n_row, self.n_col, seed=self.seed, chunk_size=self.chunk_size)
+        map.grid = self.grid.copy()
+        map.rng.setstate(self.rng.getstate())
+        map.components = self.components
+        return map
+
     def from_player(player):
         map = Map(player.map_h, player.map_w)
         map.grid = player.grid
         return map
 
-    def random_map(self):
-        self.grid = np.array(['g'] * self.n_row * self.n_col).reshape(self.n_row, self.n_col)
-        self.ramdom_static_items()
+    def random_map(self, seed: int = None, max_attempts: int = 20):
+        if seed is not None:
+            self.seed = seed
+            self.rng.seed(seed)
+        for attempt in range(max_attempts):
+            self.grid = self.new_grid('g')
+            self.ramdom_static_items()
+            self.components = None
+            if self.is_connected():
+                break
+        else:
+            log(f'Map {self.seed} still disconnected after {max_attempts} attempts, repair it', '[MAP]')
+            self.repair()
         self.random__dynamic_items()
+        self.seed_respawns()
+
+    def seed_respawns(self):
+        # respawns get their own stream, so a map loaded from disk respawns
+        # items exactly like the freshly generated one
+        if self.seed is not None:
+            self.rng.seed(f'{self.seed}:respawn')
+
+    def save(self, path):
+        """Save the grid as .npy: fixed-width strings, so it can be memory-mapped on load."""
+        np.save(path, self.grid)
+
+    def load(path, seed: int = None, mmap: bool = True):
+        grid = np.load(path, mmap_mode='c' if mmap else None)
+        if grid.dtype.itemsize < np.dtype(CELL_DTYPE).itemsize:
+            grid = grid.astype(CELL_DTYPE)
+        map = Map(grid.shape[0], grid.shape[1], seed=seed)
+        # copy-on-write: pages are read lazily and changes stay in memory
+        map.grid = grid
+        map.seed_respawns()
+        if not map.is_connected():
+            log(f'Map {path} is disconnected, repair it', '[MAP]')
+            map.repair()
+        return map
 
     
     def correct_grid_range(grid: np.array, row: int, col: int) -> tuple[int, int]:
@@ -90,7 +155,86 @@ class Map():
             self.clear_player(player_id)
 
     def set_value(self, row, col, val):
+        old = self.grid[row, col]
         self.grid[row, col] = val
+        if (old in connectivity.OBSTACLES) != (val in connectivity.OBSTACLES):
+            with self.lock:
+                self.version += 1
+                self.components = None
+        if self.listeners and old != self.grid[row, col]:
+            for listener in self.listeners:
+                listener(row, col, old, self.grid[row, col])
+
+    def get_components(self) -> np.ndarray:
+        labels = self.components
+        while labels is None:
+            version = self.version
+            labels = connectivity.label_components(self.grid)
+            with self.lock:
+                # the map changed while labeling: label again
+                if version != self.version:
+                    labels = None
+                else:
+                    self.components = labels
+        return labels
+
+    def is_reachable(self, start: tuple[int, int], target: tuple[int, int]) -> bool:
+        """A path exists from start to target, or to a cell next to a resource target."""
+        return connectivity.is_reachable(self.get_components(), start, target)
+
+    def disconnected_cell(self, homes=()):
+        """
+        A cell breaking connectivity, or None: all passable cells and homes must
+        form one component and every resource block must touch it.
+        """
+        labels = self.get_components()
+        for row, col in homes:
+            if labels[row, col] < 0:
+                return row, col
+        main = self.main_component(homes)
+        if main is None:
+            return None
+
+        cells = np.argwhere((labels >= 0) & (labels != main))
+        if len(cells):
+            return tuple(cells[0])
+        # resources are collected from a neighbouring cell, one per block is enough
+        touching = connectivity.touching(labels, main)
+        for item in connectivity.OBSTACLES:
+            blocks = connectivity.label_components(self.grid, lambda cells: cells == item)
+            reached = np.unique(blocks[touching & (blocks >= 0)])
+            cells = np.argwhere((blocks >= 0) & ~np.isin(blocks, reached))
+            if len(cells):
+                return tuple(cells[0])
+        return None
+
+    def main_component(self, homes=()):
+        """The first home's component, or the largest one."""
+        labels = self.get_components()
+        if homes:
+            return labels[homes[0]]
+        if not (labels >= 0).any():
+            return None
+        return np.bincount(labels[labels >= 0]).argmax()
+
+    def is_connected(self, homes=()) -> bool:
+        return self.disconnected_cell(homes) is None
+
+    def repair(self, homes=()):
+        """Carve ground from every disconnected cell to the main component."""
+        for row, col in homes:
+            if self.grid[row, col] in connectivity.OBSTACLES:
+                self.set_value(row, col, 'g')
+        while (cell := self.disconnected_cell(homes)) is not None:
+            targets = np.argwhere(self.get_components() == self.main_component(homes))
+            row, col = cell
+            target_row, target_col = targets[np.abs(targets - cell).sum(axis=1).argmin()]
+            # L-shaped corridor along the row then the column, an enclosed resource itself is kept
+            path = [(row, c) for c in range(col, target_col, 1 if target_col >= col else -1)]
+            path += [(r, target_col) for r in range(row, target_row, 1 if target_row >= row else -1)]
+            for r, c in path:
+                if (r, c) != (row, col) and self.grid[r, c] in connectivity.OBSTACLES:
+                    self.set_value(r, c, 'g')
 
     def get_value(self, row, col):
         if row<0 or row >= self.n_row or col <0 or col >= self.n_col:
@@ -150,27 +294,27 @@ class Map():
     def ramdom_static_items(self):
         # random food
         for i in range(Config.MAP_NUMBER_FOOT):
-            w = random.randint(1, 2)
-            h = random.randint(1, 2)
-            c = random.randint(Config.N_COL //2  - 1 , Config.N_COL //2 + 1)
-            r = random.randint(Config.N_ROW //2  - 4 , Config.N_ROW //2 + 4)
+            w = self.rng.randint(1, 2)
+            h = self.rng.randint(1, 2)
+            c = self.rng.randint(self.n_col //2  - 1 , self.n_col //2 + 1)
+            r = self.rng.randint(self.n_row //2  - 4 , self.n_row //2 + 4)
             
             self.grid[r-h:r+h, c-w:c+w] = 'r'
 
         # random wood
         for i in range(Config.MAP_NUMBER_WOOD):
-            w = random.randint(1, 3)
-            h = random.randint(1, 3)
-            c = random.randint(Config.N_COL//2 -7 , Config.N_COL//2 + 7)
-            r = random.randint(Config.N_ROW//2 -1, Config.N_ROW//2+1)
+            w = self.rng.randint(1, 3)
+            h = self.rng.randint(1, 3)
+            c = self.rng.randint(self.n_col//2 -7 , self.n_col//2 + 7)
+            r = self.rng.randint(self.n_row//2 -1, self.n_row//2+1)
             self.grid[r:r+h, c:c+w] = 'w'
 
         # # random cotton
         for i in range(Config.MAP_NUMBER_COTTON):
-            w = random.randint(1, 3)
-            h = random.randint(1, 3)
-            c = random.randint(Config.N_COL//2 -7 , Config.N_COL//2 + 7)
-            r = random.randint(Config.N_ROW//2 -1, Config.N_ROW//2+1)
+            w = self.rng.randint(1, 3)
+            h = self.rng.randint(1, 3)
+            c = self.rng.randint(self.n_col//2 -7 , self.n_col//2 + 7)
+            r = self.rng.randint(self.n_row//2 -1, self.n_row//2+1)
             self.grid[r:r+h, c:c+w] = 'c'
 
     def random_item(self, item, number, row_range:tuple[int, int]=None, col_range:tuple[int, int]=None):
@@ -181,16 +325,16 @@ class Map():
             w = 1
             h = 1
             if row_range:
-                r = random.randint(row_range[0], row_range[1])
+                r = self.rng.randint(row_range[0], row_range[1])
             else:
-                r = random.randint(h , self.n_row - h)
+                r = self.rng.randint(h , self.n_row - h)
             if col_range:
-                c = random.randint(col_range[0], col_range[1])
+                c = self.rng.randint(col_range[0], col_range[1])
             else:
-                c = random.randint(w , self.n_col - w)
+                c = self.rng.randint(w , self.n_col - w)
             
             if self.grid[r, c] == 'g':
-                self.grid[r, c] = item
+                self.set_value(r, c, item)
                 count += 1
 
     def random__dynamic_items(self):
@@ -0,0 +1,62 @@
+# map_pool.py
+# Pre-generated maps, loaded instantly instead of generated at server start.
+#   python map_pool.py --out maps --count 100 --seed 0
+#   MAP_POOL=maps MAP_SEED=7 python server.py
+import argparse
+import random
+from pathlib import Path
+
+from config import Config
+from logs import log
+from map import Map
+
+
+class MapPool:
+    """
+    Directory of maps saved as map_<seed>.npy.
+
+    A map is fully determined by its seed, so a pool is just a cache of
+    Map.random_map(seed): loading is a memory-map of the file and the map's
+    generator is reseeded, so item respawns match a freshly generated map.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def path(self, seed: int) -> Path:
+        return self.directory / f'map_{seed}.npy'
+
+    def seeds(self) -> list[int]:
+        return sorted(int(path.stem.split('_', 1)[1]) for path in self.directory.glob('map_*.npy'))
+
+    def generate(self, seeds, n_row: int = Config.N_ROW, n_col: int = Config.N_COL):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for seed in seeds:
+            map = Map(n_row, n_col)
+            map.random_map(seed)
+            map.save(self.path(seed))
+        log(f'Generated {len(seeds)} maps in {self.directory}', '[MAP_POOL]')
+
+    def load(self, seed: int) -> Map:
+        return Map.load(self.path(seed), seed=seed)
+
+    def pick(self, seed: int = None) -> Map:
+        """Map of the given seed, or a random map of the pool when seed is None."""
+        seeds = self.seeds()
+        if not seeds:
+            raise FileNotFoundError(f'No maps in pool {self.directory}')
+        if seed is None:
+            seed = random.choice(seeds)
+        elif seed not in seeds:
+            raise FileNotFoundError(f'No map with seed {seed} in pool {self.directory}')
+        log(f'Load map {seed} from pool {self.directory}', '[MAP_POOL]')
+        return self.load(seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate a pool of seeded maps')
+    parser.add_argument('--out', default='maps')
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0, help='first seed')
+    args = parser.parse_args()
+    MapPool(args.out).generate(range(args.seed, args.seed + args.count))
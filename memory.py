@@ -0,0 +1,162 @@
+# memory.py
+# Memory of a long-running match by subsystem (tracemalloc), with an alarm on sustained growth.
+#   MEMORY_INTERVAL=10 METRICS_PORT=9100 python server.py
+#   curl http://127.0.0.1:9100/metrics    # 'memory' section
+import os
+import threading
+import tracemalloc
+from collections import deque
+
+from logs import log
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# allocations are charged to the innermost frame in one of these files (relative to the repo)
+SUBSYSTEMS = {
+    'map': ('map.py', 'chunked_map.py', 'map_pool.py', 'atlas.py', 'connectivity.py', 'pathfinding.py',
+            'game_board.py'),
+    'players': ('player.py', 'player_view.py', 'bots.py', 'game/game_client.py'),
+    'network': ('utils.py', 'message.py', 'client.py', 'spectator.py', 'spectator_web.py', 'rooms.py'),
+    'events': ('events.py', 'hazards.py', 'triggers.py'),
+    'logs': ('logs.py', 'promptings.py', 'client_prompting.py'),
+    'recording': ('replay.py', 'telemetry.py', 'checkpoint.py', 'metrics.py', 'profiler.py'),
+    'match': ('server.py', 'env.py', 'batch_env.py', 'tournament.py'),
+}
+FILE_SUBSYSTEMS = {name: subsystem for subsystem, names in SUBSYSTEMS.items() for name in names}
+# rich renders the log() output
+PACKAGE_SUBSYSTEMS = {'rich': 'logs'}
+MB = 1 << 20
+
+
+class MemoryMonitor:
+    """
+    Takes a tracemalloc snapshot every `interval` seconds on a daemon thread and
+    sums the traced blocks by subsystem. `gauges` returns the lengths of
+    structures that should stay bounded (queued moves, board messages, ...),
+    not of those growing by design like log files. A subsystem that grew in
+    each of the last `window` samples by `min_growth` bytes in all, or a gauge
+    that grew in each of them by `gauge_growth` per sample on average, raises
+    a leak alarm.
+
+    Tracing starts when the monitor is built and slows allocations down, so it
+    is only built when asked for.
+    """
+
+    def __init__(self, interval: float, gauges=None, frames: int = 4, window: int = 6, min_growth: int = MB,
+                 gauge_growth: float = 10):
+        self.interval = interval
+        self.gauges = gauges
+        self.window = window
+        self.min_growth = min_growth
+        self.gauge_growth = gauge_growth
+        self.history: dict[str, deque] = {}
+        self.alarms: dict[str, str] = {}
+        self.latest: dict = {'samples': 0}
+        self.samples = 0
+        self.files: dict[str, str | None] = {}
+        self.stopped = threading.Event()
+        self.thread: threading.Thread = None
+        # tracing started by someone else (python -X tracemalloc) is left running
+        self.tracing = not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start(frames)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='memory', daemon=True)
+        self.thread.start()
+        log(f'Sample memory every {self.interval:g} s', '[MEMORY]')
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.tracing:
+            tracemalloc.stop()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                log(f'Memory sample failed: {e}', '[MEMORY]')
+
+    def subsystem(self, filename: str) -> str | None:
+        if filename not in self.files:
+            found = None
+            path = os.path.abspath(filename)
+            if path.startswith(ROOT + os.sep):
+                found = FILE_SUBSYSTEMS.get(os.path.relpath(path, ROOT).replace(os.sep, '/'))
+            else:
+                parts = path.split(os.sep)
+                for package, subsystem in PACKAGE_SUBSYSTEMS.items():
+                    if package in parts:
+                        found = subsystem
+            self.files[filename] = found
+        return self.files[filename]
+
+    def classify(self, snapshot) -> dict[str, dict]:
+        """Traced bytes and blocks per subsystem, and the line holding most of each."""
+        groups = {}
+        for stat in snapshot.statistics('traceback'):
+            # frames are ordered oldest first
+            subsystem, line = 'other', stat.traceback[-1]
+            for frame in reversed(stat.traceback):
+                found = self.subsystem(frame.filename)
+                if found:
+                    subsystem, line = found, frame
+                    break
+            group = groups.setdefault(subsystem, {'bytes': 0, 'blocks': 0, 'lines': {}})
+            group['bytes'] += stat.size
+            group['blocks'] += stat.count
+            filename = os.path.relpath(line.filename, ROOT) if line.filename.startswith(ROOT) else line.filename
+            where = f'{filename}:{line.lineno}'
+            group['lines'][where] = group['lines'].get(where, 0) + stat.size
+        for group in groups.values():
+            lines = group.pop('lines')
+            group['top'] = max(lines, key=lines.get)
+        return groups
+
+    def sample(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        groups = self.classify(snapshot)
+        gauges = self.gauges() if self.gauges else {}
+        current, peak = tracemalloc.get_traced_memory()
+        self.samples += 1
+
+        subsystems = {}
+        for name, group in sorted(groups.items(), key=lambda item: -item[1]['bytes']):
+            growth = self.track(name, group['bytes'], self.min_growth, 'bytes')
+            subsystems[name] = {'mb': round(group['bytes'] / MB, 3), 'blocks': group['blocks'],
+                                'growth_mb': round(growth / MB, 3), 'top': group['top']}
+        for name, value in gauges.items():
+            self.track(f'gauge:{name}', value, self.gauge_growth * self.window, '')
+        self.latest = {
+            'samples': self.samples,
+            'interval_s': self.interval,
+            'traced_mb': round(current / MB, 3),
+            'peak_mb': round(peak / MB, 3),
+            'subsystems': subsystems,
+            'gauges': gauges,
+            'alarms': dict(self.alarms),
+        }
+
+    def track(self, name: str, value: float, min_growth: float, unit: str) -> float:
+        """Adds a sample to `name`'s history, returns its growth over the window and updates the alarm."""
+        history = self.history.setdefault(name, deque(maxlen=self.window + 1))
+        history.append(value)
+        growth = history[-1] - history[0]
+        growing = (len(history) == history.maxlen and growth >= min_growth
+                   and all(b > a for a, b in zip(history, list(history)[1:])))
+        if growing and name not in self.alarms:
+            self.alarms[name] = f'grew in each of the last {self.window} samples, +{growth:,.0f} {unit}'.rstrip()
+            log(f'Possible leak: {name} {self.alarms[name]}', '[MEMORY]')
+        elif not growing and name in self.alarms and history[-1] <= history[-2]:
+            del self.alarms[name]
+            log(f'{name} stopped growing', '[MEMORY]')
+        return growth
+
+    def snapshot(self) -> dict:
+        return self.latest
@@ -24,4 +24,17 @@ class AllowCollectItemsMessage(Message):
 
 class RemoveInProcessMoveMessage(Message):
     pass
-    
+
+class SpectatorCommandMessage(Message):
+    # sent by a spectator viewer, e.g. 'start' to start the game on a headless server
+    command: str
+
+class JoinRoomMessage(Message):
+    # first message of a client to the room server (rooms.py); room None = any room with a free slot
+    room: str | None = None
+    role: str = 'player' # 'player' or 'dispatcher'
+
+class ReattachMessage(Message):
+    # first message of a client to a server resumed from a checkpoint (checkpoint.py), takes over its player again
+    player_id: int
+    token: str
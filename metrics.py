@@ -0,0 +1,217 @@
+# metrics.py
+# Tick-phase timings, message counters and the tick overrun watchdog, served as JSON on METRICS_PORT.
+#   METRICS_PORT=9100 python server.py
+#   curl http://127.0.0.1:9100/metrics
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from logs import log
+
+PERCENTILES = (50, 95, 99)
+
+
+class RingBuffer:
+    """The last `size` samples in a fixed numpy array, for percentiles over a sliding window."""
+
+    def __init__(self, size: int = 1024):
+        self.values = np.zeros(size)
+        self.size = size
+        self.count = 0
+
+    def add(self, value: float):
+        self.values[self.count % self.size] = value
+        self.count += 1
+
+    def window(self) -> np.ndarray:
+        return self.values[:min(self.count, self.size)]
+
+    def summary(self, scale: float = 1e3) -> dict:
+        """count, mean, percentiles and max of the window, in milliseconds for seconds."""
+        values = self.window() * scale
+        if not len(values):
+            return {'count': 0}
+        result = {'count': self.count, 'mean': round(float(values.mean()), 3)}
+        for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+            result[f'p{q}'] = round(float(value), 3)
+        result['max'] = round(float(values.max()), 3)
+        return result
+
+
+class PhaseTimer:
+    """Reusable `with` block adding its duration to one phase, cheaper than a new context manager per tick."""
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add(self.name, time.perf_counter() - self.started)
+
+
+class Metrics:
+    """
+    Per-phase durations of the last ticks and counters of a server.
+
+    Phases timed several times in a tick (e.g. player_log once per player)
+    are summed into that tick's sample by end_tick. Work outside the tick,
+    like drawing, is sampled directly with observe.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self.phases: dict[str, RingBuffer] = {}
+        self.current: dict[str, float] = defaultdict(float)
+        self.timers: dict[str, PhaseTimer] = {}
+        self.counters: dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def phase(self, name: str) -> PhaseTimer:
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = PhaseTimer(self, name)
+        return timer
+
+    def add(self, phase: str, seconds: float):
+        self.current[phase] += seconds
+
+    def observe(self, name: str, seconds: float):
+        """A sample outside the simulation tick, e.g. drawing the dashboard."""
+        with self.lock:
+            if name not in self.phases:
+                self.phases[name] = RingBuffer(self.window)
+            self.phases[name].add(seconds)
+
+    def end_tick(self, seconds: float):
+        with self.lock:
+            self.current['tick'] += seconds
+            for name, value in self.current.items():
+                if name not in self.phases:
+                    self.phases[name] = RingBuffer(self.window)
+                self.phases[name].add(value)
+            self.current.clear()
+
+    def count(self, name: str, n: int = 1):
+        # counters are written from client threads, += on a dict entry is not atomic
+        with self.lock:
+            self.counters[name] += n
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'uptime': round(time.time() - self.started, 1),
+                'phases_ms': {name: buffer.summary() for name, buffer in self.phases.items()},
+                'counters': dict(self.counters),
+            }
+
+
+class Watchdog:
+    """
+    Flags ticks longer than the tick budget (1 / FPS). When ticks keep
+    overrunning, the dashboard is only drawn every render_every ticks
+    (doubling up to max_render_every); after a window without overruns the
+    render rate is raised again.
+    """
+
+    def __init__(self, budget: float, adaptive: bool = True, window: int = 16, max_render_every: int = 8):
+        self.budget = budget
+        self.adaptive = adaptive
+        self.window = window
+        self.max_render_every = max_render_every
+        self.render_every = 1
+        self.overruns = 0
+        self.recent = 0
+        self.ticks = 0
+        self.last_overrun = None
+
+    def check(self, tick: int, seconds: float) -> bool:
+        """Records a tick's duration, True if it overran the budget."""
+        self.ticks += 1
+        overrun = seconds > self.budget
+        if overrun:
+            self.overruns += 1
+            self.recent += 1
+            self.last_overrun = {'tick': tick, 'ms': round(seconds * 1e3, 3)}
+        if self.ticks % self.window == 0:
+            self.adapt()
+        return overrun
+
+    def adapt(self):
+        if self.adaptive:
+            # a quarter of the window overran: the simulation is about to fall behind
+            if self.recent * 4 >= self.window and self.render_every < self.max_render_every:
+                self.render_every *= 2
+                log(f'{self.recent}/{self.window} ticks overran {self.budget * 1e3:.0f} ms, '
+                    f'draw every {self.render_every} ticks', '[WATCHDOG]')
+            elif self.recent == 0 and self.render_every > 1:
+                self.render_every //= 2
+                log(f'Ticks back within budget, draw every {self.render_every} ticks', '[WATCHDOG]')
+        self.recent = 0
+
+    def should_render(self, tick: int) -> bool:
+        return tick % self.render_every == 0
+
+    def snapshot(self) -> dict:
+        return {
+            'budget_ms': round(self.budget * 1e3, 3),
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'render_every': self.render_every,
+            'last_overrun': self.last_overrun,
+        }
+
+
+class MetricsServer:
+    """
+    Local HTTP endpoint: GET /metrics returns one JSON object with a key per
+    registered section, each section a callable returning a JSON-able dict.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 9100):
+        self.host = host
+        self.port = port
+        self.sections: dict[str, callable] = {}
+        sections = self.sections
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = json.dumps({name: section() for name, section in list(sections.items())}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.serving = False
+        log(f'Metrics on http://{self.host}:{self.port}/metrics', '[METRICS]')
+
+    def add_section(self, name: str, section):
+        self.sections[name] = section
+
+    def start(self):
+        self.serving = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        # shutdown waits for serve_forever, which never ran if the server was not started
+        if self.serving:
+            self.httpd.shutdown()
+        self.httpd.server_close()
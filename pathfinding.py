@@ -2,17 +2,24 @@ from collections import deque
 import numpy as np
 from typing import List, Tuple, Optional
 from logs import log
+from connectivity import UNSEEN, is_reachable, touching
 
 def shortest_path(
     grid: np.ndarray,
     start: Tuple[int, int],
     target: Tuple[int, int],
+    components: Optional[np.ndarray] = None,
 ) -> Optional[List[int]]:
     """
     Return a list of moves (0=left, 1=right, 2=up, 3=down) from start to target,
     or None if no path exists. Only cells with value 'g' or '-1' are traversable.
+    With component labels (the player's visible ones, see get_player), an
+    unreachable target is rejected without searching.
     """
     log(f"Finding shortest path from {start} to {target}", "[Pathfinding]")
+    if components is not None and not is_reachable(components, start, target):
+        log(f"{target} is not reachable from {start}", "[Pathfinding]")
+        return None
     
     MOVES = [
         ( 0, -1,  0),  # left
@@ -58,7 +65,8 @@ def shortest_path(
 def shortest_path_to_value(
     grid: np.ndarray,
     start: Tuple[int, int],
-    x: str
+    x: str,
+    components: Optional[np.ndarray] = None,
 ) -> Tuple[Optional[List[int]], Optional[Tuple[int, int]]]:
     """
     Find the shortest path from `start` to a cell with value == x on the 2D matrix `grid`.
@@ -70,6 +78,12 @@ def shortest_path_to_value(
     Cells '-1' or 'g' are considered empty cells (can be passed through).
     """
     log(f"Finding shortest path to value '{x}' from {start}", "[Pathfinding]")
+    if components is not None:
+        # a value next to unseen cells may be reached through them
+        reached = touching(components, components[start]) | touching(components, UNSEEN)
+        if not (reached & (grid == x)).any():
+            log(f"No '{x}' reachable from {start}", "[Pathfinding]")
+            return None, None
     
     # Map dimensions
     n_rows, n_cols = grid.shape
@@ -112,7 +126,7 @@ def shortest_path_to_value(
                 if (nr, nc) not in visited:
                     cell_value = grid[nr, nc]
                     # If not an obstacle ('r','w','c'), continue BFS
-                    if cell_value not in obstacles:
+                    if cell_value not in obstacles and not cell_value.isdigit():
                         visited.add((nr, nc))
                         queue.append(((nr, nc), path + [move_idx]))
 
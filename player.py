@@ -3,6 +3,7 @@ from pydantic import BaseModel, Field, ConfigDict, field_serializer
 from enums import PlayerStatus
 import numpy as np
 from message import MoveMessage 
+from chunked_map import ChunkedGrid
 
 class Player(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -39,11 +40,15 @@ class Player(BaseModel):
     paused_duration: int = 0
     map_w: int = 0
     map_h: int = 0
-    grid: np.ndarray
+    grid: np.ndarray | ChunkedGrid
+    # component labels of the cells in grid, only in the copy sent to the player's client (visible_components)
+    components: np.ndarray | None = None
     message: str = ''
+    # secret of the player's client, a resumed server lets it reattach with ReattachMessage
+    token: str = ''
     in_process_move_messages: list[MoveMessage]= []
 
     @field_serializer('grid', when_used='json')
-    def serialize_data(self, v: np.ndarray, _info):
+    def serialize_data(self, v: np.ndarray | ChunkedGrid, _info):
         # Convert to nested list before JSON dumping
         return v.tolist()
\ No newline at end of file
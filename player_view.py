@@ -0,0 +1,70 @@
+import math
+
+import pygame
+
+from map import Map
+from utils import get_font, render_text
+
+
+class PlayerView:
+    """
+    Cached mini-view of one player's fog-of-war grid.
+
+    Only cells whose content or visibility changed for this player are
+    redrawn, so a view costs nothing on frames where nothing changed.
+    """
+
+    def __init__(self, player_id: int, n_row: int, n_col: int, cell_size: int, position: tuple[int, int]):
+        self.player_id = player_id
+        self.cell_size = cell_size
+        self.surface = pygame.Surface((n_col * cell_size, n_row * cell_size))
+        self.rect = self.surface.get_rect(topleft=position)
+        self.dirty: set[tuple[int, int]] = {(r, c) for r in range(n_row) for c in range(n_col)}
+        # cells animated on the previous frame (burning wood, event icons)
+        self.animated: set[tuple[int, int]] = set()
+
+    def redraw(self, game_board, player, atlas, animated: set[tuple[int, int]]) -> pygame.Rect:
+        """Redraw the dirty cells, return the screen rect to update or None."""
+        cells = self.dirty | animated
+        self.dirty = set()
+        if not cells:
+            return None
+
+        map = Map.from_player(player)
+        items = []
+        for row, col in cells:
+            position = (col * self.cell_size, row * self.cell_size)
+            for name in game_board.cell_images(map, player, row, col):
+                items.append((f'maps/{name}', position))
+            # players are drawn inside their cell at this size, the grid may hold
+            # a stale position of the player itself
+            value = map.get_value(row, col)
+            if (row, col) == (player.row, player.col):
+                value = str(player.id)
+            elif value == str(player.id):
+                continue
+            if value.isdigit():
+                items.append((game_board.sprite_name('players', value), position))
+        atlas.blits(self.surface, items)
+
+        screen = game_board.screen
+        screen.blit(self.surface, self.rect)
+        label = render_text(get_font("Courier New", 14, bold=True), f'{player.id}_{player.name}', (255, 255, 255))
+        screen.fill((0, 0, 0), label.get_rect(topleft=self.rect.topleft).inflate(4, 2))
+        screen.blit(label, self.rect.topleft)
+        return self.rect
+
+
+def player_views_layout(n_views: int, n_row: int, n_col: int, area: pygame.Rect, gap: int = 6):
+    """Cell size and top-left corners of a grid of n_views mini-views fitting in area."""
+    if n_views == 0:
+        return 0, []
+    cols = math.ceil(math.sqrt(n_views))
+    rows = math.ceil(n_views / cols)
+    cell_size = max(1, min((area.width - gap * (cols - 1)) // (cols * n_col),
+                           (area.height - gap * (rows - 1)) // (rows * n_row)))
+    positions = []
+    for i in range(n_views):
+        r, c = divmod(i, cols)
+        positions.append((area.x + c * (n_col * cell_size + gap), area.y + r * (n_row * cell_size + gap)))
+    return cell_size, positions
@@ -0,0 +1,222 @@
+# profiler.py
+# Sampling profiler thread for a running server or client, writes flamegraph files per tick range.
+#   PROFILE=1 python server.py                  # or press P in the server window
+#   python profiler.py profiles/match_ticks_0-1800.collapsed
+#   flamegraph.pl profiles/match_ticks_0-1800.collapsed > match.svg, or open a .speedscope.json on speedscope.app
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from logs import log
+
+FORMATS = {'collapsed': 'collapsed', 'speedscope': 'speedscope.json'}
+
+
+def label(code) -> str:
+    # ';' separates frames in collapsed stacks
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ',')
+
+
+def collapsed(stacks: Counter, labels: dict) -> list[str]:
+    """One 'thread;outer;...;inner count' line per distinct stack, the input of flamegraph.pl and speedscope."""
+    return [';'.join([thread] + [labels[code] for code in codes]) + f' {count}'
+            for (thread, codes), count in stacks.most_common()]
+
+
+def speedscope(stacks: Counter, labels: dict, name: str, interval: float) -> dict:
+    """A sampled speedscope profile per thread, weighted in milliseconds."""
+    frames, index = [], {}
+    profiles = {}
+    for (thread, codes), count in stacks.items():
+        sample = []
+        for code in codes:
+            if code not in index:
+                index[code] = len(frames)
+                frames.append({'name': labels[code], 'file': code.co_filename, 'line': code.co_firstlineno})
+            sample.append(index[code])
+        profile = profiles.setdefault(thread, {'type': 'sampled', 'name': thread, 'unit': 'milliseconds',
+                                               'startValue': 0, 'endValue': 0, 'samples': [], 'weights': []})
+        profile['samples'].append(sample)
+        profile['weights'].append(count * interval * 1e3)
+        profile['endValue'] += count * interval * 1e3
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'profiler.py',
+        'shared': {'frames': frames},
+        'profiles': list(profiles.values()),
+    }
+
+
+class SamplingProfiler:
+    """
+    Every `interval` seconds a daemon thread takes the stack of every other
+    thread (sys._current_frames) and counts it by thread name and code objects,
+    labels are only built when a file is written. Every `window` seconds, and
+    when stopped, the counts are written to `<name>_ticks_<first>-<last>` in
+    `directory` and reset. Without a tick function the file is tagged by the
+    seconds since the profiler started.
+    """
+
+    def __init__(self, name: str, directory: str = 'profiles', interval: float = 0.005, window: float = 30.0,
+                 format: str = 'collapsed', tick=None):
+        if format not in FORMATS:
+            raise ValueError(f'Unknown profile format {format}, expected one of {", ".join(FORMATS)}')
+        self.name = name
+        self.directory = directory
+        self.interval = interval
+        self.window = window
+        self.format = format
+        self.tick = tick
+        self.lock = threading.Lock()
+        self.stacks: Counter = Counter()
+        # self samples of every function since the start, for the metrics endpoint
+        self.leaves: Counter = Counter()
+        self.labels: dict = {}
+        self.samples = 0
+        self.first = self.last = None
+        self.files: list[str] = []
+        self.thread: threading.Thread = None
+        self.stopped = threading.Event()
+        self.started = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return self
+        self.stopped.clear()
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, name='profiler', daemon=True)
+        self.thread.start()
+        log(f'Profile every {self.interval * 1e3:.0f} ms to {self.directory}', '[PROFILER]')
+        return self
+
+    def stop(self):
+        if not self.running:
+            return
+        self.stopped.set()
+        self.thread.join()
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def run(self):
+        own = threading.get_ident()
+        names = {}
+        window_end = time.perf_counter() + self.window
+        while not self.stopped.wait(self.interval):
+            self.sample(sys._current_frames(), own, names)
+            if time.perf_counter() >= window_end:
+                self.flush()
+                window_end += self.window
+        self.flush()
+
+    def sample(self, frames: dict, own: int, names: dict):
+        moment = self.tick() if self.tick else round(time.perf_counter() - self.started)
+        with self.lock:
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    # a new thread since the last sample
+                    names.clear()
+                    names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                if not codes:
+                    continue
+                codes.reverse()
+                self.stacks[names.get(ident, str(ident)), tuple(codes)] += 1
+                self.leaves[codes[-1]] += 1
+            self.samples += 1
+            self.first = moment if self.first is None else min(self.first, moment)
+            self.last = moment if self.last is None else max(self.last, moment)
+
+    def flush(self) -> str | None:
+        """Writes the stacks counted since the last file, None if there were none."""
+        with self.lock:
+            stacks, self.stacks = self.stacks, Counter()
+            first, last = self.first, self.last
+            self.first = self.last = None
+        if not stacks:
+            return None
+        for thread, codes in stacks:
+            for code in codes:
+                if code not in self.labels:
+                    self.labels[code] = label(code)
+        unit = 'ticks' if self.tick else 'seconds'
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{self.name}_{unit}_{first}-{last}.{FORMATS[self.format]}')
+        with open(path, 'w') as f:
+            if self.format == 'speedscope':
+                json.dump(speedscope(stacks, self.labels, f'{self.name} {unit} {first}-{last}', self.interval), f)
+            else:
+                f.write('\n'.join(collapsed(stacks, self.labels)) + '\n')
+        self.files.append(path)
+        log(f'Wrote {sum(stacks.values())} stacks of {unit} {first}-{last} to {path}', '[PROFILER]')
+        return path
+
+    def snapshot(self, top: int = 10) -> dict:
+        with self.lock:
+            leaves = self.leaves.most_common(top)
+            samples = self.samples
+        return {
+            'running': self.running,
+            'interval_ms': self.interval * 1e3,
+            'samples': samples,
+            # functions on top of the stack most often, idle threads waiting in recv or sleep included
+            'top': [{'function': self.labels.get(code) or label(code), 'samples': count} for code, count in leaves],
+            'files': self.files[-5:],
+        }
+
+
+def load_collapsed(path: str) -> Counter:
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def hot_spots(stacks: Counter, top: int = 20) -> list[tuple[str, int, int]]:
+    """(function, self samples, total samples) of the functions with the most total samples."""
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')[1:]
+        own[frames[-1]] += count
+        # a recursive function counts once per stack
+        for frame in set(frames):
+            total[frame] += count
+    return [(frame, own[frame], count) for frame, count in total.most_common(top)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Print the hot spots of a collapsed stack profile')
+    parser.add_argument('path')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--thread', default=None, help='only the stacks of threads starting with this name')
+    args = parser.parse_args()
+
+    stacks = load_collapsed(args.path)
+    if args.thread:
+        stacks = Counter({stack: count for stack, count in stacks.items() if stack.startswith(args.thread)})
+    samples = sum(stacks.values())
+    print(f'{samples} samples')
+    print(f'{"self":>7} {"total":>7}  function')
+    for frame, own, total in hot_spots(stacks, args.top):
+        print(f'{own / samples:7.1%} {total / samples:7.1%}  {frame}')
@@ -0,0 +1,403 @@
+# replay.py
+# Append-only binary record of a match's inputs, and its headless replay.
+#   REPLAY_DIR=replays python server.py
+#   python replay.py replays/match_7_1700000000.replay
+#   python viewer.py --replay replays/match_7_1700000000.replay
+import argparse
+import bisect
+import hashlib
+import mmap
+import pickle
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from config import Config
+from enums import PlayerStatus
+from logs import log
+from map import Map
+from message import MoveMessage
+from spectator import build_snapshot, player_data
+
+MAGIC = b'GREPLAY1'
+VERSION = 2
+
+# record: kind (uint8), tick (uint32), then a payload depending on the kind
+HEAD = struct.Struct('<BI')
+TICK, MOVE, ALLOW, EVENT, JOIN, START, LEAVE, STATUS, UPDATE, END, DELTA, KEYFRAME = range(12)
+PAYLOADS = {
+    TICK: struct.Struct('<d'),     # game time of the tick, written once the tick ran
+    MOVE: struct.Struct('<Hb'),    # player, direction taken from its move queue
+    ALLOW: struct.Struct('<HH'),   # player, length of the comma separated items that follow
+    EVENT: struct.Struct('<I'),    # length of the pickled dispatcher event that follows
+    JOIN: struct.Struct('<H'),     # player
+    START: struct.Struct(''),
+    LEAVE: struct.Struct('<H'),    # player
+    STATUS: struct.Struct('<HB'),  # player, index in PlayerStatus set outside a tick
+    UPDATE: struct.Struct('<Hb'),  # player, direction of a move applied outside a tick (test mode keys)
+    END: struct.Struct('16s'),     # digest of the final state
+    DELTA: struct.Struct('<I'),    # length of the pickled changes of the frame that follow
+    KEYFRAME: struct.Struct('<I'), # length of the compressed pickled snapshot that follows
+}
+# kinds whose last payload value is the length of the data that follows
+TRAILING = {ALLOW, EVENT, DELTA, KEYFRAME}
+STATUSES = list(PlayerStatus)
+FLUSH_SIZE = 1 << 16
+# a full snapshot every this many frames bounds the deltas applied by a seek
+KEYFRAME_INTERVAL = 100
+
+
+def digest(server) -> bytes:
+    """Hash of the match state: map, tick and every player's position, status and items."""
+    h = hashlib.blake2b(digest_size=16)
+    board = server.game_board
+    h.update(np.ascontiguousarray(np.asarray(board.map.grid)).tobytes())
+    h.update(str(board.tick).encode())
+    for player_id in sorted(board.players):
+        player = board.players[player_id]
+        h.update(repr((player.id, player.row, player.col, player.status.value, sorted(map(str, player.store)),
+                       sorted(map(str, player.items_on_hand)), player.armor, player.sword)).encode())
+    return h.digest()
+
+
+class ReplayRecorder:
+    """
+    Writes a match's inputs as they are applied: the header holds the initial
+    map and its generator state, then each tick's moves (as taken from the
+    move queues), collected items when they change, dispatcher events, joins
+    and leaves, closed by a TICK record with the tick's game time. Records are
+    buffered and appended in 64 KiB blocks, the tick only packs a few bytes.
+
+    For seeking, every tick (a frame) also writes a DELTA of what a dashboard
+    shows: the changed cells, the changed player fields and the changed frame
+    fields. Every KEYFRAME_INTERVAL frames a KEYFRAME holds the full snapshot.
+    """
+
+    def __init__(self, path, server, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.path = path
+        self.buffer = bytearray()
+        self.lock = threading.Lock()
+        self.allowed: dict[int, tuple] = {}
+        self.keyframe_interval = keyframe_interval
+        self.frames = 0
+        self.cells: dict[tuple[int, int], str] = {}
+        self.players: dict[int, dict] = {}
+        self.fields: dict = {}
+        map = server.game_board.map
+        map.listeners.append(self.on_cell_changed)
+        header = pickle.dumps({
+            'version': VERSION,
+            'name': server.name,
+            'seed': map.seed,
+            'n_row': map.n_row,
+            'n_col': map.n_col,
+            'chunk_size': map.chunk_size,
+            'grid': map.grid.copy() if map.chunk_size else np.array(map.grid),
+            'rng_state': map.rng.getstate(),
+            'fps': server.fps,
+            'max_players': server.max_players,
+            'simulated_clock': server.simulated_clock,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        log(f'Record replay to {path}', '[REPLAY]')
+
+    def write(self, kind: int, tick: int, *values, data: bytes = b''):
+        with self.lock:
+            self.buffer += HEAD.pack(kind, tick) + PAYLOADS[kind].pack(*values) + data
+            if len(self.buffer) >= FLUSH_SIZE:
+                self.flush()
+
+    def flush(self):
+        if self.file is not None:
+            self.file.write(self.buffer)
+            self.file.flush()
+        self.buffer.clear()
+
+    def tick(self, tick: int, now: float):
+        self.write(TICK, tick, now)
+
+    def on_cell_changed(self, row, col, old, new):
+        self.cells[(row, col)] = str(new)
+
+    def frame(self, server):
+        """Writes the frame of the tick that just ran: its delta, and a keyframe every keyframe_interval frames."""
+        board = server.game_board
+        players = {}
+        seen = set()
+        for player in list(board.players.values()):
+            data = player_data(player)
+            seen.add(player.id)
+            previous = self.players.get(player.id, {})
+            changed = {name: value for name, value in data.items() if previous.get(name) != value}
+            if changed:
+                players[player.id] = changed
+                self.players[player.id] = data
+        left = [id for id in self.players if id not in seen]
+        for id in left:
+            del self.players[id]
+        current = {
+            'tick': board.tick,
+            'now': server.now(),
+            'game_status': board.game_status,
+            'current_event': server.current_event,
+            'event_cells': list(server.event_triggers.positions()) if server.event_triggers else [],
+            'messages': list(board.messages),
+            'message_tick_remaining': board.message_tick_remaining,
+        }
+        fields = {name: value for name, value in current.items() if self.fields.get(name) != value}
+        self.fields.update(fields)
+        cells, self.cells = self.cells, {}
+
+        tick = board.tick
+        data = pickle.dumps({'cells': cells, 'players': players, 'left': left, 'fields': fields},
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        self.write(DELTA, tick, len(data), data=data)
+        if self.frames % self.keyframe_interval == 0:
+            keyframe = build_snapshot(server, keyframe=True)
+            keyframe['frame'] = self.frames
+            data = zlib.compress(pickle.dumps(keyframe, protocol=pickle.HIGHEST_PROTOCOL), 1)
+            self.write(KEYFRAME, tick, len(data), data=data)
+        self.frames += 1
+
+    def move(self, tick: int, player_id: int, dir: int):
+        self.write(MOVE, tick, player_id, dir)
+
+    def allow(self, tick: int, player_id: int, items: list[str]):
+        # only changes are written, clients rarely change what they collect
+        items = tuple(items)
+        if self.allowed.get(player_id) == items:
+            return
+        self.allowed[player_id] = items
+        data = ','.join(items).encode()
+        self.write(ALLOW, tick, player_id, len(data), data=data)
+
+    def event(self, tick: int, event):
+        data = pickle.dumps(event, protocol=pickle.HIGHEST_PROTOCOL)
+        self.write(EVENT, tick, len(data), data=data)
+
+    def join(self, tick: int, player_id: int):
+        self.write(JOIN, tick, player_id)
+
+    def start(self, tick: int):
+        self.write(START, tick)
+
+    def leave(self, tick: int, player_id: int):
+        self.write(LEAVE, tick, player_id)
+
+    def status(self, tick: int, player_id: int, status: PlayerStatus):
+        self.write(STATUS, tick, player_id, STATUSES.index(status))
+
+    def update(self, tick: int, player_id: int, dir: int):
+        self.write(UPDATE, tick, player_id, dir)
+
+    def close(self, server=None):
+        if self.file is None:
+            return
+        if server is not None:
+            self.write(END, server.game_board.tick, digest(server))
+        with self.lock:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+class ReplayReader:
+    """
+    Memory-mapped replay file. The record heads are scanned once into the
+    offsets of every frame's delta and of the keyframes, so seek(frame)
+    decodes one keyframe and at most KEYFRAME_INTERVAL - 1 deltas, or only
+    the deltas after the current frame when moving forward.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a replay file')
+        (size,) = struct.unpack_from('<I', self.data, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = pickle.loads(self.data[start:start + size])
+        self.records_offset = start + size
+
+        self.deltas: list[int] = []
+        self.keyframes: list[tuple[int, int]] = []
+        for kind, tick, offset, _ in self.heads():
+            if kind == DELTA:
+                self.deltas.append(offset)
+            elif kind == KEYFRAME:
+                self.keyframes.append((len(self.deltas) - 1, offset))
+        self.keyframe_frames = [frame for frame, _ in self.keyframes]
+        self.snapshot = None
+        self.fogs: dict[int, np.ndarray] = {}
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.deltas)
+
+    def heads(self):
+        """(kind, tick, offset, payload values) of every complete record, a truncated last record is skipped."""
+        data, offset = self.data, self.records_offset
+        while offset + HEAD.size <= len(data):
+            kind, tick = HEAD.unpack_from(data, offset)
+            payload = PAYLOADS[kind]
+            if offset + HEAD.size + payload.size > len(data):
+                return
+            values = payload.unpack_from(data, offset + HEAD.size)
+            size = HEAD.size + payload.size + (values[-1] if kind in TRAILING else 0)
+            if offset + size > len(data):
+                return
+            yield kind, tick, offset, values
+            offset += size
+
+    def trailing(self, kind: int, offset: int, values: tuple) -> bytes:
+        start = offset + HEAD.size + PAYLOADS[kind].size
+        return self.data[start:start + values[-1]]
+
+    def records(self):
+        """(kind, tick, values) of every record, values as unpacked plus the trailing data if any."""
+        for kind, tick, offset, values in self.heads():
+            if kind == ALLOW:
+                values = (values[0], self.trailing(kind, offset, values).decode())
+            elif kind == EVENT:
+                values = (pickle.loads(self.trailing(kind, offset, values)),)
+            elif kind in (DELTA, KEYFRAME):
+                continue
+            yield kind, tick, values
+
+    def read(self, offset: int):
+        kind, tick = HEAD.unpack_from(self.data, offset)
+        values = PAYLOADS[kind].unpack_from(self.data, offset + HEAD.size)
+        data = self.trailing(kind, offset, values)
+        return pickle.loads(zlib.decompress(data) if kind == KEYFRAME else data)
+
+    def seek(self, frame: int) -> dict:
+        """Dashboard snapshot (as built by spectator.build_snapshot, with fog grids) of `frame`."""
+        if not self.deltas:
+            raise ValueError('Replay has no frames')
+        frame = max(0, min(frame, self.n_frames - 1))
+        index = bisect.bisect_right(self.keyframe_frames, frame) - 1
+        keyframe, offset = self.keyframes[index]
+        # moving forward within the keyframe interval only applies the deltas in between
+        if self.snapshot is None or not keyframe <= self.snapshot['frame'] <= frame:
+            self.snapshot = self.read(offset)
+            self.fogs = {data['id']: data.pop('grid') for data in self.snapshot['players']}
+        for next_frame in range(self.snapshot['frame'] + 1, frame + 1):
+            self.apply(self.read(self.deltas[next_frame]))
+            self.snapshot['frame'] = next_frame
+
+        snapshot = dict(self.snapshot, keyframe=True, grid=self.snapshot['grid'].copy())
+        snapshot['players'] = [dict(data, grid=self.fogs[data['id']].copy()) for data in self.snapshot['players']]
+        return snapshot
+
+    def apply(self, delta: dict):
+        snapshot = self.snapshot
+        grid = snapshot['grid']
+        for (row, col), value in delta['cells'].items():
+            grid[row, col] = value
+        snapshot.update(delta['fields'])
+
+        players = {data['id']: data for data in snapshot['players'] if data['id'] not in delta['left']}
+        for id in delta['left']:
+            self.fogs.pop(id, None)
+        for id, changed in delta['players'].items():
+            if id not in players:
+                players[id] = {}
+                self.fogs[id] = Map(self.header['n_row'], self.header['n_col'],
+                                    chunk_size=self.header['chunk_size']).new_grid('-1')
+            players[id].update(changed)
+        snapshot['players'] = list(players.values())
+
+        # fog-of-war windows as GameBoard.update_nearby_map_area opens them
+        half = Config.OPEN_CELL // 2
+        for data in snapshot['players']:
+            Map.copy_grid(grid, self.fogs[data['id']], data['row'] - half, data['row'] + half,
+                          data['col'] - half, data['col'] + half)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def load_map(header):
+    map = Map(header['n_row'], header['n_col'], seed=header['seed'], chunk_size=header['chunk_size'])
+    map.grid = header['grid'].copy()
+    map.rng.setstate(header['rng_state'])
+    return map
+
+
+def replay(path, instrument=None):
+    """
+    Replays a recorded match headless, returns the server and whether its
+    final state matches the record. instrument(server) is called before the
+    first record is applied, e.g. to time the server's methods.
+    """
+    from server import Server
+    from utils import BotSeat
+
+    reader = ReplayReader(path)
+    header = reader.header
+    server = Server(listen=False, headless=True, spectator_port=0, web_port=0, metrics_port=0,
+                    max_players=header['max_players'],
+                    name=header['name'], simulated_clock=header['simulated_clock'], player_logs=False,
+                    map=load_map(header), replay_path='', checkpoint_path='')
+    if instrument is not None:
+        instrument(server)
+    board = server.game_board
+    seats = {}
+    moves, allowed, events = {}, {}, []
+    matches = None
+    for kind, tick, values in reader.records():
+        if kind == MOVE:
+            moves[values[0]] = values[1]
+        elif kind == ALLOW:
+            allowed[values[0]] = values[1].split(',') if values[1] else []
+        elif kind == EVENT:
+            events.append(values[0])
+        elif kind == TICK:
+            for event in events:
+                server.handle_dispatcher_event(event)
+            for player_id, items in allowed.items():
+                if player_id in board.players:
+                    board.players[player_id].allow_collect_items = items
+            for player_id, player in board.players.items():
+                player.in_process_move_messages = [MoveMessage(dir=moves[player_id])] if player_id in moves else []
+            moves, allowed, events = {}, {}, []
+            server.step(now=values[0])
+        elif kind == JOIN:
+            seats[values[0]] = BotSeat(values[0])
+            player = server.add_player(seats[values[0]])
+            if player.id != values[0]:
+                raise ValueError(f'Replay joined player {player.id}, recorded {values[0]}')
+        elif kind == START:
+            server.start_game()
+        elif kind == LEAVE:
+            server.remove_player(values[0])
+            server.clients.pop(seats.pop(values[0], None), None)
+        elif kind == STATUS:
+            if values[0] in board.players:
+                board.players[values[0]].status = STATUSES[values[1]]
+        elif kind == UPDATE:
+            if values[0] in board.players:
+                server.update_player(board.players[values[0]], values[1])
+        elif kind == END:
+            matches = digest(server) == values[0]
+    return server, matches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay a recorded match headless')
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    server, matches = replay(args.path)
+    board = server.game_board
+    log(f'Replayed {args.path}: tick {board.tick}, {len(board.players)} players', '[REPLAY]')
+    for player in board.players.values():
+        log(f'Player {player.id} {player.status.value} store {sorted(map(str, player.store))}', '[REPLAY]')
+    if matches is None:
+        log('Replay has no final state to compare (match not closed)', '[REPLAY]')
+    else:
+        log('Final state matches the recording' if matches else 'Final state DIFFERS from the recording', '[REPLAY]')
@@ -0,0 +1,204 @@
+# rooms.py
+# Many matches in one process: one listener, one headless Server per room.
+#   MAX_ROOMS=20 MAX_PLAYERS=5 python rooms.py
+import functools
+import os
+import socket
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from logs import log
+from utils import receive
+from config import Config
+from enums import GameStatus
+from events import WinConditionEvent
+from message import JoinRoomMessage
+from server import Server
+
+
+class RoomServer:
+    """
+    Accepts every connection on one port and hands it to a room.
+
+    A client may send JoinRoomMessage first to pick a room and a role. Clients
+    that send nothing within `handshake_timeout` (plain Client, dispatcher
+    notebook) are assigned like a single server would: the first connection of
+    a room is its dispatcher, the next ones are players. Rooms are headless
+    Servers without a socket of their own, all ticked by one scheduler thread.
+    """
+
+    def __init__(self, host=None, port=None, max_rooms: int = None, max_players: int = None,
+                 start_after: float = None, handshake_timeout: float = 1.0):
+        load_dotenv(override=True)
+        self.host = host or os.environ.get('SERVER', '0.0.0.0')
+        self.port = port or int(os.environ.get('PORT', 4444))
+        self.max_rooms = max_rooms or int(os.environ.get('MAX_ROOMS', 20))
+        self.max_players = max_players or int(os.environ.get('MAX_PLAYERS', Config.MAX_PLAYERS))
+        # a room starts when full, or this many seconds after its first player joined
+        self.start_after = start_after if start_after is not None else float(os.environ.get('ROOM_START_AFTER', 30))
+        self.handshake_timeout = handshake_timeout
+        self.fps = Config.FPS
+
+        self.rooms: dict[str, Server] = {}
+        self.first_join: dict[str, float] = {}
+        # players seated per room, counted at handshake before the room creates them
+        self.seats: dict[str, int] = {}
+        self.dispatchers: set[str] = set()
+        self.room_counter = 0
+        self.lock = threading.Lock()
+
+        log(f'Room server listen to {self.host}:{self.port}', '[ROOMS]')
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(128)
+
+    def start(self):
+        threading.Thread(target=self.accept_clients, daemon=True).start()
+        self.run_scheduler()
+
+    def accept_clients(self):
+        while True:
+            try:
+                client_socket, addr = self.server_socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handshake, args=(client_socket, addr), daemon=True).start()
+
+    def handshake(self, client_socket, addr):
+        client_socket.settimeout(self.handshake_timeout)
+        message = receive(client_socket)
+        client_socket.settimeout(None)
+        if not isinstance(message, JoinRoomMessage):
+            message = None
+
+        with self.lock:
+            name, role = self.assign(message)
+            if name is None:
+                log(f'No room available, refuse client {addr}', '[ROOMS]')
+                client_socket.close()
+                return
+            room = self.rooms[name]
+            if role == 'player':
+                self.first_join.setdefault(name, time.perf_counter())
+                self.seats[name] = self.seats.get(name, 0) + 1
+            else:
+                self.dispatchers.add(name)
+        log(f'Client {addr} joins room {name} as {role}', '[ROOMS]')
+        if not room.add_client(client_socket, addr, role) and role == 'player':
+            self.release_seat(name)
+
+    def release_seat(self, name: str, player_id: int = None):
+        """A refused player, or one that left before the start, frees its slot."""
+        with self.lock:
+            if self.seats.get(name):
+                self.seats[name] -= 1
+
+    def assign(self, message: JoinRoomMessage):
+        """Room name and role for a new connection, (None, None) when it cannot be placed."""
+        if message is not None and message.room is not None:
+            name = message.room
+            if name not in self.rooms and not self.create_room(name):
+                return None, None
+            role = message.role
+            if role == 'player' and not self.has_free_slot(name):
+                return None, None
+            if role == 'dispatcher' and name in self.dispatchers:
+                return None, None
+            return name, role
+
+        role = message.role if message is not None else None
+        for name in self.rooms:
+            if role == 'dispatcher' and name not in self.dispatchers:
+                return name, role
+            if role != 'dispatcher' and self.has_free_slot(name):
+                if role is None:
+                    role = 'player' if name in self.dispatchers else 'dispatcher'
+                return name, role
+
+        name = self.create_room()
+        if name is None:
+            return None, None
+        return name, role or 'dispatcher'
+
+    def has_free_slot(self, name: str) -> bool:
+        room = self.rooms[name]
+        return (room.game_board.game_status == GameStatus.WAITING_FOR_PLAYERS
+                and self.seats.get(name, 0) < room.max_players)
+
+    def create_room(self, name: str = None):
+        if len(self.rooms) >= self.max_rooms:
+            return None
+        if name is None:
+            self.room_counter += 1
+            name = f'room{self.room_counter}'
+        self.rooms[name] = Server(headless=True, listen=False, name=name, max_players=self.max_players,
+                                  spectator_port=0, web_port=0, metrics_port=0, checkpoint_path='')
+        self.rooms[name].leave_listeners.append(functools.partial(self.release_seat, name))
+        log(f'Open room {name} ({len(self.rooms)}/{self.max_rooms})', '[ROOMS]')
+        return name
+
+    def close_room(self, name: str):
+        room = self.rooms.pop(name)
+        self.first_join.pop(name, None)
+        self.seats.pop(name, None)
+        self.dispatchers.discard(name)
+        room.close()
+        log(f'Close room {name}', '[ROOMS]')
+
+    def update_rooms(self):
+        now = time.perf_counter()
+        for name, room in list(self.rooms.items()):
+            status = room.game_board.game_status
+            if status == GameStatus.WAITING_FOR_PLAYERS and room.game_board.players:
+                full = len(room.game_board.players) >= room.max_players
+                if full or now - self.first_join.get(name, now) >= self.start_after:
+                    log(f'Start room {name} with {len(room.game_board.players)} players', '[ROOMS]')
+                    self.ensure_win_condition(name, room)
+                    room.start_game()
+            elif status == GameStatus.FINISHED or (status == GameStatus.PLAYING and not room.clients):
+                self.close_room(name)
+
+    def ensure_win_condition(self, name: str, room: Server):
+        # without a dispatcher nothing sets the win condition, and converting cotton divides by None
+        with room.lock:
+            received = room.FABRIC_TO_COTTON_RATIO is not None or any(
+                isinstance(event, WinConditionEvent) for event in room.pending_events)
+            if not received:
+                log(f'Room {name} has no win condition from a dispatcher, use the default one', '[ROOMS]')
+                room.pending_events.append(WinConditionEvent())
+
+    def run_scheduler(self):
+        # one thread ticks every room, rooms never draw
+        interval = 1 / self.fps
+        next_tick = time.perf_counter()
+        while not self.server_socket._closed:
+            with self.lock:
+                self.update_rooms()
+                rooms = list(self.rooms.items())
+            for name, room in rooms:
+                try:
+                    room.step()
+                except Exception as e:
+                    log(f'Room {name} failed: {e}', '[ROOMS]')
+                    with self.lock:
+                        if name in self.rooms:
+                            self.close_room(name)
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()
+
+    def close(self):
+        self.server_socket.close()
+        with self.lock:
+            for name in list(self.rooms):
+                self.close_room(name)
+
+
+if __name__ == "__main__":
+    RoomServer().start()
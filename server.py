@@ -5,18 +5,34 @@ import pygame
 from dotenv import load_dotenv
 from logs import log, trylog, inspect_object
 import os
-from utils import send, receive 
+from utils import BotSeat, send, send_raw, receive 
+import pickle
 import datetime, time
+import itertools
+import random
+import secrets
 import enums
 from map import Map
+from connectivity import visible_components
 
 from events import *
+from triggers import TriggerIndex
+from hazards import Hazard, HazardMasks
 
 from message import ( 
     MoveMessage, SetPlayerNameMessage, GetPlayerMessage, 
-    AllowCollectItemsMessage, RemoveInProcessMoveMessage, StillAliveMessage)
+    AllowCollectItemsMessage, RemoveInProcessMoveMessage, StillAliveMessage, JoinRoomMessage, ReattachMessage)
 
 from game_board import GameBoard
+from map_pool import MapPool
+from spectator import SpectatorPublisher
+from replay import ReplayRecorder
+from checkpoint import Checkpointer, checkpoint_map, load_checkpoint, restore
+from telemetry import TelemetryRecorder, telemetry_file
+from metrics import Metrics, MetricsServer, Watchdog
+from profiler import SamplingProfiler
+from memory import MemoryMonitor
+from spectator_web import WebSpectatorServer
 
 from enums import GameStatus, PlayerStatus
 from config import Config
@@ -24,55 +40,232 @@ import config_server
 
 
 class Server:
-    def __init__(self,  host=None, port=None, test_mode: bool= False):
+    def __init__(self,  host=None, port=None, test_mode: bool= False, headless: bool = None,
+                 spectator_port: int = None, web_port: int = None, map_seed: int = None, map_pool: str = None,
+                 metrics_port: int = None,
+                 max_players: int = None, listen: bool = True, name: str = None, simulated_clock: bool = None,
+                 player_logs: bool = True, map: Map = None, replay_path: str = None, checkpoint_path: str = None,
+                 telemetry_path: str = None):
 
         load_dotenv(override=True)
 
         self.host = host or os.environ.get('SERVER', '0.0.0.0')
         self.port = port or int(os.environ.get('PORT', 4444))
         self.test_mode = test_mode
-        log(f'Listern to {self.host}:{self.port}', '[SERVER]')
+        # headless: no pygame window, watch the match with viewer.py instead
+        self.headless = headless if headless is not None else os.environ.get('HEADLESS', '0') == '1'
+        if spectator_port is None:
+            spectator_port = int(os.environ.get('SPECTATOR_PORT') or 0)
+        if web_port is None:
+            web_port = int(os.environ.get('WEB_SPECTATOR_PORT') or 0)
+        if metrics_port is None:
+            metrics_port = int(os.environ.get('METRICS_PORT') or 0)
+        # same seed, same map: MAP_POOL loads it pre-generated instead of generating it
+        if map_seed is None and os.environ.get('MAP_SEED'):
+            map_seed = int(os.environ['MAP_SEED'])
+        map_pool = map_pool or os.environ.get('MAP_POOL')
+        self.max_players = max_players or int(os.environ.get('MAX_PLAYERS', Config.MAX_PLAYERS))
+        # rooms (rooms.py) share one listener and are handed their clients with add_client
+        self.name = name
+        # simulated clock: game time follows ticks, so pauses last the same number of ticks however fast the loop runs
+        self.simulated_clock = simulated_clock if simulated_clock is not None else os.environ.get('SIMULATED_CLOCK', '0') == '1'
+        # player_<id>_<name>.txt and winner_<name>.txt files
+        self.player_logs = player_logs
         self.fps = Config.FPS #  frame per second
+        # game time of the current tick, fixed during the tick so a replay can feed it back
+        self.tick_time = 0.0 if self.simulated_clock else datetime.datetime.now().timestamp()
         self.clients = {}  
         self.client_ping_time = {}  # store ping time for each client
+        # callbacks (player_id) notified when a player leaves the match, e.g. rooms.py frees its seat
+        self.leave_listeners = []
         self.lock = threading.Lock()
-
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(20)  # Listen for up to 20 connections
+        # phase timings and message counters, see metrics.py
+        self.metrics = Metrics()
+        # ADAPTIVE_RENDER=0 keeps drawing every tick even when ticks overrun
+        self.watchdog = Watchdog(1 / self.fps, adaptive=os.environ.get('ADAPTIVE_RENDER', '1') == '1')
+        # memory by subsystem every MEMORY_INTERVAL seconds, see memory.py; traced from here so the map is included
+        memory_interval = float(os.environ.get('MEMORY_INTERVAL') or 0) if listen else 0
+        self.memory: MemoryMonitor = MemoryMonitor(memory_interval, self.memory_gauges) if memory_interval else None
+
+        self.server_socket = None
+        if listen:
+            log(f'Listern to {self.host}:{self.port}', '[SERVER]')
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # a server restarted after a crash binds again while the old connections are in TIME_WAIT
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(20)  # Listen for up to 20 connections
 
         
         self.game_client_dispatcher = None
+        # dispatcher events wait for the next tick, so they apply at the same point of the tick in a replay
+        self.pending_events: list[Event] = []
 
         self.tick_range_should_at_home: range = None
         
         self.current_event = None
         self.start_event_at_tick = None
         self.end_event_at_tick = None
+        # reward/punishment cells of the current event, keyed by (row, col)
+        self.event_triggers: TriggerIndex = None
 
         self.WIND_N_FABRIC = None
         self.WIND_N_WOOD = None
         self.FABRIC_TO_COTTON_RATIO = None
-        self.game_board = GameBoard(self)
+        # collisions where a sword or armor was used
+        self.combat_count = 0
+
+        # checkpoints in CHECKPOINT_DIR, see checkpoint.py; one left behind by a crash is resumed
+        if checkpoint_path is None and os.environ.get('CHECKPOINT_DIR'):
+            os.makedirs(os.environ['CHECKPOINT_DIR'], exist_ok=True)
+            checkpoint_path = os.path.join(os.environ['CHECKPOINT_DIR'], f'{self.name or "match"}.checkpoint')
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint is not None:
+            map = checkpoint_map(checkpoint)
+        # a given map (e.g. a copy of a cached one) replaces the generated one
+        if map is None:
+            map = self.create_map(map_seed, map_pool)
+        self.game_board = GameBoard(self, headless=self.headless, map=map,
+                                    max_players=self.max_players)
+        # hazard masks over the authoritative map, one per active hazard type
+        self.hazards = HazardMasks(self.game_board.map)
+
+        # players of a resumed match keep a placeholder seat until their client reattaches
+        self.resumed = checkpoint is not None
+        self.detached: dict[int, BotSeat] = {}
+        if self.resumed:
+            restore(self, checkpoint)
+            for player_id in self.game_board.players:
+                self.detached[player_id] = BotSeat(player_id)
+                self.clients[self.detached[player_id]] = player_id
+            log(f'Resume match at tick {self.game_board.tick} from {checkpoint_path}, '
+                f'{len(self.detached)} players wait for their clients', '[SERVER]')
+            # the replay of a match starts with its joins, a resumed match is not recorded
+            replay_path = ''
+        self.checkpointer: Checkpointer = None
+        if checkpoint_path:
+            # CHECKPOINT_INTERVAL in seconds of game time
+            interval = int(float(os.environ.get('CHECKPOINT_INTERVAL') or 10) * self.fps)
+            self.checkpointer = Checkpointer(checkpoint_path, interval, sequence=checkpoint['sequence'] if checkpoint else 0)
+
+        # every input of the match in REPLAY_DIR, see replay.py
+        if replay_path is None and os.environ.get('REPLAY_DIR'):
+            os.makedirs(os.environ['REPLAY_DIR'], exist_ok=True)
+            replay_path = os.path.join(os.environ['REPLAY_DIR'],
+                                       f'{self.name or "match"}_{map.seed}_{int(time.time() * 1000)}.replay')
+        self.recorder: ReplayRecorder = ReplayRecorder(replay_path, self) if replay_path else None
+        # per-tick rows of every player in TELEMETRY_DIR, see telemetry.py
+        if telemetry_path is None and os.environ.get('TELEMETRY_DIR'):
+            os.makedirs(os.environ['TELEMETRY_DIR'], exist_ok=True)
+            telemetry_path = telemetry_file(os.environ['TELEMETRY_DIR'],
+                                            f'{self.name or "match"}_{map.seed}_{int(time.time() * 1000)}',
+                                            os.environ.get('TELEMETRY_FORMAT') or 'parquet')
+        self.telemetry: TelemetryRecorder = TelemetryRecorder(telemetry_path) if telemetry_path else None
+
+        # per-tick snapshots for out-of-process viewers
+        self.spectator: SpectatorPublisher = None
+        if spectator_port:
+            self.spectator = SpectatorPublisher(self.game_board.map, port=spectator_port)
+        # browser spectators: http://127.0.0.1:<WEB_SPECTATOR_PORT>/
+        self.web_spectator: WebSpectatorServer = None
+        if web_port:
+            self.web_spectator = WebSpectatorServer(port=web_port)
+        # stacks of all threads into PROFILE_DIR, started by PROFILE=1 or the P key, see profiler.py
+        self.profiler = SamplingProfiler(self.name or 'match', directory=os.environ.get('PROFILE_DIR') or 'profiles',
+                                         format=os.environ.get('PROFILE_FORMAT') or 'collapsed',
+                                         tick=lambda: self.game_board.tick)
+        # http://127.0.0.1:<METRICS_PORT>/metrics
+        self.metrics_server: MetricsServer = None
+        if metrics_port:
+            self.metrics_server = MetricsServer(port=metrics_port)
+            self.metrics_server.add_section('match', self.match_metrics)
+            self.metrics_server.add_section('ticks', self.metrics.snapshot)
+            self.metrics_server.add_section('watchdog', self.watchdog.snapshot)
+            self.metrics_server.add_section('profiler', self.profiler.snapshot)
+            if self.memory:
+                self.metrics_server.add_section('memory', self.memory.snapshot)
         
         
+    def create_map(self, seed: int = None, pool: str = None) -> Map:
+        if pool:
+            return MapPool(pool).pick(seed)
+        if seed is None:
+            # still pick a seed, so the match can be reproduced from the log
+            seed = random.randrange(1 << 31)
+        # very large maps (MAP_ROWS x MAP_COLS) should be chunked with MAP_CHUNK_SIZE
+        map = Map(int(os.environ.get('MAP_ROWS', Config.N_ROW)), int(os.environ.get('MAP_COLS', Config.N_COL)),
+                  chunk_size=int(os.environ.get('MAP_CHUNK_SIZE', Config.MAP_CHUNK_SIZE)))
+        map.random_map(seed)
+        log(f'Generate map with seed {map.seed}', '[SERVER]')
+        return map
+
     def start(self):
         # Thread to connect to client
         threading.Thread(target=self.accept_clients, daemon=True).start()
+        if self.spectator:
+            self.spectator.start()
+        if self.web_spectator:
+            self.web_spectator.start()
+        if self.metrics_server:
+            self.metrics_server.start()
+        if os.environ.get('PROFILE') == '1':
+            self.profiler.start()
+        if self.memory:
+            self.memory.start()
 
         # Start game loop
-        self.start_game_loop()
+        if self.headless:
+            self.start_headless_loop()
+        else:
+            self.start_game_loop()
     
+    def now(self) -> float:
+        """Game time in seconds of the current tick, used for pause timers."""
+        return self.tick_time
+
+    def clock(self) -> float:
+        if self.simulated_clock:
+            return self.game_board.tick / self.fps
+        return datetime.datetime.now().timestamp()
+
     def send(self, sock, obj):
+        data = pickle.dumps(obj)
         with self.lock:
-            send(sock, obj)
+            send_raw(sock, data)
+        self.metrics.count('messages_out')
+        self.metrics.count('bytes_out', len(data) + 4)
+
+    def player_for_client(self, player):
+        """The player with the component labels of the cells it has seen, the map's labels stay on the server."""
+        labels = visible_components(self.game_board.map.get_components(), player.grid)
+        return player.model_copy(update={'components': labels})
+
+    def match_metrics(self) -> dict:
+        return {
+            'name': self.name,
+            'tick': self.game_board.tick,
+            'game_status': self.game_board.game_status.value,
+            'players': len(self.game_board.players),
+            'clients': len(self.clients),
+        }
     
+    def memory_gauges(self) -> dict:
+        """Lengths of the match state that should stay bounded, for the memory monitor's leak alarm."""
+        players = list(self.game_board.players.values())
+        return {
+            'queued_moves': sum(len(player.in_process_move_messages) for player in players),
+            'board_messages': len(self.game_board.messages),
+            'pending_events': len(self.pending_events),
+        }
+
     def get_file_name(self, player):
+        if self.name:
+            return f'{self.name}_player_{player.id}_{player.name}.txt'
         return f'player_{player.id}_{player.name}.txt'
 
     def create_player_log(self, player):
+        if not self.player_logs:
+            return
         file_name = self.get_file_name(player)
         status = player.status
         tick = self.game_board.tick
@@ -82,6 +275,8 @@ class Server:
         open(file_name, 'wt').writelines(log_text)
     
     def update_player_log(self, player):
+        if not self.player_logs:
+            return
         file_name = file_name = self.get_file_name(player)
         status = player.status
         tick = self.game_board.tick
@@ -100,36 +295,112 @@ class Server:
             if self.server_socket._closed:
                 log("Server socket is closed, stopping accept_clients", "[SERVER]")
                 return
-            elif self.game_board.game_status == GameStatus.WAITING_FOR_PLAYERS:
+            elif self.game_board.game_status == GameStatus.WAITING_FOR_PLAYERS or self.awaiting_reattach():
                 try:
                     client_socket, addr = self.server_socket.accept()
                 except Exception as e:  
                     log(f"Error accepting client: {e}", "[SERVER]")
                     continue 
                 log(f"New connection from addr: {addr}, client_socket: {client_socket}", "[SERVER]")
-                if not self.game_client_dispatcher:
-                    self.game_client_dispatcher = client_socket
-                    threading.Thread(target=self.handle_client, args=(client_socket,), daemon=True).start()
-                    time.sleep(.5)
-                    self.send(client_socket, "Connected")
-
-                else:
-                    if len(self.game_board.players) < 5:
-                        player = self.game_board.create_random_player(id=len(self.game_board.players))
-
-                        self.create_player_log(player)
-                        self.clients[client_socket] = player.id
-
-                        log(f"Send init player {player} to client {addr}", "[SERVER]")
-                        #  use thread for each client to receive client message 
+                if self.resumed:
+                    threading.Thread(target=self.handshake, args=(client_socket, addr), daemon=True).start()
+                    continue
+                # the first connection is the dispatcher
+                self.add_client(client_socket, addr, 'player' if self.game_client_dispatcher else 'dispatcher')
+            else:
+                time.sleep(1 / Config.FPS)
+
+    def awaiting_reattach(self) -> bool:
+        """A resumed match accepts connections until its players reattached and its dispatcher reconnected."""
+        return self.resumed and (bool(self.detached) or not self.game_client_dispatcher)
+
+    def add_client(self, client_socket, addr, role: str = 'player') -> bool:
+        """Attach a connection as the dispatcher or as a new player, False if it was refused."""
+        if role == 'dispatcher':
+            if self.game_client_dispatcher:
+                log(f"Match already has a dispatcher, refuse client {addr}", "[SERVER]")
+                client_socket.close()
+                return False
+            self.game_client_dispatcher = client_socket
+            threading.Thread(target=self.handle_client, args=(client_socket,), daemon=True).start()
+            time.sleep(.5)
+            self.send(client_socket, "Connected")
+            return True
+
+        if len(self.game_board.players) >= self.max_players or self.game_board.game_status != GameStatus.WAITING_FOR_PLAYERS:
+            log(f"Match is full or started ({self.max_players} players), refuse client {addr}", "[SERVER]")
+            client_socket.close()
+            return False
+
+        player = self.add_player(client_socket)
+        self.create_player_log(player)
+
+        log(f"Send init player {player} to client {addr}", "[SERVER]")
+        #  use thread for each client to receive client message 
+
+        threading.Thread(target=self.handle_client, args=(client_socket,), daemon=True).start()
+        time.sleep(.5)
+        self.send(client_socket, player)
+        return True
+
+
+    def handshake(self, client_socket, addr, timeout: float = 1.0):
+        # clients of a resumed match send ReattachMessage first, a new Client sends JoinRoomMessage
+        # and the dispatcher sends nothing (or JoinRoomMessage with the dispatcher role)
+        client_socket.settimeout(timeout)
+        message = receive(client_socket)
+        client_socket.settimeout(None)
+        if isinstance(message, ReattachMessage):
+            self.reattach(client_socket, addr, message)
+        elif message is None or isinstance(message, JoinRoomMessage) and message.role == 'dispatcher':
+            self.add_client(client_socket, addr, 'dispatcher')
+        elif self.game_board.game_status == GameStatus.WAITING_FOR_PLAYERS:
+            self.add_client(client_socket, addr, 'player')
+        else:
+            log(f'Refuse client {addr}, a resumed match only takes its own players back', '[SERVER]')
+            client_socket.close()
 
-                        threading.Thread(target=self.handle_client, args=(client_socket,), daemon=True).start()
-                        time.sleep(.5)
-                        self.send(client_socket, player)
-                    else:
-                        log(f"Send init player {player} to client {addr}", "[SERVER]")
+    def reattach(self, client_socket, addr, message: ReattachMessage) -> bool:
+        """Hand a player of a resumed match back to its client, False if it was refused."""
+        with self.lock:
+            player = self.game_board.players.get(message.player_id)
+            seat = self.detached.get(message.player_id)
+            if seat is None or player is None or message.token != player.token:
+                log(f'Refuse to reattach client {addr} to player {message.player_id}', '[SERVER]')
+                client_socket.close()
+                return False
+            del self.detached[player.id]
+            del self.clients[seat]
+            self.clients[client_socket] = player.id
+
+        log(f'Client {addr} reattached to player {player.id}', '[SERVER]')
+        threading.Thread(target=self.handle_client, args=(client_socket,), daemon=True).start()
+        self.send(client_socket, player)
+        return True
+
+    def add_player(self, seat):
+        """New player at the next free home, `seat` is its socket or an in-process stand-in."""
+        # a player who left before the start frees its id and home
+        player_id = next(i for i in itertools.count() if i not in self.game_board.players)
+        player = self.game_board.create_random_player(id=player_id)
+        player.token = secrets.token_hex(8)
+        self.clients[seat] = player.id
+        if self.recorder:
+            self.recorder.join(self.game_board.tick, player.id)
+        return player
+
+    def remove_player(self, player_id):
+        """Take a player off the board, a player leaving before the start also leaves its home."""
+        player = self.game_board.players.pop(player_id, None)
+        if player is None:
+            return None
+        if self.recorder:
+            self.recorder.leave(self.game_board.tick, player_id)
+        map = self.game_board.map
+        if self.game_board.game_status == GameStatus.WAITING_FOR_PLAYERS and map.get_value(player.row, player.col) == f'{player_id}':
+            map.set_value(player.row, player.col, 'g')
+        return player
 
-    
     def move_player(self,player, dir):
         has_move = False
         r, c = player.row, player.col
@@ -173,13 +444,16 @@ class Server:
             self.game_board.map.set_value(other_player.row, other_player.col, 'g')
             other_player.row, other_player.col = other_player.home_row, other_player.home_col
             other_player.status = PlayerStatus.PAUSED
-            other_player.paused_duration = 30
-            other_player.paused_time = datetime.datetime.now().timestamp()
+            other_player.paused_duration = Config.PAUSED_TIME
+            other_player.paused_time = self.now()
+        else:
+            return
+        self.combat_count += 1
             
 
     def handle_collision_at_position(self, player, row, col):
         # Retrieve the grid element at the given position
-        grid_element = player.grid[row][col]
+        grid_element = player.grid[row, col]
 
         # Check if the element is numeric (indicating another player)
         if grid_element.isnumeric():
@@ -208,11 +482,11 @@ class Server:
             self.handle_collision_at_position(player, player.row, player.col+1)
         
     def update_player(self, player, dir=None):
-        player.last_updated = datetime.datetime.now().timestamp()
+        player.last_updated = self.now()
         if player.status == PlayerStatus.PAUSED:
             log(f'Player {player.name} is paused and cannot move', '[SERVER]')
             # if player.paused_time + Config.PAUSED_TIME < datetime.datetime.now().timestamp():
-            if player.paused_time + player.paused_duration < datetime.datetime.now().timestamp():
+            if player.paused_time + player.paused_duration < self.now():
                 player.status = PlayerStatus.PLAYING
                 player.row, player.col = player.home_row, player.home_col
                 self.game_board.map.set_value(player.row, player.col, player.id)
@@ -225,6 +499,8 @@ class Server:
         elif len(player.in_process_move_messages) > 0:
             message = player.in_process_move_messages.pop(0)
             if isinstance(message, MoveMessage):
+                if self.recorder:
+                    self.recorder.move(self.game_board.tick, player.id, message.dir)
                 if player.status == PlayerStatus.PLAYING:
                     dir = message.dir
                     self.move_player(player, dir)
@@ -238,7 +514,8 @@ class Server:
         self._check_win_condition(player)
 
         self.game_board.map.set_value(player.row, player.col, player.id)
-        self.update_player_log(player)
+        with self.metrics.phase('player_log'):
+            self.update_player_log(player)
         
 
     def convert_wood_cotton_to_fabric(self, player):
@@ -254,6 +531,8 @@ class Server:
                                 
     def _collect_items(self, player):
         with self.lock:
+            if self.recorder:
+                self.recorder.allow(self.game_board.tick, player.id, player.allow_collect_items)
             # Collect items
             self.game_board.map.collect_items(player)
 
@@ -279,7 +558,8 @@ class Server:
         if fa >= self.WIND_N_FABRIC and w >= self.WIND_N_WOOD:
             player.status = PlayerStatus.WIN
             log(f'Player {player.name} win the game', '[SERVER]')
-            open(f'winner_{player.name}.txt', 'a').write(f'{player.name} won the game in {self.game_board.tick / Config.FPS}s\n')
+            if self.player_logs:
+                open(f'winner_{player.name}.txt', 'a').write(f'{player.name} won the game in {self.game_board.tick / Config.FPS}s\n')
 
     def process_events(self):
         if self.current_event is None:
@@ -288,124 +568,138 @@ class Server:
         if isinstance(self.current_event, FireEvent) or self.current_event ==FireEvent:
             if self.game_board.tick >= self.end_event_at_tick:
                 log(f'Fire event ended at tick {self.game_board.tick}', '[SERVER]')
-                self.current_event = None
-                self.start_event_at_tick = None
-                self.end_event_at_tick = None
-                self.game_board.messages = []
+                self.end_event()
                 return
             
             self.game_board.message_tick_remaining= self.end_event_at_tick - self.game_board.tick
             
+            # built once per fire, then kept in sync with the map by the hazard registry
+            if self.hazards.get('fire') is None:
+                self.hazards.add(Hazard('fire', source_items={'w'}, trigger_items={'w'},
+                                         paused_duration=round(Config.PAUSED_TIME * Config.FIRE_PAUSED_FACTOR)))
+
             log(f'Process fire event at tick {self.game_board.tick}', '[SERVER]')
+            hazards = self.hazards.active()
             for _, player_id in self.clients.items():
                 player = self.game_board.players[player_id]
-                map = Map.from_player(player)
-                items = map.get_neighbor_values(player.row, player.col, player.allow_collect_items)
-                if 'w' in items:
-                    log(f'Player {player.name} is on fire, remove wood', '[SERVER]')
-                    player.items_on_hand = []
-                    self.game_board.map.set_value(player.row, player.col, 'g')
-                    player.row = player.home_row
-                    player.col = player.home_col
-                    player.status = PlayerStatus.PAUSED
-                    player.paused_time = datetime.datetime.now().timestamp()
-                    player.paused_duration = 45
+                for hazard in hazards:
+                    if hazard.hits(player):
+                        log(f'Player {player.name} is on {hazard.name}, remove items on hand', '[SERVER]')
+                        player.items_on_hand = []
+                        self.game_board.map.set_value(player.row, player.col, 'g')
+                        player.row = player.home_row
+                        player.col = player.home_col
+                        player.status = PlayerStatus.PAUSED
+                        player.paused_time = self.now()
+                        player.paused_duration = hazard.paused_duration
+                        break
 
         elif isinstance(self.current_event, RewardPunishmentEvent):
             if self.game_board.tick >= self.end_event_at_tick:
                 log(f'Diamond event ended at tick {self.game_board.tick}', '[SERVER]')
-                self.current_event = None
-                self.start_event_at_tick = None
-                self.end_event_at_tick = None
-                self.game_board.messages = []
+                self.end_event()
                 return
             
             self.game_board.message_tick_remaining= self.end_event_at_tick - self.game_board.tick
-            event_at_rows = self.current_event.event_at_rows
-            event_at_cols = self.current_event.event_at_cols
+            self.event_triggers.expire(self.game_board.tick)
             
             log(f'Process diamond event at tick {self.game_board.tick}', '[SERVER]')
             for _, player_id in self.clients.items():
                 player = self.game_board.players[player_id]
                 
-                if player.row in event_at_rows and player.col in event_at_cols:
-                    log(f'Player {player.name} collected diamond at ({player.row}, {player.col})', '[SERVER]')
-
-                    player_row = player.row
-                    player_col = player.col
-                    # add or remove diamond from player
-                    num_cottons = abs(self.current_event.cotton)
-                    num_woods = abs(self.current_event.wood)
-
-                    if self.current_event.cotton > 0 :
-                        for _ in range(num_cottons):
-                            player.store.append('c')
-                        for _ in range(num_woods):
-                            player.store.append('w')
-                    elif self.current_event.cotton < 0:
-                        for _ in range(num_cottons):
-                            if 'c' in player.store:
-                                player.store.remove('c')
-                        for _ in range(num_woods):
-                            if 'w' in player.store:
-                                player.store.remove('w')
-                        player.items_on_hand = []
+                player_row = player.row
+                player_col = player.col
+                if not self.event_triggers.fire(player.id, player_row, player_col, self.game_board.tick):
+                    continue
 
-                        # die 
-                        player.row = player.home_row
-                        player.col = player.home_col
-                        player.status = PlayerStatus.PAUSED
-                        player.paused_time = datetime.datetime.now().timestamp()
-                        player.paused_duration = 30
-                        self.game_board.map.set_value(player_row, player_col, 'g')
-                    
-                    # stop event
-                    if len(self.current_event.event_at_rows) >0:
-                        self.current_event.event_at_rows.remove(player_row)
-                        self.current_event.event_at_cols.remove(player_col)
-                        if len(self.current_event.event_at_rows) == 0:
-                            log(f'All players collected diamond, end event at tick {self.game_board.tick}', '[SERVER]')
-                            self.current_event = None
-                            self.start_event_at_tick = None
-                            self.end_event_at_tick = None
-                            self.game_board.messages = []
+                log(f'Player {player.name} collected diamond at ({player_row}, {player_col})', '[SERVER]')
+
+                # add or remove diamond from player
+                num_cottons = abs(self.current_event.cotton)
+                num_woods = abs(self.current_event.wood)
+
+                if self.current_event.cotton > 0 :
+                    for _ in range(num_cottons):
+                        player.store.append('c')
+                    for _ in range(num_woods):
+                        player.store.append('w')
+                elif self.current_event.cotton < 0:
+                    for _ in range(num_cottons):
+                        if 'c' in player.store:
+                            player.store.remove('c')
+                    for _ in range(num_woods):
+                        if 'w' in player.store:
+                            player.store.remove('w')
+                    player.items_on_hand = []
+
+                    # die 
+                    player.row = player.home_row
+                    player.col = player.home_col
+                    player.status = PlayerStatus.PAUSED
+                    player.paused_time = self.now()
+                    player.paused_duration = Config.PAUSED_TIME
+                    self.game_board.map.set_value(player_row, player_col, 'g')
+
+            # stop event
+            if len(self.event_triggers) == 0:
+                log(f'All players collected diamond, end event at tick {self.game_board.tick}', '[SERVER]')
+                self.end_event()
+
+    def end_event(self):
+        self.current_event = None
+        self.start_event_at_tick = None
+        self.end_event_at_tick = None
+        self.event_triggers = None
+        self.hazards.clear()
+        self.game_board.messages = []
                     
                 
     def depatcher_process(self, client_socket):
         while True:
             client_message = receive(client_socket)
             if client_message is None:
+                if client_socket.fileno() == -1:
+                    return
                 time.sleep(1/Config.FPS)
                 continue
-
-            if isinstance(client_message, WinConditionEvent):
-                log(f'Broadcast WinConditionEvent message to all players', '[SERVER]')
-                self.current_event = client_message
-                
-                self.WIND_N_FABRIC = self.current_event.fabric
-                self.WIND_N_WOOD = self.current_event.wood
-                self.FABRIC_TO_COTTON_RATIO = self.current_event.fabric_to_cotton_ratio
-                for player_id in self.game_board.players:
-                    self.game_board.messages.append(client_message.message)
-                    self.game_board.players[player_id].message = client_message.message
-
-            elif isinstance(client_message, Event):
-                self.start_event_at_tick = self.game_board.tick
-                self.end_event_at_tick = self.start_event_at_tick + client_message.duration 
-                self.current_event = client_message
-                self.game_board.messages = [client_message.message]
-                
-                log(f'Fire event started at tick {self.start_event_at_tick}, end at {self.end_event_at_tick}', '[SERVER]')
-                
-                log(f'Revceive from dispatcher: {client_message}', '[SERVER]')
+            # other messages (room handshake, pings) carry nothing for the match
+            self.metrics.count('dispatcher_messages_in')
+            if isinstance(client_message, Event):
+                with self.lock:
+                    self.pending_events.append(client_message)
+
+    def handle_dispatcher_event(self, client_message: Event):
+        """Apply an event sent by the dispatcher, also used to replay event timelines without sockets."""
+        if self.recorder:
+            self.recorder.event(self.game_board.tick, client_message)
+        if isinstance(client_message, WinConditionEvent):
+            log(f'Broadcast WinConditionEvent message to all players', '[SERVER]')
+            self.current_event = client_message
             
-           
-            log(f'Broadcast message to all players')
+            self.WIND_N_FABRIC = self.current_event.fabric
+            self.WIND_N_WOOD = self.current_event.wood
+            self.FABRIC_TO_COTTON_RATIO = self.current_event.fabric_to_cotton_ratio
             for player_id in self.game_board.players:
                 self.game_board.messages.append(client_message.message)
                 self.game_board.players[player_id].message = client_message.message
+
+        elif isinstance(client_message, Event):
+            self.start_event_at_tick = self.game_board.tick
+            self.end_event_at_tick = self.start_event_at_tick + client_message.duration 
+            if isinstance(client_message, RewardPunishmentEvent):
+                self.event_triggers = TriggerIndex.from_event(client_message, self.start_event_at_tick)
+            self.current_event = client_message
+            self.game_board.messages = [client_message.message]
             
-            # self.broadcast_message_start_game()
+            log(f'Fire event started at tick {self.start_event_at_tick}, end at {self.end_event_at_tick}', '[SERVER]')
+            
+            log(f'Revceive from dispatcher: {client_message}', '[SERVER]')
+        
+           
+        log(f'Broadcast message to all players')
+        for player_id in self.game_board.players:
+            self.game_board.messages.append(client_message.message)
+            self.game_board.players[player_id].message = client_message.message
  
     def client_process(self, client_socket):
         
@@ -423,11 +717,18 @@ class Server:
                     continue
 
                 client_message = receive(client_socket)
+                if client_message is None and self.game_board.game_status == GameStatus.WAITING_FOR_PLAYERS:
+                    # left before the start, the seat is free for another client
+                    log(f'Client {player_id} left before the start', '[SERVER]')
+                    break
                 if client_message is None:
                     if player.status != PlayerStatus.DISCONNECTED:
                         player.status = PlayerStatus.DISCONNECTED
+                        if self.recorder:
+                            self.recorder.status(self.game_board.tick, player_id, player.status)
                         log(f'Client {player_id} disconnected', '[SERVER]')
-                    
+                else:
+                    self.metrics.count('messages_in')
 
                 if isinstance(client_message, StillAliveMessage):
                     self.client_ping_time[client_socket] = datetime.datetime.now().timestamp()
@@ -441,19 +742,19 @@ class Server:
                 if isinstance(client_message, SetPlayerNameMessage):
                     if self.game_board.game_status == GameStatus.WAITING_FOR_PLAYERS:
                         player.name = client_message.player_name
-                        player.last_updated = datetime.datetime.now().timestamp()
+                        player.last_updated = self.now()
                         log(f'Player {player_id} set name to {player.name}', '[SERVER]')
                         self.create_player_log(player)
                     continue
 
                 if isinstance(client_message, AllowCollectItemsMessage):
-                    player.last_updated = datetime.datetime.now().timestamp()
+                    player.last_updated = self.now()
                     player.allow_collect_items = client_message.items
                     self.send(client_socket, player.allow_collect_items)
                     continue
 
                 if isinstance(client_message, GetPlayerMessage):
-                    self.send(client_socket, player)
+                    self.send(client_socket, self.player_for_client(player))
                     continue
 
                 # Process messages by time tick
@@ -473,11 +774,13 @@ class Server:
 
         finally:
             with self.lock:
-                if player_id in self.game_board.players:
-                    del self.game_board.players[player_id]
+                removed = self.remove_player(player_id)
                 if client_socket in self.clients:
                     del self.clients[client_socket]
             client_socket.close()
+            if removed is not None:
+                for listener in self.leave_listeners:
+                    listener(player_id)
             if self.game_board.current_player_index >= len(self.game_board.players):
                 self.game_board.current_player_index = -1
 
@@ -512,6 +815,8 @@ class Server:
         if event.key == pygame.K_UP: dir = 2
         if event.key == pygame.K_DOWN: dir = 3
         
+        if self.recorder:
+            self.recorder.update(self.game_board.tick, player.id, dir)
         self.update_player(player, dir)
 
     def update(self):
@@ -519,65 +824,153 @@ class Server:
             if player.status != PlayerStatus.WIN:
                 self.update_player(player)
 
+    def start_game(self):
+        # change to start game
+        self.game_board.game_status = GameStatus.PLAYING
+        self.game_board.tick =0
+        if self.recorder:
+            self.recorder.start(self.game_board.tick)
+        # notify all players
+        self.update_status_all_players(PlayerStatus.PLAYING)
+
+    def handle_spectator_commands(self):
+        if not self.spectator:
+            return
+        for command in self.spectator.pending_commands():
+            if command == 'start' and self.game_board.game_status == GameStatus.WAITING_FOR_PLAYERS:
+                log('Start game requested by spectator', '[SERVER]')
+                self.start_game()
+
+    def step(self, now: float = None):
+        """Run one simulation tick, at game time `now` when replaying."""
+        started = time.perf_counter()
+        metrics = self.metrics
+        self.tick_time = now if now is not None else self.clock()
+        with metrics.phase('events'):
+            if self.pending_events:
+                with self.lock:
+                    events, self.pending_events = self.pending_events, []
+                for event in events:
+                    self.handle_dispatcher_event(event)
+            self.process_events()
+
+        if self.game_board.game_status == GameStatus.PLAYING:
+            # Update game state
+            with metrics.phase('update'):
+                self.update()
+            if self.game_board.tick /Config.FPS >= Config.GAME_DURATION:
+                self.game_board.game_status = GameStatus.FINISHED
+                log(f'Game FINISHED', '[SERVER]')
+
+        with metrics.phase('record'):
+            if self.recorder:
+                self.recorder.tick(self.game_board.tick, self.tick_time)
+            if self.telemetry and self.game_board.game_status == GameStatus.PLAYING:
+                self.telemetry.record(self)
+            self.game_board.advance_tick()
+            if self.recorder:
+                self.recorder.frame(self)
+            if self.checkpointer:
+                self.checkpointer.maybe_save(self)
+
+        with metrics.phase('publish'):
+            if self.spectator:
+                self.spectator.publish(self)
+            if self.web_spectator:
+                self.web_spectator.publish(self)
+        metrics.end_tick(time.perf_counter() - started)
+
+    def close(self):
+        for client_socket in list(self.clients.keys()):
+            client_socket.close()
+            log(f'Client {client_socket} disconnected', '[SERVER]')
+        if self.game_client_dispatcher:
+            self.game_client_dispatcher.close()
+        if self.server_socket:
+            self.server_socket.close()
+        if self.spectator:
+            self.spectator.close()
+        if self.web_spectator:
+            self.web_spectator.close()
+        if self.metrics_server:
+            self.metrics_server.close()
+        self.profiler.stop()
+        if self.memory:
+            self.memory.stop()
+        if self.recorder:
+            self.recorder.close(self)
+        if self.checkpointer:
+            self.checkpointer.close()
+        if self.telemetry:
+            self.telemetry.close()
+        log('Close server', '[SERVER]')
+
+    def start_headless_loop(self):
+        # the dashboard runs in a separate viewer process (viewer.py), if any
+        interval = 1 / self.fps
+        next_tick = time.perf_counter()
+        while not self.server_socket._closed:
+            self.handle_spectator_commands()
+            started = time.perf_counter()
+            self.step()
+            self.watchdog.check(self.game_board.tick, time.perf_counter() - started)
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # fell behind, do not try to catch up with a burst of ticks
+                next_tick = time.perf_counter()
+
     def start_game_loop(self):    
         clock = pygame.time.Clock()
         while True:
             events = pygame.event.get()
 
-            self.process_events()
+            self.handle_spectator_commands()
 
             # Process events
             for event in events:
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     return
+                if event.type in (pygame.VIDEORESIZE, pygame.WINDOWEXPOSED):
+                    self.game_board.invalidate()
                 if event.type == pygame.KEYDOWN:
                     
                     # START GAME
                     if event.key == pygame.K_s:
-                        # change to start game
-                        self.game_board.game_status = GameStatus.PLAYING
-                        self.game_board.tick =0
-                        # notify all players
-                        self.update_status_all_players(PlayerStatus.PLAYING)
+                        self.start_game()
                     elif event.key == pygame.K_EQUALS: #pygame.K_RIGHT:
-                        self.game_board.current_player_index +=1
-                        if self.game_board.current_player_index >= len(self.game_board.players):
-                            self.game_board.current_player_index = -1
+                        self.game_board.cycle_view(1)
                     elif event.key == pygame.K_MINUS: #pygame.K_LEFT:
-                        self.game_board.current_player_index -=1
-                        if self.game_board.current_player_index <-1:
-                            self.game_board.current_player_index = len(self.game_board.players) -1
+                        self.game_board.cycle_view(-1)
+                    elif event.key == pygame.K_v:
+                        self.game_board.toggle_player_views()
+                    elif event.key == pygame.K_p:
+                        self.profiler.toggle()
 
                     elif event.key == pygame.K_ESCAPE:
-                        for client_socket in list(self.clients.keys()):
-                            client_socket.close()
-                            log(f'Client {client_socket} disconnected', '[SERVER]')
-                        self.server_socket.close()
-                        log('Close server', '[SERVER]')
-
+                        self.close()
                         pygame.quit()
                         return
                     elif self.test_mode:
                         # allow move player in test mode
                         self.test_mode_play(event)
             
-            
-
-            if self.game_board.game_status == GameStatus.PLAYING:
-                # Update game state
-                self.update()
-                if self.game_board.tick /Config.FPS >= Config.GAME_DURATION:
-                    self.game_board.game_status = GameStatus.FINISHED
-                    log(f'Game FINISHED', '[SERVER]')
-
-            # Draw the game board
-            self.game_board.draw()
-
-            pygame.display.flip()
+            started = time.perf_counter()
+            self.step()
+
+            # Draw the game board, only the changed regions are pushed to the display;
+            # the watchdog skips frames while ticks overrun
+            if self.watchdog.should_render(self.game_board.tick):
+                drawn = time.perf_counter()
+                pygame.display.update(self.game_board.draw())
+                self.metrics.observe('draw', time.perf_counter() - drawn)
+            self.watchdog.check(self.game_board.tick, time.perf_counter() - started)
             clock.tick(self.fps)
 
                  
 if __name__ == "__main__":
     server = Server(test_mode=True)
-    server.start()
\ No newline at end of file
+    server.start()
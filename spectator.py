@@ -0,0 +1,176 @@
+import pickle
+import queue
+import socket
+import threading
+import time
+
+from logs import log
+from utils import send_raw, receive
+from message import SpectatorCommandMessage
+
+
+# the map and the players' fog-of-war grids are only sent in keyframes, in between
+# snapshots carry the changed map cells and viewers rebuild the fog grids
+KEYFRAME_INTERVAL = 20
+
+PLAYER_FIELDS = (
+    'id', 'name', 'status', 'home_row', 'home_col', 'row', 'col', 'store', 'items_on_hand',
+    'armor', 'sword', 'paused_time', 'paused_duration', 'allow_collect_items', 'map_w', 'map_h',
+)
+
+
+def player_data(player, keyframe: bool = False) -> dict:
+    data = {name: getattr(player, name) for name in PLAYER_FIELDS}
+    data['store'] = list(player.store)
+    data['items_on_hand'] = list(player.items_on_hand)
+    if keyframe:
+        data['grid'] = player.grid.copy()
+    return data
+
+
+def build_snapshot(server, keyframe: bool = False, cells: dict = None) -> dict:
+    """Compact copy of the state a dashboard needs to draw one tick: the full map in keyframes, else `cells`."""
+    game_board = server.game_board
+    snapshot = {
+        'tick': game_board.tick,
+        'time': time.time(),
+        'now': server.now(),
+        'fps': server.fps,
+        'keyframe': keyframe,
+        'game_status': game_board.game_status,
+        'players': [player_data(player, keyframe) for player in list(game_board.players.values())],
+        'current_event': server.current_event,
+        'event_cells': list(server.event_triggers.positions()) if server.event_triggers else [],
+        'messages': list(game_board.messages),
+        'message_tick_remaining': game_board.message_tick_remaining,
+    }
+    if keyframe:
+        snapshot['grid'] = game_board.map.grid.copy()
+    else:
+        snapshot['cells'] = cells or {}
+    return snapshot
+
+
+class SpectatorPublisher:
+    """
+    Publishes per-tick snapshots to viewer processes over a local socket.
+
+    Each snapshot is pickled once and fanned out. Every viewer has its own
+    small queue and sender thread: a slow viewer only drops frames and never
+    blocks the tick. Viewers may attach and detach at any time.
+    """
+
+    def __init__(self, map, host: str = '127.0.0.1', port: int = 4445, max_queue: int = 2):
+        self.host = host
+        self.port = port
+        self.max_queue = max_queue
+        self.viewers: dict[socket.socket, queue.Queue] = {}
+        self.commands: queue.Queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.ticks_since_keyframe = KEYFRAME_INTERVAL
+        self.pending_keyframe = False
+        self.frames = 0
+        # map cells changed since the last snapshot
+        self.cells: dict[tuple[int, int], str] = {}
+        map.listeners.append(self.on_cell_changed)
+
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(5)
+        log(f'Spectator snapshots on {self.host}:{self.port}', '[SPECTATOR]')
+
+    def start(self):
+        threading.Thread(target=self.accept_viewers, daemon=True).start()
+
+    def accept_viewers(self):
+        while True:
+            try:
+                viewer_socket, addr = self.server_socket.accept()
+            except OSError:
+                return
+            log(f'Viewer attached from {addr}', '[SPECTATOR]')
+            viewer_queue = queue.Queue(maxsize=self.max_queue)
+            with self.lock:
+                self.viewers[viewer_socket] = viewer_queue
+                # new viewers need the fog-of-war grids
+                self.pending_keyframe = True
+            threading.Thread(target=self.send_to_viewer, args=(viewer_socket, viewer_queue), daemon=True).start()
+            threading.Thread(target=self.receive_from_viewer, args=(viewer_socket,), daemon=True).start()
+
+    def wants_keyframe(self) -> bool:
+        return self.pending_keyframe or self.ticks_since_keyframe >= KEYFRAME_INTERVAL
+
+    def on_cell_changed(self, row, col, old, new):
+        self.cells[(row, col)] = str(new)
+
+    def publish(self, server):
+        cells, self.cells = self.cells, {}
+        if not self.viewers:
+            return
+        keyframe = self.wants_keyframe()
+        snapshot = build_snapshot(server, keyframe, cells)
+        # viewers apply a delta only on top of the frame right before it
+        snapshot['frame'] = self.frames
+        self.frames += 1
+        payload = pickle.dumps(snapshot)
+        if keyframe:
+            self.ticks_since_keyframe = 0
+            self.pending_keyframe = False
+        else:
+            self.ticks_since_keyframe += 1
+
+        with self.lock:
+            viewers = list(self.viewers.items())
+        for viewer_socket, viewer_queue in viewers:
+            if viewer_queue.full():
+                # drop the oldest frame, the viewer waits for the keyframe that follows
+                try:
+                    viewer_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self.pending_keyframe = True
+            viewer_queue.put_nowait(payload)
+
+    def send_to_viewer(self, viewer_socket, viewer_queue):
+        try:
+            while viewer_socket in self.viewers:
+                try:
+                    payload = viewer_queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+                send_raw(viewer_socket, payload)
+        except OSError:
+            pass
+        finally:
+            self.detach(viewer_socket)
+
+    def receive_from_viewer(self, viewer_socket):
+        while viewer_socket in self.viewers:
+            message = receive(viewer_socket)
+            if message is None:
+                break
+            if isinstance(message, SpectatorCommandMessage):
+                self.commands.put(message.command)
+        self.detach(viewer_socket)
+
+    def detach(self, viewer_socket):
+        with self.lock:
+            if self.viewers.pop(viewer_socket, None) is None:
+                return
+        log('Viewer detached', '[SPECTATOR]')
+        try:
+            viewer_socket.close()
+        except OSError:
+            pass
+
+    def pending_commands(self) -> list[str]:
+        commands = []
+        while not self.commands.empty():
+            commands.append(self.commands.get_nowait())
+        return commands
+
+    def close(self):
+        for viewer_socket in list(self.viewers):
+            self.detach(viewer_socket)
+        self.server_socket.close()
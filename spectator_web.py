@@ -0,0 +1,292 @@
+import base64
+import hashlib
+import json
+import queue
+import socket
+import struct
+import threading
+import zlib
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from logs import log
+from chunked_map import changed_cells
+
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class WebViewer:
+    def __init__(self, sock: socket.socket, view: int, max_queue: int):
+        self.sock = sock
+        self.view = view
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        # late joiners and viewers that dropped deltas restart from a keyframe
+        self.needs_keyframe = True
+        self.closed = False
+        self.send_lock = threading.Lock()
+
+    def send(self, frame: bytes):
+        with self.send_lock:
+            self.sock.sendall(frame)
+
+    def offer(self, payload: bytes):
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            # backpressure: forget the queued deltas, resync with a keyframe
+            while not self.queue.empty():
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.needs_keyframe = True
+
+
+class WebSpectatorServer:
+    """
+    Local HTTP + WebSocket endpoint to watch a match from a browser.
+
+    Every tick the map/player delta of each watched view is serialized and
+    compressed once, then fanned out to all browsers on that view. Views use
+    the same selection as GameBoard.current_player_index: -1 is the full map,
+    a player id is that player's fog-of-war view.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8080, max_queue: int = 8):
+        self.host = host
+        self.port = port
+        self.max_queue = max_queue
+        self.viewers: list[WebViewer] = []
+        self.lock = threading.Lock()
+        # last grid sent for each view, deltas are computed against it
+        self.last_grids: dict[int, np.ndarray] = {}
+        self.page = (Path(__file__).parent / 'spectator_web.html').read_bytes()
+
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(20)
+        log(f'Web spectator on http://{self.host}:{self.port}/', '[WEB]')
+
+    def start(self):
+        threading.Thread(target=self.accept_connections, daemon=True).start()
+
+    def close(self):
+        self.server_socket.close()
+        for viewer in list(self.viewers):
+            self.detach(viewer)
+
+    # HTTP
+
+    def accept_connections(self):
+        while True:
+            try:
+                sock, _ = self.server_socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle_connection, args=(sock,), daemon=True).start()
+
+    def handle_connection(self, sock: socket.socket):
+        try:
+            request = b''
+            while b'\r\n\r\n' not in request:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    sock.close()
+                    return
+                request += chunk
+            lines = request.split(b'\r\n\r\n')[0].decode('latin-1').split('\r\n')
+            method, target, _ = lines[0].split(' ', 2)
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            url = urlparse(target)
+            if url.path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                view = int(parse_qs(url.query).get('view', ['-1'])[0])
+                self.accept_websocket(sock, headers, view)
+            elif method == 'GET' and url.path == '/':
+                self.send_http(sock, '200 OK', 'text/html; charset=utf-8', self.page)
+            elif method == 'GET' and url.path.startswith('/img/'):
+                self.send_image(sock, url.path)
+            else:
+                self.send_http(sock, '404 Not Found', 'text/plain', b'not found')
+        except (OSError, ValueError) as e:
+            log(f'Web spectator request failed: {e}', '[WEB]')
+            sock.close()
+
+    def send_http(self, sock, status: str, content_type: str, body: bytes):
+        head = f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'
+        sock.sendall(head.encode() + body)
+        sock.close()
+
+    def send_image(self, sock, path: str):
+        root = (Path(__file__).parent / 'img').resolve()
+        file = (Path(__file__).parent / path.lstrip('/')).resolve()
+        if root not in file.parents or not file.is_file():
+            self.send_http(sock, '404 Not Found', 'text/plain', b'not found')
+            return
+        self.send_http(sock, '200 OK', 'image/png', file.read_bytes())
+
+    # WebSocket
+
+    def accept_websocket(self, sock, headers, view: int):
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest())
+        sock.sendall(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        viewer = WebViewer(sock, view, self.max_queue)
+        with self.lock:
+            self.viewers.append(viewer)
+        log(f'Web viewer attached on view {view}', '[WEB]')
+        threading.Thread(target=self.send_to_viewer, args=(viewer,), daemon=True).start()
+        self.receive_from_viewer(viewer)
+
+    def send_to_viewer(self, viewer: WebViewer):
+        try:
+            while not viewer.closed:
+                try:
+                    payload = viewer.queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+                viewer.send(self.frame(payload))
+        except OSError:
+            pass
+        self.detach(viewer)
+
+    def receive_from_viewer(self, viewer: WebViewer):
+        try:
+            while not viewer.closed:
+                opcode, data = self.read_frame(viewer.sock)
+                if opcode == 0x8 or opcode is None:
+                    break
+                if opcode == 0x9:
+                    viewer.send(self.frame(data, opcode=0xA))
+                elif opcode == 0x1:
+                    message = json.loads(data.decode())
+                    if 'view' in message:
+                        viewer.view = int(message['view'])
+                        viewer.needs_keyframe = True
+        except (OSError, ValueError):
+            pass
+        self.detach(viewer)
+
+    def detach(self, viewer: WebViewer):
+        with self.lock:
+            if viewer.closed:
+                return
+            viewer.closed = True
+            self.viewers.remove(viewer)
+        log('Web viewer detached', '[WEB]')
+        try:
+            viewer.sock.close()
+        except OSError:
+            pass
+
+    @staticmethod
+    def frame(payload: bytes, opcode: int = 0x2) -> bytes:
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        return header + payload
+
+    @staticmethod
+    def read_exact(sock, n: int) -> bytes:
+        data = b''
+        while len(data) < n:
+            chunk = sock.recv(n - len(data))
+            if not chunk:
+                raise OSError('connection closed')
+            data += chunk
+        return data
+
+    def read_frame(self, sock):
+        first, second = self.read_exact(sock, 2)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self.read_exact(sock, 2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self.read_exact(sock, 8))[0]
+        mask = self.read_exact(sock, 4) if second & 0x80 else b'\0\0\0\0'
+        data = self.read_exact(sock, length)
+        return opcode, bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+
+    # Tick publishing
+
+    def view_state(self, server, view: int):
+        game_board = server.game_board
+        player = game_board.view_player(view)
+        grid = game_board.view_map(view).grid
+        event_cells = list(server.event_triggers.positions()) if server.event_triggers else []
+        fire = game_board.fire_active()
+        if player is None:
+            players = list(game_board.players.values())
+            window = None
+        else:
+            players = [player]
+            window = [player.row - game_board.OPEN_CELL//2, player.row + game_board.OPEN_CELL//2,
+                      player.col - game_board.OPEN_CELL//2, player.col + game_board.OPEN_CELL//2]
+        meta = {
+            'tick': game_board.tick,
+            'fps': server.fps,
+            'status': game_board.game_status.name,
+            'view': view if player is not None else -1,
+            'window': window,
+            'players': [
+                {'id': p.id, 'name': p.name, 'row': p.row, 'col': p.col, 'home': [p.home_row, p.home_col],
+                 'status': p.status.value, 'store': p.store, 'hand': p.items_on_hand,
+                 'armor': p.armor, 'sword': p.sword}
+                for p in players],
+            'player_ids': sorted(game_board.players),
+            'events': event_cells,
+            # drawn on the event cells every other tick, like GameBoard.cell_images
+            'icon': getattr(server.current_event, 'icon_name', '') if event_cells else '',
+            'fire': fire,
+            'message': game_board.messages[-1] if game_board.messages else '',
+        }
+        return grid, meta
+
+    @staticmethod
+    def encode(message: dict) -> bytes:
+        return zlib.compress(json.dumps(message, separators=(',', ':')).encode())
+
+    def publish(self, server):
+        with self.lock:
+            viewers = list(self.viewers)
+        if not viewers:
+            self.last_grids = {}
+            return
+
+        views = {viewer.view for viewer in viewers}
+        deltas, keyframes = {}, {}
+        for view in views:
+            grid, meta = self.view_state(server, view)
+            last = self.last_grids.get(view)
+            self.last_grids[view] = grid.copy()
+            if any(viewer.needs_keyframe for viewer in viewers if viewer.view == view) or last is None:
+                keyframes[view] = self.encode({**meta, 'type': 'keyframe', 'grid': grid.tolist()})
+            if last is not None and last.shape == grid.shape:
+                changed = changed_cells(last, grid)
+                deltas[view] = self.encode({**meta, 'type': 'delta', 'cells': [
+                    [int(r), int(c), str(grid[r, c])] for r, c in changed]})
+        # views no longer watched restart from a keyframe
+        for view in list(self.last_grids):
+            if view not in views:
+                del self.last_grids[view]
+
+        for viewer in viewers:
+            if viewer.needs_keyframe:
+                # the view may have changed while the frames were built, wait for the next tick
+                if viewer.view in keyframes:
+                    viewer.needs_keyframe = False
+                    viewer.offer(keyframes[viewer.view])
+            elif viewer.view in deltas:
+                viewer.offer(deltas[viewer.view])
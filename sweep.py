@@ -0,0 +1,124 @@
+# sweep.py
+# Config balancing: seeded headless matches for every combination of a parameter grid.
+#   python sweep.py --grid '{"MAP_NUMBER_WOOD": [1, 2, 3], "PAUSED_TIME": [15, 30]}' --seeds 0-9 --out sweep.csv
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from bots import BOTS
+from config import Config
+from events import FireEvent, WinConditionEvent
+from logs import log, set_quiet
+from map import Map
+from tournament import HeadlessMatch, parse_seeds
+
+# Config values a map is generated from: matches differing only in other values share their maps
+MAP_KEYS = ['N_ROW', 'N_COL', 'MAP_NUMBER_FOOT', 'MAP_NUMBER_WOOD', 'MAP_NUMBER_COTTON',
+            'MAP_NUMBER_AMOR', 'MAP_NUMBER_SWORD']
+
+# generated maps of this worker process, by seed and map config
+maps: dict[tuple, Map] = {}
+
+
+def combinations(grid: dict[str, list]) -> list[dict]:
+    for key in grid:
+        if not hasattr(Config, key):
+            raise KeyError(f'Config has no {key}')
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def apply_config(overrides: dict):
+    # workers are reused, every task of a sweep sets the same keys so nothing leaks between tasks
+    for key, value in overrides.items():
+        setattr(Config, key, value)
+
+
+def timeline():
+    """The default timeline, with the win condition taken from Config."""
+    return [
+        (0, WinConditionEvent(wood=Config.WIND_N_WOOD, fabric=Config.WIND_N_FABRIC)),
+        (600, FireEvent(duration=120)),
+    ]
+
+
+def cached_map(seed: int) -> Map:
+    key = (seed,) + tuple(getattr(Config, name) for name in MAP_KEYS)
+    if key not in maps:
+        map = Map(Config.N_ROW, Config.N_COL)
+        map.random_map(seed)
+        maps[key] = map
+    return maps[key].copy()
+
+
+def play(overrides: dict, seed: int, bot_names: list[str], max_ticks: int = None) -> dict:
+    """Worker entry point: one match under the given Config values, summarized as one row."""
+    apply_config(overrides)
+    bots = [BOTS[name](seed=seed * 1000 + i) for i, name in enumerate(bot_names)]
+    rows = HeadlessMatch(bots, seed, timeline(), max_ticks=max_ticks, map=cached_map(seed)).run()
+
+    ticks = rows[0]['ticks']
+    win_ticks = [row['win_tick'] for row in rows if row['win_tick'] is not None]
+    ratio = WinConditionEvent().fabric_to_cotton_ratio
+    # resources brought home, fabric counted as the cotton it was made of
+    items = sum(row['food'] + row['wood'] + row['cotton'] + row['fabric'] * ratio for row in rows)
+    minutes = ticks / Config.FPS / 60
+    return {
+        **overrides,
+        'seed': seed,
+        'ticks': ticks,
+        'winners': len(win_ticks),
+        'ticks_to_win': sum(win_ticks) / len(win_ticks) if win_ticks else None,
+        'first_win_tick': min(win_ticks) if win_ticks else None,
+        'items_per_minute': items / minutes / len(rows) if minutes else 0.0,
+        'combats': rows[0]['combats'],
+        'score': sum(row['score'] for row in rows) / len(rows),
+    }
+
+
+def run_sweep(grid: dict[str, list], seeds, bot_names: list[str], max_ticks: int = None,
+              workers: int = None) -> pd.DataFrame:
+    """One row per (combination, seed), played on a process pool whose workers keep their maps."""
+    workers = workers or os.cpu_count() or 1
+    seeds = list(seeds)
+    tasks = [(overrides, seed) for seed in seeds for overrides in combinations(grid)]
+    log(f'Play {len(tasks)} matches on {workers} workers', '[SWEEP]')
+    # chunks hold the combinations of one seed, so a worker generates the seed's map once per map config
+    chunksize = max(1, len(tasks) // max(len(seeds), 1))
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_quiet) as pool:
+        rows = list(pool.map(play, [overrides for overrides, _ in tasks], [seed for _, seed in tasks],
+                             itertools.repeat(bot_names), itertools.repeat(max_ticks), chunksize=chunksize))
+    return pd.DataFrame(rows)
+
+
+def summarize(matches: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    return (matches.groupby(keys)
+            .agg(matches=('seed', 'count'), winners=('winners', 'mean'), ticks_to_win=('ticks_to_win', 'mean'),
+                 first_win_tick=('first_win_tick', 'mean'), items_per_minute=('items_per_minute', 'mean'),
+                 combats=('combats', 'mean'), score=('score', 'mean'))
+            .reset_index())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run headless matches for every combination of Config values')
+    parser.add_argument('--grid', required=True, help='JSON object of Config name to list of values')
+    parser.add_argument('--bots', default='greedy,greedy,greedy,random,random')
+    parser.add_argument('--seeds', default='0-9', help='map seeds played for each combination: 0-99 or 1,5,7')
+    parser.add_argument('--max-ticks', type=int, default=None, help='default: the full game duration')
+    parser.add_argument('--workers', type=int, default=None, help='default: the number of CPUs')
+    parser.add_argument('--out', default='sweep.csv', help='aggregate per combination')
+    parser.add_argument('--matches', default=None, help='also write one row per match to this CSV')
+    args = parser.parse_args()
+
+    grid = json.loads(args.grid)
+    matches = run_sweep(grid, parse_seeds(args.seeds), args.bots.split(','), args.max_ticks, args.workers)
+    if args.matches:
+        matches.to_csv(args.matches, index=False)
+    summary = summarize(matches, list(grid))
+    summary.to_csv(args.out, index=False)
+    log(f'Wrote {len(summary)} combinations to {args.out}', '[SWEEP]')
+    print(summary.to_string(index=False))
@@ -0,0 +1,165 @@
+# telemetry.py
+# Per-tick, per-player rows of a match in a columnar file for post-match analysis.
+#   TELEMETRY_DIR=telemetry python server.py
+#   python telemetry.py telemetry/match_7_1700000000000.parquet
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from enums import PlayerStatus
+from events import FireEvent, RewardPunishmentEvent, WinConditionEvent
+from logs import log
+
+COLUMNS = {
+    'tick': np.int32,
+    'time': np.float64,
+    'player': np.int16,
+    'row': np.int16,
+    'col': np.int16,
+    'status': np.int8,
+    'food': np.int16,
+    'wood': np.int16,
+    'cotton': np.int16,
+    'fabric': np.int16,
+    'hand_food': np.int8,
+    'hand_wood': np.int8,
+    'hand_cotton': np.int8,
+    'armor': np.int8,
+    'sword': np.int8,
+    'event': np.int8,
+    # on a cell of the current event: burning wood during a fire, a reward/punishment cell
+    'exposed': np.bool_,
+}
+STATUSES = [status.value for status in PlayerStatus]
+STATUS_CODES = {status: i for i, status in enumerate(PlayerStatus)}
+EVENT_NAMES = ['none', 'win_condition', 'fire', 'reward_punishment']
+EVENT_CODES = {WinConditionEvent: 1, FireEvent: 2, RewardPunishmentEvent: 3}
+BATCH_ROWS = 4096
+# parquet, or csv to read the rows without pyarrow (slower to load, types are restored by load_telemetry)
+FORMATS = ('parquet', 'csv')
+
+
+def telemetry_file(directory: str, name: str, format: str = 'parquet') -> str:
+    if format not in FORMATS:
+        raise ValueError(f'Unknown telemetry format {format}, expected one of {", ".join(FORMATS)}')
+    return os.path.join(directory, f'{name}.{format}')
+
+
+class TelemetryRecorder:
+    """
+    Accumulates one row per player and tick in preallocated column arrays.
+    A full batch is written as one Parquet row group (appended to the file
+    instead when the path ends with .csv), status and event are stored as
+    categories.
+    """
+
+    def __init__(self, path: str, batch_rows: int = BATCH_ROWS):
+        self.path = path
+        self.columns = {name: np.zeros(batch_rows, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.capacity = batch_rows
+        self.size = 0
+        self.rows = 0
+        self.writer = None
+        log(f'Record telemetry to {path}', '[TELEMETRY]')
+
+    def record(self, server):
+        board = server.game_board
+        event = EVENT_CODES.get(type(server.current_event), 0)
+        hazards = server.hazards.active()
+        triggers = server.event_triggers.cells if server.event_triggers else {}
+        tick, now = board.tick, server.now()
+        c = self.columns
+        for player in list(board.players.values()):
+            if self.size == self.capacity:
+                self.flush()
+            i = self.size
+            store, hand = player.store, player.items_on_hand
+            c['tick'][i] = tick
+            c['time'][i] = now
+            c['player'][i] = player.id
+            c['row'][i] = player.row
+            c['col'][i] = player.col
+            c['status'][i] = STATUS_CODES[player.status]
+            c['food'][i] = store.count('r')
+            c['wood'][i] = store.count('w')
+            c['cotton'][i] = store.count('c')
+            c['fabric'][i] = store.count('fa')
+            c['hand_food'][i] = 'r' in hand
+            c['hand_wood'][i] = 'w' in hand
+            c['hand_cotton'][i] = 'c' in hand
+            c['armor'][i] = player.armor
+            c['sword'][i] = player.sword
+            c['event'][i] = event
+            c['exposed'][i] = (player.row, player.col) in triggers or any(hazard.hits(player) for hazard in hazards)
+            self.size += 1
+
+    def frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame({name: values[:self.size].copy() for name, values in self.columns.items()})
+        frame['status'] = pd.Categorical.from_codes(frame['status'], categories=STATUSES)
+        frame['event'] = pd.Categorical.from_codes(frame['event'], categories=EVENT_NAMES)
+        return frame
+
+    def flush(self):
+        if not self.size:
+            return
+        frame = self.frame()
+        if not self.path.endswith('.csv'):
+            # imported here so the server starts without pyarrow while telemetry is off
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+        self.rows += self.size
+        self.size = 0
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        log(f'Wrote {self.rows} telemetry rows to {self.path}', '[TELEMETRY]')
+
+
+def load_telemetry(path: str) -> pd.DataFrame:
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    dtypes = {name: dtype for name, dtype in COLUMNS.items() if name not in ('status', 'event')}
+    frame = pd.read_csv(path, dtype=dtypes)
+    frame['status'] = pd.Categorical(frame['status'], categories=STATUSES)
+    frame['event'] = pd.Categorical(frame['event'], categories=EVENT_NAMES)
+    return frame
+
+
+def summarize(frame: pd.DataFrame) -> pd.DataFrame:
+    """Per player: ticks played, cells moved, ticks paused and exposed, and the final store."""
+    frame = frame.sort_values(['player', 'tick'])
+    moved = (frame.groupby('player')['row'].diff().abs() + frame.groupby('player')['col'].diff().abs()).fillna(0)
+    last = frame.groupby('player').last()
+    return pd.DataFrame({
+        'ticks': frame.groupby('player').size(),
+        'moved': moved.groupby(frame['player']).sum().astype(int),
+        'paused': (frame['status'] == PlayerStatus.PAUSED.value).groupby(frame['player']).sum(),
+        'exposed': frame.groupby('player')['exposed'].sum(),
+        'status': last['status'],
+        'food': last['food'],
+        'wood': last['wood'],
+        'cotton': last['cotton'],
+        'fabric': last['fabric'],
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarize the telemetry of a match')
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    frame = load_telemetry(args.path)
+    log(f'{len(frame)} rows, ticks {frame["tick"].min()}-{frame["tick"].max()}', '[TELEMETRY]')
+    print(summarize(frame).to_string())
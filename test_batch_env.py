@@ -0,0 +1,95 @@
+import sys
+import os
+import random
+
+import numpy as np
+
+# Ensure the root directory is in the Python path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from batch_env import BatchEnv, ITEMS, STATUS, STORE_ITEMS, decode
+from bots import GreedyBot, RandomBot
+from env import GameEnv
+from events import WinConditionEvent
+from logs import set_quiet
+
+SEEDS = [0, 1, 2, 3]
+N_PLAYERS = 5
+TICKS = 600
+
+
+def reference_envs(seeds, n_players):
+    """One GameEnv per seed, with the win condition set and weapons handed out instead of lying on the map."""
+    rng = random.Random(0)
+    envs = []
+    for seed in seeds:
+        env = GameEnv(n_players, timeline=[])
+        env.reset(seed)
+        env.server.handle_dispatcher_event(WinConditionEvent())
+        # weapons respawn at random cells, the batch uses its own generator for that
+        grid = env.server.game_board.map.grid
+        grid[np.isin(grid, ['a', 's'])] = 'g'
+        for player in env.players:
+            player.grid[np.isin(player.grid, ['a', 's'])] = 'g'
+            player.armor = rng.randint(0, 1)
+            player.sword = rng.randint(0, 1)
+        envs.append(env)
+    return envs
+
+
+def assert_same_state(batch, envs):
+    for i, env in enumerate(envs):
+        assert (decode(batch.grid[i]) == env.server.game_board.map.grid).all(), f'map of game {i}'
+        for p, player in enumerate(env.players):
+            where = f'game {i} player {p} tick {batch.tick}'
+            assert (batch.row[i, p], batch.col[i, p]) == (player.row, player.col), where
+            assert batch.status[i, p] == STATUS[player.status], where
+            assert (decode(batch.fog[i, p]) == player.grid).all(), where
+            assert list(batch.store[i, p]) == [player.store.count(item) for item in STORE_ITEMS], where
+            assert list(batch.hand[i, p]) == [item in player.items_on_hand for item in ITEMS], where
+            assert (batch.armor[i, p], batch.sword[i, p]) == (player.armor, player.sword), where
+
+
+def test_reset_matches_server():
+    batch = BatchEnv(len(SEEDS), N_PLAYERS)
+    batch.reset(SEEDS)
+    envs = []
+    for seed in SEEDS:
+        env = GameEnv(N_PLAYERS, timeline=[])
+        env.reset(seed)
+        envs.append(env)
+    assert_same_state(batch, envs)
+
+
+def test_step_matches_server():
+    envs = reference_envs(SEEDS, N_PLAYERS)
+    batch = BatchEnv(len(SEEDS), N_PLAYERS)
+    batch.load([env.server for env in envs])
+    assert_same_state(batch, envs)
+
+    # greedy bots store, convert and win, random bots wander into collisions
+    bots = [[GreedyBot(seed * 10 + p) if p % 2 == 0 else RandomBot(seed * 10 + p) for p in range(N_PLAYERS)]
+            for seed in SEEDS]
+    for _ in range(TICKS):
+        actions = np.full((len(SEEDS), N_PLAYERS), -1)
+        for i, env in enumerate(envs):
+            for p, player in enumerate(env.players):
+                if player.status.value == 'playing':
+                    dir = bots[i][p].act(player, env.server)
+                    actions[i, p] = -1 if dir is None else dir
+        collect = np.array([[[item in player.allow_collect_items for item in ITEMS] for player in env.players]
+                            for env in envs])
+        _, rewards, _, _ = batch.step(actions, collect)
+        for i, env in enumerate(envs):
+            _, env_rewards, _, _ = env.step([None if dir < 0 else int(dir) for dir in actions[i]])
+            assert list(rewards[i]) == env_rewards
+        assert_same_state(batch, envs)
+    wins = sum(len(env.win_ticks) for env in envs)
+    assert wins > 0
+
+
+if __name__ == "__main__":
+    set_quiet()
+    test_reset_matches_server()
+    test_step_matches_server()
+    print('BatchEnv matches the server')
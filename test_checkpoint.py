@@ -0,0 +1,72 @@
+import sys
+import os
+import random
+import tempfile
+
+import numpy as np
+
+# Ensure the root directory is in the Python path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from checkpoint import capture
+from logs import set_quiet
+from message import MoveMessage
+from server import Server
+from utils import BotSeat
+
+N_PLAYERS = 3
+TICKS = 300
+
+
+def headless_server(path, **kwargs) -> Server:
+    return Server(listen=False, headless=True, spectator_port=0, web_port=0, metrics_port=0, simulated_clock=True,
+                  player_logs=False, replay_path='', checkpoint_path=path, **kwargs)
+
+
+def crash(server):
+    """Writes a last checkpoint of the current state and stops the writer without removing the file."""
+    server.checkpointer.states.put(capture(server))
+    server.checkpointer.close(remove=False)
+
+
+def test_resume_from_checkpoint():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'match.checkpoint')
+        server = headless_server(path, map_seed=5)
+        for i in range(N_PLAYERS):
+            server.add_player(BotSeat(i))
+        server.start_game()
+        rng = random.Random(1)
+        for _ in range(TICKS):
+            for player in server.game_board.players.values():
+                player.in_process_move_messages = [MoveMessage(dir=rng.randrange(4))]
+            server.step()
+        assert server.game_board.tick == TICKS
+        crash(server)
+
+        resumed = headless_server(path)
+        board, expected = resumed.game_board, server.game_board
+        assert resumed.resumed
+        assert sorted(resumed.detached) == sorted(expected.players)
+        assert board.tick == expected.tick
+        assert board.game_status == expected.game_status
+        assert (np.asarray(board.map.grid) == np.asarray(expected.map.grid)).all()
+        for player_id, player in expected.players.items():
+            restored = board.players[player_id]
+            assert (restored.row, restored.col) == (player.row, player.col), f'player {player_id}'
+            assert restored.store == player.store, f'player {player_id}'
+            assert restored.items_on_hand == player.items_on_hand, f'player {player_id}'
+            assert restored.status == player.status, f'player {player_id}'
+            assert restored.token == player.token, f'player {player_id}'
+
+        # the resumed match goes on, closing it removes the checkpoint
+        resumed.step()
+        assert board.tick == expected.tick + 1
+        resumed.close()
+        assert not os.path.exists(path)
+
+
+if __name__ == "__main__":
+    set_quiet()
+    test_resume_from_checkpoint()
+    print('A resumed server continues from its checkpoint')
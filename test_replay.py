@@ -0,0 +1,42 @@
+import sys
+import os
+import tempfile
+
+# Ensure the root directory is in the Python path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from bots import BOTS
+from logs import set_quiet
+from replay import replay
+from tournament import HeadlessMatch
+
+BOT_NAMES = ['greedy', 'greedy', 'greedy', 'random', 'random']
+SEEDS = [3, 8]
+TICKS = 1500
+
+
+def record(directory, seed):
+    """Plays a seeded match between bots and records it, returns the replay file and the result rows."""
+    path = os.path.join(directory, f'match_{seed}.replay')
+    bots = [BOTS[name](seed=seed * 1000 + i) for i, name in enumerate(BOT_NAMES)]
+    rows = HeadlessMatch(bots, seed, max_ticks=TICKS, replay_path=path).run()
+    return path, rows
+
+
+def test_replay_matches_record():
+    with tempfile.TemporaryDirectory() as directory:
+        for seed in SEEDS:
+            path, rows = record(directory, seed)
+            server, matched = replay(path)
+            assert matched, f'digest of seed {seed}'
+            assert server.game_board.tick == rows[0]['ticks'], f'ticks of seed {seed}'
+            players = server.game_board.players
+            for row in rows:
+                assert ','.join(sorted(players[row['player']].store)) == row['store'], f'store of seed {seed}'
+            server.close()
+
+
+if __name__ == "__main__":
+    set_quiet()
+    test_replay_matches_record()
+    print('Replays match their records')
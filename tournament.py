@@ -0,0 +1,130 @@
+# tournament.py
+# Many full matches between scripted bots, one headless match per worker process.
+#   python tournament.py --bots greedy,greedy,random,random,greedy --seeds 0-99 --out results.csv
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from bots import BOTS
+from enums import PlayerStatus
+from env import GameEnv, score
+from events import Event
+from logs import log, set_quiet
+
+
+class HeadlessMatch:
+    """One match between bots on a GameEnv: each bot picks its player's move every tick."""
+
+    def __init__(self, bots: list, seed: int = None, timeline: list[tuple[int, Event]] = None,
+                 map_pool: str = None, max_ticks: int = None, map=None, replay_path: str = None):
+        self.bots = bots
+        self.seed = seed
+        self.map = map
+        self.replay_path = replay_path
+        self.env = GameEnv(len(bots), timeline, map_pool, max_ticks)
+
+    def run(self) -> list[dict]:
+        self.env.reset(self.seed, self.map, self.replay_path)
+        started = time.perf_counter()
+        done = False
+        while not done:
+            actions = [bot.act(player, self.env.server) if player.status == PlayerStatus.PLAYING else None
+                       for bot, player in zip(self.bots, self.env.players)]
+            _, _, done, _ = self.env.step(actions)
+        elapsed = time.perf_counter() - started
+        rows = self.results(elapsed)
+        self.env.close()
+        return rows
+
+    def results(self, elapsed: float = 0.0) -> list[dict]:
+        win_ticks = self.env.win_ticks
+        ranks = {player_id: rank for rank, player_id in enumerate(sorted(win_ticks, key=win_ticks.get), start=1)}
+        combats = self.env.server.combat_count
+        rows = []
+        for bot, player in zip(self.bots, self.env.players):
+            rows.append({
+                'seed': self.seed,
+                'player': player.id,
+                'bot': type(bot).__name__,
+                'status': player.status.value,
+                'win_tick': win_ticks.get(player.id),
+                'finish_rank': ranks.get(player.id),
+                'store': ','.join(sorted(player.store)),
+                'food': player.store.count('r'),
+                'wood': player.store.count('w'),
+                'cotton': player.store.count('c'),
+                'fabric': player.store.count('fa'),
+                'score': score(player, ranks.get(player.id)),
+                'ticks': self.env.tick,
+                'combats': combats,
+                'seconds': round(elapsed, 3),
+            })
+        return rows
+
+
+def play_match(bot_names: list[str], seed: int, timeline=None, map_pool: str = None,
+               max_ticks: int = None) -> list[dict]:
+    """Worker entry point: plays one match, returns one result row per player."""
+    bots = [BOTS[name](seed=None if seed is None else seed * 1000 + i) for i, name in enumerate(bot_names)]
+    return HeadlessMatch(bots, seed, timeline, map_pool, max_ticks).run()
+
+
+def run_tournament(bot_names: list[str], seeds, timeline=None, map_pool: str = None,
+                   max_ticks: int = None, workers: int = None, rotate: bool = True) -> pd.DataFrame:
+    """
+    Plays one match per seed on a process pool and returns every player's result.
+
+    With `rotate`, the seating of the bots shifts by one each match, so no bot
+    keeps the same home (and the same distance to resources) over the tournament.
+    """
+    workers = workers or os.cpu_count() or 1
+    seeds = list(seeds)
+    lineups = []
+    for i, _ in enumerate(seeds):
+        shift = i % len(bot_names) if rotate else 0
+        lineups.append(bot_names[shift:] + bot_names[:shift])
+    log(f'Play {len(seeds)} matches of {len(bot_names)} bots on {workers} workers', '[TOURNAMENT]')
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_quiet) as pool:
+        for match in pool.map(play_match, lineups, seeds, itertools.repeat(timeline),
+                              itertools.repeat(map_pool), itertools.repeat(max_ticks)):
+            rows += match
+    return pd.DataFrame(rows)
+
+
+def leaderboard(results: pd.DataFrame) -> pd.DataFrame:
+    return (results.groupby('bot')
+            .agg(matches=('seed', 'count'), wins=('win_tick', 'count'), mean_score=('score', 'mean'),
+                 mean_win_tick=('win_tick', 'mean'))
+            .sort_values('mean_score', ascending=False))
+
+
+def parse_seeds(text: str) -> list[int]:
+    """'0-99' or '1,5,7'."""
+    if '-' in text:
+        first, last = text.split('-', 1)
+        return list(range(int(first), int(last) + 1))
+    return [int(seed) for seed in text.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run headless matches between bots')
+    parser.add_argument('--bots', default='greedy,greedy,greedy,random,random',
+                        help=f'comma separated, one per player: {", ".join(BOTS)}')
+    parser.add_argument('--seeds', default='0-19', help='map seeds, one match each: 0-99 or 1,5,7')
+    parser.add_argument('--max-ticks', type=int, default=None, help='default: the full game duration')
+    parser.add_argument('--workers', type=int, default=None, help='default: the number of CPUs')
+    parser.add_argument('--map-pool', default=os.environ.get('MAP_POOL'))
+    parser.add_argument('--out', default='tournament.csv')
+    args = parser.parse_args()
+
+    results = run_tournament(args.bots.split(','), parse_seeds(args.seeds), map_pool=args.map_pool,
+                             max_ticks=args.max_ticks, workers=args.workers)
+    results.to_csv(args.out, index=False)
+    log(f'Wrote {len(results)} results to {args.out}', '[TOURNAMENT]')
+    print(leaderboard(results).to_string())
@@ -0,0 +1,99 @@
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+
+@dataclass
+class Trigger:
+    row: int
+    col: int
+    # remaining uses, None = unlimited
+    uses: Optional[int] = 1
+    # each player can fire this trigger at most once
+    per_player: bool = False
+    # trigger disappears at this tick, None = lives until the event ends
+    expires_at_tick: Optional[int] = None
+    fired_by: set[int] = field(default_factory=set)
+
+    def is_expired(self, tick: int) -> bool:
+        return self.expires_at_tick is not None and tick >= self.expires_at_tick
+
+    def can_fire(self, player_id: int, tick: int) -> bool:
+        if self.is_expired(tick):
+            return False
+        if self.uses is not None and self.uses <= 0:
+            return False
+        if self.per_player and player_id in self.fired_by:
+            return False
+        return True
+
+
+class TriggerIndex:
+    """
+    Event trigger cells indexed by exact (row, col).
+
+    Looking up a player position is a single dict access, so checking all
+    players costs O(players) per tick regardless of the number of cells.
+    """
+
+    def __init__(self):
+        self.cells: dict[tuple[int, int], Trigger] = {}
+        self.next_expiry: Optional[int] = None
+
+    @staticmethod
+    def from_event(event, start_tick: int) -> 'TriggerIndex':
+        index = TriggerIndex()
+        expires_at_tick = None
+        if getattr(event, 'trigger_duration', None):
+            expires_at_tick = start_tick + event.trigger_duration
+        for row, col in zip(event.event_at_rows, event.event_at_cols):
+            index.add(row, col,
+                      uses=getattr(event, 'uses', 1),
+                      per_player=getattr(event, 'per_player', False),
+                      expires_at_tick=expires_at_tick)
+        return index
+
+    def add(self, row: int, col: int, uses: Optional[int] = 1, per_player: bool = False,
+            expires_at_tick: Optional[int] = None) -> Trigger:
+        trigger = Trigger(row, col, uses, per_player, expires_at_tick)
+        self.cells[(row, col)] = trigger
+        if expires_at_tick is not None and (self.next_expiry is None or expires_at_tick < self.next_expiry):
+            self.next_expiry = expires_at_tick
+        return trigger
+
+    def remove(self, row: int, col: int):
+        self.cells.pop((row, col), None)
+
+    def get(self, row: int, col: int) -> Optional[Trigger]:
+        return self.cells.get((row, col))
+
+    def fire(self, player_id: int, row: int, col: int, tick: int) -> Optional[Trigger]:
+        """Return the trigger at (row, col) if the player fires it, consuming one use."""
+        trigger = self.cells.get((row, col))
+        if trigger is None or not trigger.can_fire(player_id, tick):
+            return None
+        trigger.fired_by.add(player_id)
+        if trigger.uses is not None:
+            trigger.uses -= 1
+            if trigger.uses <= 0:
+                del self.cells[(row, col)]
+        return trigger
+
+    def expire(self, tick: int) -> int:
+        # only scan the cells when the earliest expiry has been reached
+        if self.next_expiry is None or tick < self.next_expiry:
+            return 0
+        expired = [key for key, trigger in self.cells.items() if trigger.is_expired(tick)]
+        for key in expired:
+            del self.cells[key]
+        pending = [t.expires_at_tick for t in self.cells.values() if t.expires_at_tick is not None]
+        self.next_expiry = min(pending) if pending else None
+        return len(expired)
+
+    def positions(self) -> Iterator[tuple[int, int]]:
+        return iter(list(self.cells.keys()))
+
+    def __contains__(self, position) -> bool:
+        return position in self.cells
+
+    def __len__(self) -> int:
+        return len(self.cells)
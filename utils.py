@@ -2,11 +2,17 @@ import pickle
 import struct
 import pygame
 import socket
+from functools import lru_cache
 
 def send(sock, data):
     if sock._closed:
         return
-    data = pickle.dumps(data)
+    send_raw(sock, pickle.dumps(data))
+
+def send_raw(sock, data: bytes):
+    """Send an already pickled object, so one payload can be sent to many sockets."""
+    if sock._closed:
+        return
     length = struct.pack('!I', len(data))  # (4 byte)
     sock.sendall(length)                   # 
     sock.sendall(data)  # 
@@ -31,6 +37,18 @@ def receive(sock):
     except:
         return None
 
+class BotSeat:
+    """Stands in for a client socket in server.clients, an in-process player needs no connection."""
+
+    def __init__(self, player_id):
+        self.player_id = player_id
+
+    def fileno(self):
+        return -1
+
+    def close(self):
+        pass
+
 def load_image(image_path,  width=None, height=None):
     """Displays an image at the given position and size using Pygame."""
     # Load the image
@@ -46,8 +64,20 @@ def display_image(screen, image, x, y):
     screen.blit(image, (x, y))
 
 
+@lru_cache(maxsize=None)
+def get_font(name, size, bold=False):
+    """Font registry: SysFont scans the system fonts, so each font is created once."""
+    return pygame.font.SysFont(name, size, bold=bold)
+
+
+@lru_cache(maxsize=1024)
+def render_text(font, text, color, antialias=True):
+    """Rendered text surfaces keyed by (font, text, color). Callers must not draw on the result."""
+    return font.render(text, antialias, color)
+
+
 def draw_text(screen, x, y, text, color, bg_color, font, padding=10, draw_box=True):
-    text_surface = font.render(text, True, color)
+    text_surface = render_text(font, text, tuple(color))
     text_rect = text_surface.get_rect()
     
     # Add padding to the background box
@@ -67,7 +97,7 @@ def draw_energy(screen, text, energine: int = 0, energine_max: int = 10,
     
     box = draw_text(screen, x + spacing, y-2*spacing, 
                     text, color, bg_color, 
-                    pygame.font.SysFont('', font_size, bold=False), spacing,
+                    get_font('', font_size, bold=False), spacing,
                     False )
     x += box.width + spacing
     for i in range(energine):
@@ -0,0 +1,306 @@
+# viewer.py
+# Spectator dashboard running in its own process, fed by the server's snapshots.
+#   SPECTATOR_PORT=4445 HEADLESS=1 python server.py
+#   SPECTATOR_PORT=4445 python viewer.py
+#   python viewer.py --replay replays/match_7_1700000000000.replay
+import argparse
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+import pygame
+from dotenv import load_dotenv
+
+from logs import log
+from utils import send, receive
+from game_board import GameBoard
+from map import CELL_DTYPE
+from player import Player
+from triggers import TriggerIndex
+from message import SpectatorCommandMessage
+from enums import GameStatus
+from replay import ReplayReader, load_map
+
+
+class SpectatorState:
+    """Stands in for the Server: the attributes GameBoard reads while drawing."""
+
+    def __init__(self):
+        self.current_event = None
+        self.event_triggers: TriggerIndex = None
+        self.fps = 1
+        self.game_time = 0
+
+    def now(self):
+        return self.game_time
+
+
+class Viewer:
+    def __init__(self, host=None, port=None, fps: int = None):
+        load_dotenv(override=True)
+        self.host = host or os.environ.get('SPECTATOR_HOST', '127.0.0.1')
+        self.port = port or int(os.environ.get('SPECTATOR_PORT', 4445))
+        self.fps = fps or int(os.environ.get('VIEWER_FPS', 30))
+
+        self.state = SpectatorState()
+        self.game_board = GameBoard(self.state)
+        pygame.display.set_caption("Spectator Dashboard")
+
+        self.lock = threading.Lock()
+        # snapshots received since the last drawn frame, deltas need all of them
+        self.snapshots = []
+        self.snapshot_received_at = 0
+        self.previous_positions = {}
+
+        log(f'Attach to server snapshots at {self.host}:{self.port}', '[VIEWER]')
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.connect((self.host, self.port))
+        threading.Thread(target=self.receive_snapshots, daemon=True).start()
+
+    def receive_snapshots(self):
+        frame = None
+        while True:
+            snapshot = receive(self.socket)
+            if snapshot is None:
+                log('Server closed the snapshot stream', '[VIEWER]')
+                return
+            if snapshot['keyframe']:
+                frame = snapshot['frame']
+                with self.lock:
+                    self.snapshots = [snapshot]
+            elif frame is not None and snapshot['frame'] == frame + 1:
+                frame += 1
+                with self.lock:
+                    self.snapshots.append(snapshot)
+            else:
+                # a frame was dropped, the server follows up with a keyframe
+                frame = None
+
+    def apply_snapshot(self, snapshot):
+        game_board = self.game_board
+        self.previous_positions = {id: (p.row, p.col) for id, p in game_board.players.items()}
+        self.snapshot_received_at = time.perf_counter()
+
+        game_board.tick = snapshot['tick']
+        game_board.game_status = snapshot['game_status']
+        game_board.messages = snapshot['messages']
+        game_board.message_tick_remaining = snapshot['message_tick_remaining']
+        self.state.fps = snapshot['fps']
+        self.state.game_time = snapshot['now']
+        self.state.current_event = snapshot['current_event']
+        self.state.event_triggers = None
+        if snapshot['event_cells']:
+            self.state.event_triggers = TriggerIndex()
+            for row, col in snapshot['event_cells']:
+                self.state.event_triggers.add(row, col)
+
+        # only changed cells go through set_value, so only they are marked dirty
+        if 'grid' in snapshot:
+            grid = snapshot['grid']
+            cells = {(row, col): grid[row, col] for row, col in np.argwhere(game_board.map.grid != grid)}
+        else:
+            cells = snapshot['cells']
+        for (row, col), value in cells.items():
+            game_board.map.set_value(row, col, value)
+
+        seen = set()
+        for data in snapshot['players']:
+            seen.add(data['id'])
+            fields = {k: v for k, v in data.items() if k != 'grid'}
+            player = game_board.players.get(data['id'])
+            if player is None:
+                grid = data.get('grid')
+                if grid is None:
+                    grid = np.full((game_board.n_row, game_board.n_col), '-1', dtype=CELL_DTYPE)
+                player = Player(grid=grid, **fields)
+                game_board.players[player.id] = player
+            else:
+                for name, value in fields.items():
+                    setattr(player, name, value)
+                if 'grid' in data:
+                    player.grid = data['grid']
+                    if game_board.current_player_index == player.id:
+                        game_board.invalidate()
+            # between keyframes fog-of-war grids are rebuilt from the authoritative map
+            game_board.update_nearby_map_area(player)
+
+        for id in list(game_board.players):
+            if id not in seen:
+                del game_board.players[id]
+
+    def interpolate(self):
+        # players glide between the previous and the latest tick positions
+        alpha = min((time.perf_counter() - self.snapshot_received_at) * self.state.fps, 1.0)
+        positions = {}
+        for id, player in self.game_board.players.items():
+            previous = self.previous_positions.get(id)
+            if previous is None or abs(previous[0] - player.row) + abs(previous[1] - player.col) != 1:
+                continue
+            positions[id] = (previous[0] + (player.row - previous[0]) * alpha,
+                             previous[1] + (player.col - previous[1]) * alpha)
+        self.game_board.sprite_positions = positions
+
+    def handle_events(self) -> bool:
+        game_board = self.game_board
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+            if event.type in (pygame.VIDEORESIZE, pygame.WINDOWEXPOSED):
+                game_board.invalidate()
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    return False
+                if event.key == pygame.K_s and game_board.game_status == GameStatus.WAITING_FOR_PLAYERS:
+                    send(self.socket, SpectatorCommandMessage(command='start'))
+                elif event.key == pygame.K_EQUALS:
+                    game_board.cycle_view(1)
+                elif event.key == pygame.K_MINUS:
+                    game_board.cycle_view(-1)
+                elif event.key == pygame.K_v:
+                    game_board.toggle_player_views()
+        return True
+
+    def run(self):
+        clock = pygame.time.Clock()
+        while self.handle_events():
+            with self.lock:
+                snapshots, self.snapshots = self.snapshots, []
+            for snapshot in snapshots:
+                self.apply_snapshot(snapshot)
+            self.interpolate()
+            pygame.display.update(self.game_board.draw())
+            clock.tick(self.fps)
+
+        # detaching does not affect the match
+        self.socket.close()
+        pygame.quit()
+
+
+class ReplayViewer(Viewer):
+    """
+    Plays a replay file in the dashboard. Space pauses, left/right step one
+    frame, up/down jump ten seconds, home/end go to the first/last frame,
+    [ and ] change the speed, and the bar under the board seeks on click/drag.
+    """
+
+    BAR_HEIGHT = 6
+
+    def __init__(self, path, fps: int = None):
+        load_dotenv(override=True)
+        self.fps = fps or int(os.environ.get('VIEWER_FPS', 30))
+        self.reader = ReplayReader(path)
+        header = self.reader.header
+
+        self.state = SpectatorState()
+        self.game_board = GameBoard(self.state, map=load_map(header), max_players=header['max_players'])
+        pygame.display.set_caption(f"Replay {os.path.basename(path)}")
+
+        self.snapshot_received_at = 0
+        self.previous_positions = {}
+        self.frame = -1
+        self.playing = True
+        self.speed = 1.0
+        self.elapsed = 0.0
+        self.dragging = False
+
+    def show(self, frame: int):
+        frame = max(0, min(frame, self.reader.n_frames - 1))
+        if frame != self.frame:
+            self.apply_snapshot(self.reader.seek(frame))
+            self.frame = frame
+
+    def bar_rect(self) -> pygame.Rect:
+        # drawn in the margin under the board
+        screen = self.game_board.screen
+        return pygame.Rect(self.game_board.start_x, screen.get_height() - self.BAR_HEIGHT - 2,
+                           screen.get_width() - 2 * self.game_board.start_x, self.BAR_HEIGHT)
+
+    def draw_bar(self) -> pygame.Rect:
+        rect = self.bar_rect()
+        screen = self.game_board.screen
+        screen.fill((200, 200, 200), rect)
+        done = (self.frame + 1) / max(self.reader.n_frames, 1)
+        screen.fill((0, 160, 0) if self.playing else (160, 160, 0), (rect.x, rect.y, round(rect.width * done), rect.height))
+        return rect
+
+    def seek_to(self, x: int):
+        rect = self.bar_rect()
+        self.show(round((x - rect.x) / max(rect.width, 1) * (self.reader.n_frames - 1)))
+
+    def handle_events(self) -> bool:
+        game_board = self.game_board
+        jump = int(10 * self.reader.header['fps'])
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+            if event.type in (pygame.VIDEORESIZE, pygame.WINDOWEXPOSED):
+                game_board.invalidate()
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and \
+                    self.bar_rect().inflate(0, 8).collidepoint(event.pos):
+                self.dragging = True
+                self.seek_to(event.pos[0])
+            elif event.type == pygame.MOUSEMOTION and self.dragging:
+                self.seek_to(event.pos[0])
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                self.dragging = False
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    return False
+                if event.key == pygame.K_SPACE:
+                    self.playing = not self.playing
+                elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                    self.playing = False
+                    self.show(self.frame + (1 if event.key == pygame.K_RIGHT else -1))
+                elif event.key in (pygame.K_UP, pygame.K_DOWN):
+                    self.show(self.frame + (jump if event.key == pygame.K_UP else -jump))
+                elif event.key == pygame.K_HOME:
+                    self.show(0)
+                elif event.key == pygame.K_END:
+                    self.show(self.reader.n_frames - 1)
+                elif event.key == pygame.K_RIGHTBRACKET:
+                    self.speed = min(self.speed * 2, 64)
+                elif event.key == pygame.K_LEFTBRACKET:
+                    self.speed = max(self.speed / 2, 1 / 8)
+                elif event.key == pygame.K_EQUALS:
+                    game_board.cycle_view(1)
+                elif event.key == pygame.K_MINUS:
+                    game_board.cycle_view(-1)
+                elif event.key == pygame.K_v:
+                    game_board.toggle_player_views()
+        return True
+
+    def run(self):
+        clock = pygame.time.Clock()
+        self.show(0)
+        interval = 1 / self.reader.header['fps']
+        while self.handle_events():
+            if self.playing and not self.dragging:
+                self.elapsed += clock.get_time() / 1000 * self.speed
+            if self.elapsed >= interval:
+                # frames due while drawing slower than the speed are skipped
+                self.show(self.frame + int(self.elapsed / interval))
+                self.elapsed %= interval
+                if self.frame == self.reader.n_frames - 1:
+                    self.playing = False
+            self.state.fps = self.reader.header['fps'] * self.speed
+            self.interpolate()
+            rects = self.game_board.draw()
+            rects.append(self.draw_bar())
+            pygame.display.update(rects)
+            clock.tick(self.fps)
+
+        self.reader.close()
+        pygame.quit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Spectator dashboard of a running server or of a replay file')
+    parser.add_argument('--replay', default=None, help='replay file to play and scrub through')
+    args = parser.parse_args()
+
+    if args.replay:
+        ReplayViewer(args.replay).run()
+    else:
+        Viewer().run()